@@ -0,0 +1,444 @@
+# batch_driver.py - One folder of SVG files through the scheduler: the batch run shared by png.py and vector.py
+import os
+import time
+
+from manifest import RunManifest, source_sha256, load_manifest_for
+from journal import CheckpointJournal, settings_key, merge_inputs_key
+from svg_stats import analyze_svg
+from inkscape_runner import ConversionResult, Quarantine, make_failure, RETRYABLE_REASONS
+from scheduler import (RenderJob, MemoryAwareScheduler, estimate_job_memory, estimate_job_cost,
+                       calibrate_costs, BatchPlan, run_plans)
+from cost_model import CostModel, PageTimer, EtaEstimator, job_features
+from render_cache import render_key, cached_render, cache_from_environment
+from run_log import RunLogger
+from progress import BatchProgress
+
+def get_svg_files(folder_path):
+    """Get all SVG files from folder, sorted alphabetically"""
+    svg_files = []
+    for file in sorted(os.listdir(folder_path)):
+        if file.lower().endswith('.svg'):
+            svg_files.append(file)
+    return svg_files
+
+class BatchFormat:
+    """
+    What a batch does differently per output format: png.py and vector.py
+    subclass it with their export (convert, on a copy with the layer rules
+    applied by layered_svg) and their auto-merge (merge_stage builds the
+    merge stage the pages stream into, finish_merge completes it after the
+    summary). name is the output extension and the format key of the
+    manifest, journal, render cache and cost model; label names the
+    outputs in messages.
+    """
+    name = None
+    label = None
+    merged_name = None
+    merge_option = "Auto-merge to PDF"
+    dpi_note = ""
+    start_message = "Starting conversion..."
+    done_message = "Conversion complete!"
+    summary_title = "CONVERSION SUMMARY"
+
+    def layered_svg(self, svg_path, layer_rules):
+        raise NotImplementedError
+
+    def convert(self, svg_path, output_pattern, dpi, inkscape_path, layer_rules, **options):
+        raise NotImplementedError
+
+    def merge_stage(self, merged_pdf_path, log, on_progress):
+        raise NotImplementedError
+
+    def finish_merge(self, merge, manifest, log, progress_callback):
+        raise NotImplementedError
+
+class BatchMerge:
+    """
+    The auto-merge of a batch: its merge stage (None if it could not be
+    set up) and the checkpoint journal entry that lets a resumed run keep
+    a merged PDF already made from the same outputs
+    """
+    def __init__(self, stage, path, manifest, journal, resume, log):
+        self.stage = stage
+        self.path = path
+        self.manifest = manifest
+        self.journal = journal
+        self.resume = resume
+        self.log = log
+
+    def finish(self):
+        """Write the merged PDF (or keep the one the journal has); True on success"""
+        started = time.time()
+        inputs_key = merge_inputs_key(self.manifest)
+        if self.resume and self.journal.merge_done(self.path, inputs_key):
+            self.abort()
+            self.log("[RESUME] Merged PDF is up to date, skipping merge")
+            success = True
+        else:
+            success = self.stage.close() if self.stage else False
+            if success:
+                self.journal.record_merge(self.path, inputs_key)
+        if success:
+            self.manifest.set_merged(self.path, started, time.time())
+        return success
+
+    def abort(self):
+        if self.stage:
+            self.stage.abort()
+
+def prepare_batch(batch_format, svg_folder, output_path, dpi, create_subfolders=True,
+                  inkscape_path=None, log_callback=None, progress_callback=None,
+                  layer_rules=None, resume=False, timeout_policy=None, retry_policy=None,
+                  eta_callback=None, cost_model=None, name=None, render_cache=None,
+                  resource_limits=None, auto_merge_pdf=False,
+                  log_level=None, log_file=None, event_callback=None):
+    """
+    Plan a batch without running it: checks the inputs, sets up the
+    manifest, journal and quarantine, and returns a BatchPlan whose render
+    jobs can share a scheduler with other batches (None if there is
+    nothing to do). batch_format (BatchFormat) exports and merges the
+    outputs. A shared cost_model is updated by the caller.
+    render_cache (default: INKSCAPE_EXPORTER_CACHE) reuses renders of
+    identical inputs and settings made by any process sharing it.
+    resource_limits (ResourceLimits) caps each Inkscape process.
+    auto_merge_pdf streams the outputs, in source order, into one merged
+    PDF as files finish.
+    log_level (e.g. 'detail' for per-layer lines) and log_file (a rotating
+    log) apply when log_callback is not already a RunLogger.
+    progress_callback(files done, total files, message) also reports page
+    starts and finishes, eta_callback gets the page-weighted fraction and
+    event_callback(event, info) every progress event (see progress.py).
+    """
+    # Messages are queued and written by one listener thread, so workers never
+    # wait on the UI or the log file; log_level hides per-layer detail
+    log = RunLogger.wrap(log_callback, log_level, log_file)
+    
+    # Default Inkscape path if not provided
+    if not inkscape_path:
+        inkscape_path = r"C:\Program Files\Inkscape\bin\inkscape.exe"
+    
+    # Get absolute paths
+    svg_folder = os.path.abspath(svg_folder)
+    output_dir = os.path.abspath(output_path)
+    
+    # Create output directory
+    os.makedirs(output_dir, exist_ok=True)
+    
+    # Check if Inkscape exists
+    if not os.path.exists(inkscape_path):
+        log(f"[ERROR] Inkscape not found at: {inkscape_path}")
+        log.close()
+        return None
+    
+    # Get SVG files
+    svg_files = get_svg_files(svg_folder)
+    
+    if not svg_files:
+        log("[ERROR] No SVG files found in: " + svg_folder)
+        log.close()
+        return None
+    
+    log(f"[FOLDER] Found {len(svg_files)} SVG files in: {svg_folder}")
+    log(f"[FOLDER] Output folder: {output_dir}")
+    log(f"[TARGET] DPI: {dpi}{batch_format.dpi_note}")
+    log(f"[INKSCAPE] Using: {inkscape_path}")
+    log(f"[OPTION] Create subfolders: {create_subfolders}")
+    if auto_merge_pdf:
+        log(f"[OPTION] {batch_format.merge_option}: {auto_merge_pdf}")
+    
+    if layer_rules:
+        rule_count = sum(len(rules) for rules in layer_rules.values())
+        log(f"[LAYER CONTROL] Enabled with {rule_count} rule(s)")
+    
+    total_files = len(svg_files)
+    # Timings from the previous run into this folder guide the job order
+    previous_manifest = load_manifest_for(output_dir, batch_format.name)
+    past_durations = {}
+    if previous_manifest and previous_manifest.dpi == str(dpi):
+        past_durations = previous_manifest.durations()
+    
+    # Build the run manifest as files are converted
+    manifest = RunManifest(svg_folder, output_dir, batch_format.name, dpi, settings={
+        'create_subfolders': create_subfolders,
+        'layer_rules': layer_rules,
+        'auto_merge_pdf': auto_merge_pdf
+    })
+    
+    # Checkpoint journal so an interrupted batch can be resumed
+    journal = CheckpointJournal(output_dir, resume=resume)
+    run_settings = settings_key({'format': batch_format.name, 'dpi': str(dpi), 'layer_rules': layer_rules})
+    if resume:
+        log(f"[RESUME] Using checkpoint journal: {journal.path}")
+    
+    # Files that repeatedly hang or crash Inkscape
+    quarantine = Quarantine(output_dir)
+    
+    # Send initial progress (0%)
+    if progress_callback:
+        progress_callback(0, total_files, batch_format.start_message)
+    
+    # Shared render cache: identical sheets are rendered once
+    render_cache = render_cache or cache_from_environment(log=log)
+    if render_cache:
+        log(f"[CACHE] Using render cache: {render_cache.cache_dir}")
+    
+    # Pages are appended to the merged PDF as files finish, in source order
+    merge = None
+    merge_stage = None
+    if auto_merge_pdf:
+        merged_pdf_path = os.path.join(output_dir, batch_format.merged_name)
+        try:
+            merge_stage = batch_format.merge_stage(merged_pdf_path, log,
+                                                   lambda done, total: progress.merge_progress(done, total))
+        except ImportError as e:
+            log(f"[ERROR] Cannot merge: {e}")
+        merge = BatchMerge(merge_stage, merged_pdf_path, manifest, journal, resume, log)
+    
+    # Render times learned from earlier runs predict job costs and the ETA
+    owns_cost_model = cost_model is None
+    cost_model = cost_model or CostModel()
+    
+    # Results are handled on this thread as jobs finish; workers only render
+    counts = {'successful': 0, 'failed': 0, 'done': 0}
+    jobs = []
+    
+    def handle_result(job):
+        svg_file, svg_path, target_dir, input_sha256, features, timer, partial = job.context
+        counts['done'] += 1
+        
+        if job.error is not None:
+            result = ConversionResult([], make_failure('error', stderr=str(job.error)), kind=batch_format.label)
+        else:
+            result = job.result
+        
+        log(f"\n[{counts['done']}/{total_files}] Finished: {svg_file} ({job.finished - job.started:.1f}s)")
+        
+        files_created = getattr(result, 'files_created', [])
+        entry = manifest.add_file(svg_file, svg_path, target_dir, files_created, job.started, job.finished,
+                                  error=result.stderr or None, order=job.order,
+                                  source_sha256=input_sha256, failure=result.failure,
+                                  page_durations=timer.durations)
+        entry['peak_rss'] = job.peak_rss
+        entry['cached'] = getattr(result, 'cached', False)
+        if merge_stage:
+            merge_stage.add(job.order, [output['path'] for output in entry['outputs']])
+        
+        if result.failure and result.failure['reason'] in RETRYABLE_REASONS + ('file_timeout',):
+            if quarantine.record_failure(svg_file, input_sha256, result.failure):
+                log(f"[QUARANTINE] {svg_file} quarantined after repeated failures")
+        
+        if result.returncode == 0:
+            counts['successful'] += 1
+            quarantine.record_success(svg_file)
+            if not partial and not entry['cached']:
+                # Only complete renders are representative samples
+                cost_model.add_sample(features, job.finished - job.started)
+            journal.record_file(svg_file, input_sha256, run_settings,
+                                [output['path'] for output in entry['outputs']])
+            
+            if entry['outputs']:
+                source = " (from render cache)" if entry['cached'] else ""
+                log(f"[OK] Success! Created {len(entry['outputs'])} {batch_format.label} file(s){source}:")
+                for output in entry['outputs']:
+                    log(f"      -> {os.path.basename(output['path'])} ({output['bytes']} bytes)")
+            else:
+                log(f"[WARNING] No {batch_format.label} files generated for {svg_file}")
+        else:
+            counts['failed'] += 1
+            log(f"[ERROR] Failed to process {svg_file}")
+            if result.stderr:
+                error_msg = result.stderr[:500]
+                log(f"   Error: {error_msg}")
+        
+        progress.file_finished(svg_file, counts['done'], job.planned_cost, entry['pages'],
+                               job.finished - job.started, result.returncode == 0, entry['cached'])
+    
+    def announce_start(job):
+        svg_file = job.context[0]
+        log(f"\n[START] Processing: {svg_file}")
+        progress.file_started(svg_file, job.pages, job.planned_cost)
+    
+    # Plan each SVG file: skip finished or quarantined files, queue the rest
+    for i, svg_file in enumerate(svg_files, 1):
+        svg_path = os.path.join(svg_folder, svg_file)
+        file_base_name = os.path.splitext(svg_file)[0]
+        
+        if create_subfolders:
+            # Create subfolder for each SVG file
+            file_output_dir = os.path.join(output_dir, file_base_name)
+            os.makedirs(file_output_dir, exist_ok=True)
+            # Output pattern: use SVG filename as base
+            output_pattern = os.path.join(file_output_dir, f"{file_base_name}.{batch_format.name}")
+            target_dir = file_output_dir
+        else:
+            # All outputs in same folder
+            # Output pattern: use SVG filename as base
+            output_pattern = os.path.join(output_dir, f"{file_base_name}.{batch_format.name}")
+            target_dir = output_dir
+        
+        input_sha256 = source_sha256(svg_path)
+        
+        # Skip files an interrupted run already finished
+        completed = journal.completed_file(svg_file, input_sha256, run_settings) if resume else None
+        if completed:
+            now = time.time()
+            entry = manifest.add_file(svg_file, svg_path, target_dir, completed, now, now,
+                                      order=i - 1, source_sha256=input_sha256, resumed=True)
+            counts['successful'] += 1
+            counts['done'] += 1
+            log(f"[RESUME] {svg_file}: already converted, skipping ({entry['pages']} {batch_format.label} files)")
+            if merge_stage:
+                merge_stage.add(i - 1, [output['path'] for output in entry['outputs']])
+            continue
+        
+        # Skip files that keep hanging or crashing Inkscape
+        quarantined = quarantine.is_quarantined(svg_file, input_sha256)
+        if quarantined:
+            now = time.time()
+            failure = make_failure('quarantined', quarantined.get('page'), quarantined['failures'])
+            manifest.add_file(svg_file, svg_path, target_dir, [], now, now,
+                              error=f"Quarantined after {quarantined['failures']} failed runs "
+                                    f"({quarantined['reason']})",
+                              order=i - 1, source_sha256=input_sha256, failure=failure)
+            counts['failed'] += 1
+            counts['done'] += 1
+            log(f"[QUARANTINE] Skipping {svg_file}: failed {quarantined['failures']} times "
+                f"({quarantined['reason']}). Edit the file or delete {quarantine.path} to retry.")
+            if merge_stage:
+                merge_stage.add(i - 1, [])
+            continue
+        
+        done_pages = journal.completed_pages(svg_file, input_sha256, run_settings) if resume else {}
+        if done_pages:
+            log(f"[RESUME] {svg_file}: reusing {len(done_pages)} finished page(s)")
+        
+        timer = PageTimer()
+        
+        def record_page(page_num, page_path, svg_file=svg_file, input_sha256=input_sha256, timer=timer):
+            timer.page_done(page_num)
+            journal.record_page(svg_file, input_sha256, run_settings, page_num, page_path)
+        
+        # Layer rewriting is staged ahead, overlapping the renders before it
+        staged = {}
+        
+        def prepare(svg_path=svg_path, staged=staged):
+            staged['svg'] = batch_format.layered_svg(svg_path, layer_rules)
+        
+        def run(svg_path=svg_path, svg_file=svg_file, input_sha256=input_sha256,
+                output_pattern=output_pattern, done_pages=done_pages, record_page=record_page, timer=timer,
+                staged=staged):
+            timer.start()
+            
+            def render():
+                prepared_svg = (staged['svg'] or svg_path) if 'svg' in staged else None
+                return batch_format.convert(svg_path, output_pattern, dpi, inkscape_path, layer_rules,
+                                            done_pages=done_pages, page_callback=record_page,
+                                            timeout_policy=timeout_policy, retry_policy=retry_policy,
+                                            resource_limits=resource_limits, prepared_svg=prepared_svg)
+            
+            try:
+                if not render_cache:
+                    return render()
+                key = render_key(input_sha256, svg_file, batch_format.name, dpi, layer_rules, inkscape_path)
+                return cached_render(render_cache, key, output_pattern, render, kind=batch_format.label)
+            finally:
+                if staged.get('svg') and os.path.exists(staged['svg']):
+                    os.unlink(staged['svg'])
+        
+        stats = analyze_svg(svg_path)
+        features = job_features(stats, dpi, batch_format.name)
+        predicted = cost_model.predict(features)
+        job = RenderJob((output_dir, svg_path), run, memory_estimate=estimate_job_memory(stats, dpi, batch_format.name),
+                        cost_estimate=predicted if predicted is not None else estimate_job_cost(stats, dpi, batch_format.name),
+                        past_duration=past_durations.get((svg_file, input_sha256)),
+                        on_start=announce_start, on_done=handle_result,
+                        prepare=prepare if layer_rules else None)
+        job.context = (svg_file, svg_path, target_dir, input_sha256, features, timer, bool(done_pages))
+        job.order = i - 1
+        # Expected pages weight the file's progress (at most 5 are exported)
+        job.pages = min(stats['pages'], 5)
+        jobs.append(job)
+    
+    # Progress is weighted by cost; seconds-based costs also give a first ETA
+    calibrate_costs(jobs)
+    for job in jobs:
+        job.planned_cost = job.cost_estimate
+    eta = EtaEstimator(sum(job.planned_cost for job in jobs),
+                       costs_in_seconds=cost_model.ready or any(job.past_duration for job in jobs))
+    
+    # Page-level progress: page events from the workers move the fraction between files
+    progress = BatchProgress(eta, total_files, progress_callback, eta_callback, event_callback)
+    for job in jobs:
+        job.on_event = progress.page_listener(job.context[0])
+    
+    def begin(scheduler):
+        eta.workers = scheduler.max_workers
+        eta.started = time.time()
+        if scheduler.telemetry:
+            scheduler.telemetry.update_eta(eta.remaining(), eta.fraction)
+        if eta_callback:
+            eta_callback(eta.remaining(), eta.fraction)
+    
+    def finish(scheduler):
+        # Learn from this batch's timings (a shared model is saved by its owner)
+        if owns_cost_model:
+            cost_model.fit()
+            try:
+                cost_model.save()
+            except OSError as e:
+                log(f"[WARNING] Could not save render cost model: {e}")
+        
+        successful = counts['successful']
+        failed = counts['failed']
+        
+        # Send final progress (100%)
+        if progress_callback:
+            progress_callback(total_files, total_files, batch_format.done_message)
+        
+        # Summary
+        log("\n" + "="*50)
+        log(batch_format.summary_title)
+        log("="*50)
+        log(f"[STATS] Total SVG files processed: {total_files}")
+        log(f"[OK] Successful conversions: {successful}")
+        log(f"[ERROR] Failed conversions: {failed}")
+        log(f"[FOLDER] Output location: {output_dir}")
+        
+        # List the files created by this run (from the manifest, not the disk)
+        for entry in manifest.ordered_files():
+            if entry['outputs']:
+                log(f"[INFO] {entry['source']}: {entry['pages']} {batch_format.label} files ({entry['duration']:.1f}s)")
+                for output in entry['outputs']:
+                    log(f"      {os.path.relpath(output['path'], output_dir)}")
+        
+        log(f"[STATS] Total {batch_format.label} files created: {manifest.total_outputs} "
+            f"({manifest.total_bytes} bytes)")
+        
+        # Finish the PDF the pages were streamed into while files rendered
+        if merge:
+            batch_format.finish_merge(merge, manifest, log, progress_callback)
+        
+        journal.close()
+        manifest.finish()
+        try:
+            manifest_path = manifest.write()
+            log(f"[INFO] Manifest written: {manifest_path}")
+        except OSError as e:
+            log(f"[WARNING] Could not write manifest: {e}")
+        log("="*50)
+        
+        log.close()
+        return successful > 0
+    
+    return BatchPlan(name or os.path.basename(output_dir), jobs, log, begin, finish, manifest)
+
+def run_batch(plan, workers=None, memory_budget=None, run_telemetry=None):
+    """Run one planned batch on its own worker pool; True if any file converted (False for no plan)"""
+    if plan is None:
+        return False
+    
+    # Render on a memory-aware worker pool, most expensive files first;
+    # the manifest keeps the original order for the summary and the merge
+    scheduler = MemoryAwareScheduler(max_workers=workers, memory_budget=memory_budget, log=plan.log,
+                                     telemetry=run_telemetry)
+    return run_plans([plan], scheduler)[0]
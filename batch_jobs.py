@@ -0,0 +1,292 @@
+# batch_jobs.py - Run many conversion jobs (folders x profiles) on one shared worker pool
+import os
+import sys
+import json
+import time
+
+import png
+import vector
+from png import config_output_path
+from manifest import MANIFEST_FILENAME, load_manifest_for
+from page_map import PageMap
+from cost_model import CostModel
+from render_cache import cache_from_environment
+from scheduler import MemoryAwareScheduler, run_plans
+from inkscape_runner import ResourceLimits
+from run_log import RunLogger, console_log
+
+REPORT_FILENAME = "batch_report.json"
+
+# Job keys that may also be given once under "defaults"
+JOB_DEFAULTS = {
+    'format': 'png',
+    'dpi': '96',
+    'create_subfolders': True,
+    'inkscape_path': None,
+    'layer_rules': None,
+    'merge': False,
+    'resume': False,
+    'limits': None
+}
+
+def normalize_job(entry, defaults=None, index=1):
+    """One job with defaults applied, format normalised and output_path resolved"""
+    job = dict(JOB_DEFAULTS)
+    job.update(defaults or {})
+    job.update(entry)
+    if not job.get('svg_folder'):
+        raise ValueError(f"Job {index} has no svg_folder")
+    job['format'] = 'png' if job['format'] == 'png' else 'vector'
+    default_folder = 'png_output' if job['format'] == 'png' else 'pdf_output'
+    job['output_path'] = config_output_path(job, default_folder)
+    job['name'] = job.get('name') or f"job{index}_{os.path.basename(os.path.normpath(job['svg_folder']))}"
+    return job
+
+def prepare_job(job, log, cost_model=None, progress_callback=None, eta_callback=None,
+                render_cache=None):
+    """BatchPlan for a normalised job (None if there is nothing to do)"""
+    if not os.path.isdir(job['svg_folder']):
+        log(f"[ERROR] SVG folder not found: {job['svg_folder']}")
+        return None
+    module = png if job['format'] == 'png' else vector
+    return module.prepare_batch(
+        job['svg_folder'], job['output_path'], str(job['dpi']),
+        create_subfolders=job['create_subfolders'],
+        inkscape_path=job['inkscape_path'],
+        log_callback=log,
+        progress_callback=progress_callback,
+        layer_rules=job['layer_rules'],
+        resume=job['resume'],
+        eta_callback=eta_callback,
+        cost_model=cost_model,
+        name=job['name'],
+        render_cache=render_cache,
+        resource_limits=ResourceLimits.from_config(job['limits']),
+        auto_merge_pdf=job['merge']
+    )
+
+def merge_inputs(spec):
+    """Ordered input files of a merge job: explicit list, the folder's manifest, or a sorted walk"""
+    if spec.get('inputs'):
+        return spec['inputs']
+    folder = spec['input_folder']
+    extension = '.png' if spec.get('format', 'pdf') == 'png' else '.pdf'
+    manifest = load_manifest_for(folder, 'png' if extension == '.png' else 'pdf')
+    if manifest:
+        return manifest.output_paths()
+    paths = []
+    for root, dirs, files in os.walk(folder):
+        dirs.sort(key=str.lower)
+        for name in sorted(files, key=str.lower):
+            if name.lower().endswith(extension):
+                paths.append(os.path.join(root, name))
+    return paths
+
+def run_merge(spec, log):
+    """Merge PDFs (or PNGs into one PDF) for a merge job; returns True on success"""
+    inputs = merge_inputs(spec)
+    output = spec['output']
+    if not inputs:
+        log("[ERROR] No input files to merge")
+        return False
+    log(f"[MERGE] Merging {len(inputs)} file(s) into: {output}")
+    if spec.get('format', 'pdf') != 'png':
+        # Fonts, images and forms shared by the files are stored once unless "deduplicate" is false
+        return vector.merge_pdfs_from_list(inputs, output, log, spec.get('deduplicate', True))
+    from png_preflight import preflight, background_name, DEFAULT_BACKGROUND
+    from pipeline import merge_files
+    background = background_name(spec.get('background', DEFAULT_BACKGROUND))
+    # Pages already in the previous merge are neither checked nor rewritten
+    previous = PageMap.for_update(output, 'png', background)
+    unchanged = previous.unchanged(inputs) if previous else ()
+    # Broken pages fail the job before anything is written
+    checked = preflight(inputs, background, log=log, unchanged=unchanged)
+    try:
+        if not checked.ok:
+            log(f"[ERROR] {len(checked.problems)} PNG file(s) cannot be merged")
+            return False
+        if not merge_files(output, 'png', checked.pages, inputs, log, variant=background):
+            return False
+    finally:
+        checked.cleanup()
+    log(f"[OK] Merged PDF created: {output}")
+    return True
+
+def load_job_manifest(path):
+    """
+    Read a job manifest: either a list of jobs, or an object with "jobs",
+    optional "defaults" applied to every job, "workers", "memory_budget_gb",
+    "cache_dir" (shared render cache), "report" (path of the combined report),
+    "log_level" and "log_file" (a rotating log of the whole run).
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        data = {'jobs': data}
+
+    data['jobs'] = [normalize_job(entry, data.get('defaults'), index)
+                    for index, entry in enumerate(data.get('jobs', []), 1)]
+    return data
+
+def make_logger(name, log):
+    """Log of one job: every line prefixed with its name"""
+    return log.child(f"[{name}] ")
+
+def job_report(job, plan, success):
+    """Report entry for one job, from its run manifest"""
+    entry = {
+        'name': job['name'],
+        'format': job['format'],
+        'svg_folder': os.path.abspath(job['svg_folder']),
+        'output_dir': os.path.abspath(job['output_path']),
+        'dpi': str(job['dpi']),
+        'status': 'ok' if success else 'failed'
+    }
+    if plan is None:
+        entry['status'] = 'skipped'
+        return entry
+
+    manifest = plan.manifest
+    entry.update({
+        'files': len(manifest.files),
+        'successful': manifest.successful,
+        'failed': manifest.failed,
+        'outputs': manifest.total_outputs,
+        'bytes': manifest.total_bytes,
+        'duration': round((manifest.finished or time.time()) - manifest.started, 3),
+        'manifest': os.path.join(manifest.output_dir, MANIFEST_FILENAME),
+        'merged': manifest.merged,
+        'failures': [{'source': f['source'], 'error': f['error']}
+                     for f in manifest.ordered_files() if f['status'] != 'ok']
+    })
+    return entry
+
+def run_job_manifest(manifest_path, workers=None, memory_budget=None, report_path=None, log=None,
+                     log_level=None, log_file=None):
+    """
+    Plan every job of a job manifest, render all their files on one
+    memory-aware worker pool (most expensive first, across jobs), then
+    finish each job (summary, merge, run manifest) and write a combined
+    report. Returns True if every job succeeded.
+    """
+    data = load_job_manifest(manifest_path)
+    # One queued logger for the run; each job logs through a prefixed child
+    log = RunLogger(log or console_log, log_level or data.get('log_level'), log_file or data.get('log_file'))
+    try:
+        return run_jobs(data, manifest_path, workers, memory_budget, report_path, log)
+    finally:
+        log.close()
+
+def run_jobs(data, manifest_path, workers, memory_budget, report_path, log):
+    workers = workers or data.get('workers')
+    if memory_budget is None and data.get('memory_budget_gb'):
+        memory_budget = int(float(data['memory_budget_gb']) * 1024 ** 3)
+    report_path = report_path or data.get('report') or \
+        os.path.join(os.path.dirname(os.path.abspath(manifest_path)), REPORT_FILENAME)
+
+    started = time.time()
+    log(f"[BATCH] {len(data['jobs'])} job(s) from: {manifest_path}")
+
+    # One cost model and one render cache for the whole run
+    cost_model = CostModel()
+    render_cache = cache_from_environment(data.get('cache_dir'), log=log)
+
+    plans = []
+    for job in data['jobs']:
+        plan = prepare_job(job, make_logger(job['name'], log), cost_model, render_cache=render_cache)
+        if plan is None:
+            log(f"[BATCH] {job['name']}: nothing to do, skipped")
+        plans.append(plan)
+
+    # All jobs share one pool; the scheduler interleaves their files by cost
+    scheduler = MemoryAwareScheduler(max_workers=workers, memory_budget=memory_budget, log=log)
+    active = [plan for plan in plans if plan is not None]
+    results = dict(zip([id(plan) for plan in active], run_plans(active, scheduler)))
+
+    cost_model.fit()
+    try:
+        cost_model.save()
+    except OSError as e:
+        log(f"[WARNING] Could not save render cost model: {e}")
+
+    entries = [job_report(job, plan, plan is not None and results[id(plan)])
+               for job, plan in zip(data['jobs'], plans)]
+    report = {
+        'job_manifest': os.path.abspath(manifest_path),
+        'started': started,
+        'finished': time.time(),
+        'workers': scheduler.max_workers,
+        'peak_rss': scheduler.peak_rss,
+        'totals': {
+            'jobs': len(entries),
+            'ok': sum(1 for e in entries if e['status'] == 'ok'),
+            'failed': sum(1 for e in entries if e['status'] == 'failed'),
+            'skipped': sum(1 for e in entries if e['status'] == 'skipped'),
+            'files': sum(e.get('files', 0) for e in entries),
+            'outputs': sum(e.get('outputs', 0) for e in entries),
+            'bytes': sum(e.get('bytes', 0) for e in entries)
+        },
+        'jobs': entries
+    }
+
+    temp_path = report_path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    os.replace(temp_path, report_path)
+
+    log("\n" + "="*50)
+    log("BATCH SUMMARY")
+    log("="*50)
+    for entry in entries:
+        details = f"{entry.get('successful', 0)}/{entry.get('files', 0)} files, {entry.get('outputs', 0)} outputs"
+        log(f"[{entry['status'].upper()}] {entry['name']}: {details}")
+    log(f"[STATS] {report['totals']['ok']} of {len(entries)} jobs succeeded "
+        f"in {report['finished'] - started:.1f}s")
+    log(f"[INFO] Report written: {report_path}")
+    log("="*50)
+
+    return report['totals']['ok'] == len(entries)
+
+def main():
+    """Main function for command-line usage"""
+    workers = None
+    report_path = None
+    log_level = None
+    log_file = None
+    args = []
+    for arg in sys.argv[1:]:
+        if arg.startswith('--workers='):
+            workers = int(arg.split('=', 1)[1])
+        elif arg.startswith('--report='):
+            report_path = arg.split('=', 1)[1]
+        elif arg.startswith('--log-level='):
+            log_level = arg.split('=', 1)[1]
+        elif arg.startswith('--log-file='):
+            log_file = arg.split('=', 1)[1]
+        else:
+            args.append(arg)
+
+    if len(args) != 1:
+        print("Usage: python batch_jobs.py <jobs.json> [--workers=N] [--report=path] "
+              "[--log-level=detail|info|warning] [--log-file=path]")
+        print("\njobs.json example:")
+        print('  {"defaults": {"dpi": "150", "inkscape_path": "C:\\\\Program Files\\\\Inkscape\\\\bin\\\\inkscape.exe"},')
+        print('   "jobs": [{"name": "kitchen", "svg_folder": "./kitchen", "output_folder": "png_output"},')
+        print('            {"svg_folder": "./plans", "format": "vector", "dpi": "300", "merge": true,')
+        print('             "layer_rules": {"global": {"Notes": "hide"}},')
+        print('             "limits": {"memory_limit_mb": 4096, "nice": 10, "ionice": "idle", "cpu_affinity": true}}]}')
+        return 1
+
+    if not os.path.exists(args[0]):
+        print("[ERROR] Job manifest not found: " + args[0])
+        return 1
+    try:
+        success = run_job_manifest(args[0], workers=workers, report_path=report_path,
+                                   log_level=log_level, log_file=log_file)
+    except (ValueError, json.JSONDecodeError) as e:
+        print(f"[ERROR] Invalid job manifest: {e}")
+        return 1
+    return 0 if success else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,6 +4,11 @@ import os
 import sys
 import subprocess
 import threading
+from folder_scan import FolderScanner, cached_scan, scan_folder
+from telemetry import RunTelemetry
+
+# The live dashboard is redrawn this often during a run
+DASHBOARD_INTERVAL_MS = 500
 
 class ConverterTab:
     def __init__(self, parent, shared_vars, gui_app):
@@ -12,6 +17,13 @@ class ConverterTab:
         self.gui_app = gui_app
         self.current_progress = 0
         self.total_files = 0
+        # SVG folders are listed in the background (network folders can be slow)
+        self.scanner = FolderScanner()
+        # Page previews: renderer started on first use, one window at a time
+        self.thumbnail_renderer = None
+        self.preview_window = None
+        # Live statistics of the running conversion
+        self.telemetry = None
         
         # Add layer control variables
         if 'layer_control_enabled' not in self.shared_vars:
@@ -102,7 +114,10 @@ class ConverterTab:
         
         # File count display
         self.file_count_label = ttk.Label(input_frame, text="SVG files found: 0")
-        self.file_count_label.grid(row=3, column=0, sticky='w', pady=(0, 5), columnspan=2)
+        self.file_count_label.grid(row=3, column=0, sticky='w', pady=(0, 5))
+        
+        ttk.Button(input_frame, text="Preview Pages", 
+                  command=self.open_preview, width=15).grid(row=3, column=1, sticky='e', pady=(0, 5))
         
         # Configure grid weights
         input_frame.columnconfigure(0, weight=1)
@@ -198,6 +213,13 @@ class ConverterTab:
         ttk.Checkbutton(options_frame, text="Open output folder after conversion", 
                        variable=self.shared_vars['open_output']).pack(anchor='w', pady=2)
         
+        # Resume skips work recorded in the output folder's checkpoint journal
+        if 'resume_batch' not in self.shared_vars:
+            self.shared_vars['resume_batch'] = tk.BooleanVar(value=False)
+        
+        ttk.Checkbutton(options_frame, text="Resume interrupted batch (skip finished files)", 
+                       variable=self.shared_vars['resume_batch']).pack(anchor='w', pady=2)
+        
         # Configure grid weights
         conv_frame.columnconfigure(0, weight=1)
         
@@ -312,6 +334,17 @@ Examples:
         self.progress_details = ttk.Label(progress_frame, text="", font=("Arial", 9))
         self.progress_details.pack(fill='x', expand=True, pady=(2, 0))
         
+        # Live dashboard: throughput, workers, queue, cache and memory from the engine
+        dashboard_frame = ttk.Frame(progress_frame)
+        dashboard_frame.pack(fill='x', expand=True, pady=(5, 0))
+        
+        self.dashboard_throughput = ttk.Label(dashboard_frame, text="", font=("Arial", 9))
+        self.dashboard_throughput.pack(anchor='w')
+        self.dashboard_queue = ttk.Label(dashboard_frame, text="", font=("Arial", 9))
+        self.dashboard_queue.pack(anchor='w')
+        self.dashboard_workers = ttk.Label(dashboard_frame, text="", font=("Consolas", 9), justify='left')
+        self.dashboard_workers.pack(anchor='w')
+        
         # ====== LOG AREA ======
         log_frame = ttk.LabelFrame(bottom_container, text="Conversion Log", padding="10")
         log_frame.grid(row=1, column=0, sticky='nsew', padx=10, pady=(0, 5))
@@ -405,8 +438,8 @@ Examples:
             self.shared_vars['layer_csv_path'].set(filepath)
             self.gui_app.log_message(f"Layer CSV loaded: {filepath}")
     
-    def get_layer_control_data(self):
-        """Get layer control data based on selected mode"""
+    def get_layer_control_data(self, quiet=False):
+        """Get layer control data based on selected mode (quiet: no warning dialogs)"""
         if not self.shared_vars['layer_control_enabled'].get():
             return None
         
@@ -417,14 +450,16 @@ Examples:
             if csv_path and os.path.exists(csv_path):
                 return self.parse_layer_csv(csv_path)
             else:
-                messagebox.showwarning("Warning", "CSV file not found or not selected")
+                if not quiet:
+                    messagebox.showwarning("Warning", "CSV file not found or not selected")
                 return None
         else:  # text mode
             text_content = self.layer_text.get(1.0, tk.END).strip()
             if text_content:
                 return self.parse_layer_text(text_content)
             else:
-                messagebox.showwarning("Warning", "No layer rules entered in text field")
+                if not quiet:
+                    messagebox.showwarning("Warning", "No layer rules entered in text field")
                 return None
     
     def parse_layer_csv(self, csv_path):
@@ -535,16 +570,40 @@ Examples:
         self.shared_vars['output_location'].set(desktop)
     
     def update_file_count(self):
+        """Count the SVG files in the background; the label fills in as the scan runs"""
         folder = self.shared_vars['svg_folder'].get()
-        if folder and os.path.exists(folder):
-            svg_files = [f for f in os.listdir(folder) if f.lower().endswith('.svg')]
-            count = len(svg_files)
-            self.file_count_label.config(text=f"SVG files found: {count}")
-            
-            if count > 0:
-                self.gui_app.log_message(f"Found {count} SVG files in: {folder}")
-            else:
-                self.gui_app.log_message("No SVG files found in selected folder")
+        if not folder:
+            return
+        self.file_count_label.config(text="SVG files found: scanning...")
+        events = self.gui_app.events
+        self.scanner.scan(folder, 'svg',
+                          on_progress=lambda count: events.progress('svg_scan', self.show_file_count, f"{count}..."),
+                          on_done=lambda names, error: events.call(self.file_count_done, folder, names, error))
+    
+    def show_file_count(self, count):
+        self.file_count_label.config(text=f"SVG files found: {count}")
+    
+    def file_count_done(self, folder, svg_files, error):
+        if error:
+            self.show_file_count(0)
+            self.gui_app.log_message(f"❌ Could not read folder: {error}")
+            return
+        count = len(svg_files)
+        self.show_file_count(count)
+        
+        if count > 0:
+            self.gui_app.log_message(f"Found {count} SVG files in: {folder}")
+        else:
+            self.gui_app.log_message("No SVG files found in selected folder")
+    
+    def count_svg_files(self, folder):
+        """Number of SVG files in folder (from the last scan if the folder is unchanged)"""
+        if not folder or not os.path.exists(folder):
+            return 0
+        svg_files = cached_scan(folder, 'svg')
+        if svg_files is None:
+            svg_files = scan_folder(folder, 'svg')
+        return len(svg_files)
     
     def update_progress(self, current, total, file_name=None):
         """Update the progress bar and labels"""
@@ -582,6 +641,51 @@ Examples:
         self.current_progress += 1
         self.update_progress(self.current_progress, self.total_files, file_name)
     
+    def show_progress(self, percentage, message, details):
+        """Draw one progress update (called on the main loop)"""
+        self.progress_bar.config(value=percentage)
+        self.progress_percentage.config(text=f"{percentage}%")
+        self.progress_text.config(text=message)
+        self.progress_details.config(text=details)
+    
+    def refresh_dashboard(self):
+        """Draw the run's live statistics; repeats until the run has finished"""
+        if self.telemetry is None:
+            return
+        from cost_model import format_duration
+        stats = self.telemetry.snapshot()
+        
+        throughput = f"⚡ {stats['pages_per_second']:.2f} pages/s"
+        if stats['megapixels_per_second']:
+            throughput += f" · {stats['megapixels_per_second']:.1f} MPix/s"
+        throughput += f" · {stats['pages']} pages ({stats['bytes'] / (1024 * 1024):.1f} MB)"
+        if stats['eta'] is not None:
+            throughput += f" · ETA {format_duration(stats['eta'])}"
+        self.dashboard_throughput.config(text=throughput)
+        
+        queue_text = (f"📊 Files {stats['files_done']}/{stats['files_total']} · queued {stats['queued']}"
+                      f" · running {stats['running']}/{stats['worker_limit']}")
+        if stats['cache_hit_rate'] is not None:
+            queue_text += (f" · cache {stats['cache_hits']}/{stats['cache_lookups']}"
+                           f" ({stats['cache_hit_rate'] * 100:.0f}%)")
+        if stats['peak_rss']:
+            queue_text += f" · peak RSS {stats['peak_rss'] / (1024 * 1024):.0f} MB"
+        self.dashboard_queue.config(text=queue_text)
+        
+        workers = []
+        idle = []
+        for slot, state, file_name, seconds in stats['workers']:
+            if state == 'idle':
+                idle.append(f"#{slot + 1}")
+            else:
+                workers.append(f"#{slot + 1:<2} {state:<9} {format_duration(seconds):>7}  {file_name or ''}")
+        if idle and not stats['finished']:
+            workers.append(f"idle: {' '.join(idle)}")
+        self.dashboard_workers.config(text='\n'.join(workers))
+        
+        if not stats['finished']:
+            self.frame.after(DASHBOARD_INTERVAL_MS, self.refresh_dashboard)
+    
     def set_progress_complete(self, message="Conversion complete!"):
         """Set progress bar to complete state"""
         self.progress_bar['value'] = 100
@@ -596,7 +700,21 @@ Examples:
     
     def clear_log(self):
         """Clear the log text widget"""
-        self.log_text.delete(1.0, tk.END)
+        self.gui_app.events.clear_log('converter')
+    
+    def thumbnails(self):
+        """The shared preview renderer (its cache outlives the preview window)"""
+        if self.thumbnail_renderer is None:
+            from thumbnails import ThumbnailRenderer
+            self.thumbnail_renderer = ThumbnailRenderer(log=self.gui_app.log)
+        return self.thumbnail_renderer
+    
+    def open_preview(self):
+        if self.preview_window:
+            self.preview_window.window.lift()
+            return
+        from preview_window import PreviewWindow
+        self.preview_window = PreviewWindow(self)
     
     def start_conversion(self):
         if not self.shared_vars['svg_folder'].get():
@@ -624,8 +742,7 @@ Examples:
         
         # Get total files for progress bar
         svg_folder = self.shared_vars['svg_folder'].get()
-        svg_files = [f for f in os.listdir(svg_folder) if f.lower().endswith('.svg')] if os.path.exists(svg_folder) else []
-        total_files = len(svg_files)
+        total_files = self.count_svg_files(svg_folder)
         
         if total_files == 0:
             messagebox.showerror("Error", "No SVG files found in selected folder")
@@ -637,6 +754,14 @@ Examples:
         # Disable button during conversion
         self.convert_btn.config(state='disabled', bg="#6c757d")
         
+        # Engine statistics for the live dashboard
+        self.telemetry = RunTelemetry()
+        self.refresh_dashboard()
+        
+        # Previews wait while the conversion has the CPU
+        if self.thumbnail_renderer:
+            self.thumbnail_renderer.pause()
+        
         # Run conversion in separate thread
         thread = threading.Thread(target=self.run_conversion_and_merge)
         thread.daemon = True
@@ -650,25 +775,21 @@ Examples:
             # Run the conversion first
             success = self.run_conversion()
             
-            # If conversion successful and auto-merge is checked AND format is PNG
+            # PNG auto-merge ran inside the conversion, pages streaming into the PDF as they rendered
             if success and output_format == 'png' and self.shared_vars.get('auto_merge', tk.BooleanVar(value=True)).get():
-                self.gui_app.log_message("\n" + "="*50)
-                self.gui_app.log_message("Starting automatic PDF merge...")
-                self.gui_app.log_message("="*50)
-                
-                # Set progress for PDF merge
-                self.gui_app.root.after(0, lambda: self.progress_text.config(text="Starting PDF merge..."))
-                self.gui_app.root.after(0, lambda: self.progress_details.config(text="Merging PNG files to PDF"))
-                
-                self.trigger_pdf_merge()
+                self.show_merged_pdf()
             
         except Exception as e:
             self.gui_app.log_message(f"❌ Error: {str(e)}")
-            self.gui_app.root.after(0, lambda: self.set_progress_error(f"Error: {str(e)}"))
-            messagebox.showerror("Error", f"An error occurred:\n{str(e)}")
+            self.gui_app.events.call(self.set_progress_error, f"Error: {str(e)}")
+            self.gui_app.events.call(messagebox.showerror, "Error", f"An error occurred:\n{str(e)}")
         finally:
+            # Stops the dashboard even if the run ended before rendering started
+            self.telemetry.finish()
+            if self.thumbnail_renderer:
+                self.thumbnail_renderer.resume()
             # Re-enable button
-            self.gui_app.root.after(0, lambda: self.convert_btn.config(state='normal', bg="#0078D7"))
+            self.gui_app.events.call(lambda: self.convert_btn.config(state='normal', bg="#0078D7"))
     
     def run_conversion(self):
         """Run the SVG to PNG/Vector conversion with real-time progress tracking"""
@@ -691,6 +812,7 @@ Examples:
             create_subfolders = self.shared_vars['create_subfolders'].get()
             inkscape_path = self.shared_vars['inkscape_path'].get()
             open_output = self.shared_vars['open_output'].get()
+            resume = self.shared_vars['resume_batch'].get()
             
             # Get layer rules if enabled
             layer_rules = None
@@ -719,56 +841,51 @@ Examples:
                 self.gui_app.log_message(f"Auto-merge PDFs: {auto_merge_pdf}")
             if layer_rules:
                 self.gui_app.log_message(f"Layer Control: Enabled ({len(layer_rules)} rules)")
+            if resume:
+                self.gui_app.log_message("Resume: skipping work finished by the previous run")
             self.gui_app.log_message("="*50)
             
             # Create output directory
             os.makedirs(complete_output_path, exist_ok=True)
             
-            # Define log callback
-            def log_callback(message):
-                self.gui_app.log_message(message)
+            # The GUI's queued logger: the engine logs through it without waiting on Tk
+            log_callback = self.gui_app.log
+            
+            # Time-weighted progress and ETA from the engine's cost estimates
+            from cost_model import format_duration
+            eta_state = {'fraction': None, 'text': ''}
+            
+            def eta_callback(seconds_left, fraction):
+                eta_state['fraction'] = fraction
+                eta_state['text'] = f" - about {format_duration(seconds_left)} left" if seconds_left is not None else ""
             
             # Define progress callback
             def progress_callback(current, total, message):
-                # Calculate percentage
-                percentage = int((current / total) * 100) if total > 0 else 0
-                
-                # Update progress bar
-                self.gui_app.root.after(0, lambda p=percentage: self.progress_bar.config(value=p))
+                # Calculate percentage (weighted by file cost once the engine reports it)
+                if eta_state['fraction'] is not None and total == total_files:
+                    percentage = int(eta_state['fraction'] * 100)
+                else:
+                    percentage = int((current / total) * 100) if total > 0 else 0
                 
-                # Update labels
-                self.gui_app.root.after(0, lambda p=percentage: self.progress_percentage.config(text=f"{p}%"))
-                self.gui_app.root.after(0, lambda m=message: self.progress_text.config(text=m))
-                self.gui_app.root.after(0, lambda c=current, t=total: 
-                                    self.progress_details.config(text=f"File {c} of {t}"))
-                
-                # Force UI update
-                self.gui_app.root.update_idletasks()
+                # Only the newest update is drawn, at a capped frame rate
+                self.gui_app.events.progress('converter', self.show_progress, percentage, message,
+                                             f"File {current} of {total}{eta_state['text']}")
             
             # Get SVG files count for progress initialization
-            svg_files = [f for f in os.listdir(svg_folder) if f.lower().endswith('.svg')] if os.path.exists(svg_folder) else []
-            total_files = len(svg_files)
+            total_files = self.count_svg_files(svg_folder)
             
             if total_files == 0:
                 self.gui_app.log_message("❌ No SVG files found!")
                 return False
             
             # Reset progress bar
-            self.gui_app.root.after(0, lambda: self.reset_progress(total_files))
+            self.gui_app.events.call(self.reset_progress, total_files)
             
-            # Customize progress bar style for green color
-            style = ttk.Style()
-            style.theme_use('clam')
-            style.configure("green.Horizontal.TProgressbar", 
-                        foreground='#28a745', 
-                        background='#28a745',
-                        troughcolor='#e9ecef',
-                        bordercolor='#e9ecef',
-                        lightcolor='#28a745',
-                        darkcolor='#28a745')
+            # Green progress bar
+            self.gui_app.events.call(self.setup_progress_bar_style)
             
-            # Apply green style to progress bar
-            self.progress_bar.config(style="green.Horizontal.TProgressbar")
+            # PNG pages go straight into a combined PDF as they are rendered
+            auto_merge_png = output_format == 'png' and self.shared_vars.get('auto_merge', tk.BooleanVar(value=True)).get()
             
             # Run conversion directly (not as subprocess)
             if output_format == 'png':
@@ -780,7 +897,11 @@ Examples:
                     inkscape_path=inkscape_path,
                     log_callback=log_callback,
                     progress_callback=progress_callback,
-                    layer_rules=layer_rules
+                    layer_rules=layer_rules,
+                    resume=resume,
+                    eta_callback=eta_callback,
+                    auto_merge_pdf=auto_merge_png,
+                    run_telemetry=self.telemetry
                 )
             else:  # vector
                 success = conversion_module.batch_convert(
@@ -792,16 +913,20 @@ Examples:
                     log_callback=log_callback,
                     progress_callback=progress_callback,
                     layer_rules=layer_rules,
-                    auto_merge_pdf=auto_merge_pdf  # Pass auto-merge parameter
+                    auto_merge_pdf=auto_merge_pdf,  # Pass auto-merge parameter
+                    resume=resume,
+                    eta_callback=eta_callback,
+                    run_telemetry=self.telemetry
                 )
             
             if success:
                 self.gui_app.log_message(f"\n✅ {format_name} conversion completed successfully!")
-                self.gui_app.root.after(0, lambda: self.set_progress_complete(f"{format_name} conversion successful!"))
+                self.gui_app.events.call(self.set_progress_complete, f"{format_name} conversion successful!")
                 
-                # Store the conversion output path for PDF merge (only for PNG)
+                # Store the conversion output path and manifest for PDF merge (only for PNG)
                 if output_format == 'png':
                     self.conversion_output_path = complete_output_path
+                    self.conversion_manifest = conversion_module.last_manifest
                 
                 # Open output folder if option is selected (but not if auto-merge is on and format is PNG)
                 if open_output and os.path.exists(complete_output_path):
@@ -818,21 +943,21 @@ Examples:
                 return True
             else:
                 self.gui_app.log_message(f"\n❌ {format_name} conversion failed!")
-                self.gui_app.root.after(0, lambda: self.set_progress_error(f"{format_name} conversion failed"))
-                messagebox.showerror("Error", f"{format_name} conversion failed. Check log for details.")
+                self.gui_app.events.call(self.set_progress_error, f"{format_name} conversion failed")
+                self.gui_app.events.call(messagebox.showerror, "Error", f"{format_name} conversion failed. Check log for details.")
                 return False
             
         except ImportError as e:
             self.gui_app.log_message(f"❌ Error: Could not import conversion module: {str(e)}")
-            self.gui_app.root.after(0, lambda: self.set_progress_error(f"Missing conversion module"))
-            messagebox.showerror("Error", f"Could not import conversion module.\nMake sure you have {'png.py' if self.shared_vars['output_format'].get() == 'png' else 'vector.py'} in the same directory.")
+            self.gui_app.events.call(self.set_progress_error, f"Missing conversion module")
+            self.gui_app.events.call(messagebox.showerror, "Error", f"Could not import conversion module.\nMake sure you have {'png.py' if self.shared_vars['output_format'].get() == 'png' else 'vector.py'} in the same directory.")
             return False
         except Exception as e:
             self.gui_app.log_message(f"❌ Error: {str(e)}")
             import traceback
             self.gui_app.log_message(f"Traceback: {traceback.format_exc()}")
-            self.gui_app.root.after(0, lambda: self.set_progress_error(f"Error: {str(e)}"))
-            messagebox.showerror("Error", f"An error occurred:\n{str(e)}")
+            self.gui_app.events.call(self.set_progress_error, f"Error: {str(e)}")
+            self.gui_app.events.call(messagebox.showerror, "Error", f"An error occurred:\n{str(e)}")
             return False
     
     
@@ -855,37 +980,25 @@ Examples:
         # Apply the style
         self.progress_bar.config(style="green.Horizontal.TProgressbar")
     
-    def trigger_pdf_merge(self):
-        """Trigger the PDF merge after PNG conversion"""
-        try:
-            if not hasattr(self, 'conversion_output_path'):
-                self.gui_app.log_message("❌ No conversion output path found for PDF merge")
-                return
-            
-            # Only trigger PDF merge if output format is PNG
-            if self.shared_vars['output_format'].get() != 'png':
-                self.gui_app.log_message("❌ PDF merge is only available for PNG output format")
-                return
-            
-            # Get reference to PDF merge tab
-            pdf_merge_tab = self.gui_app.pdf_merge_tab
-            
-            # Set the PNG folder to the converter output
-            pdf_merge_tab.manual_folder_var.set(self.conversion_output_path)
-            self.gui_app.log_message(f"📁 PNG folder set to: {self.conversion_output_path}")
-            
-            # Update the PDF output location
-            pdf_output_path = os.path.join(self.conversion_output_path, "combined_output.pdf")
-            pdf_merge_tab.output_location_var.set(self.conversion_output_path)
-            pdf_merge_tab.pdf_filename_var.set("combined_output.pdf")
-            
-            # Trigger a scan of the folder
-            pdf_merge_tab.scan_folder()
-            
-            # Wait a moment for UI to update, then start merge
-            self.gui_app.root.after(1000, pdf_merge_tab.start_merge)
-            
-        except Exception as e:
-            self.gui_app.log_message(f"❌ Failed to trigger PDF merge: {str(e)}")
-            import traceback
-            self.gui_app.log_message(f"Traceback: {traceback.format_exc()}")
\ No newline at end of file
+    def show_merged_pdf(self):
+        """Report (and optionally open) the combined PDF written by the PNG conversion"""
+        manifest = getattr(self, 'conversion_manifest', None)
+        merged = manifest.merged if manifest else None
+        if not merged or not os.path.exists(merged['path']):
+            self.gui_app.log_message("❌ PDF merge failed! Check log for details.")
+            self.gui_app.events.call(self.set_progress_error, "PDF merge failed")
+            return
+        
+        # Hand the run over to the PDF merge tab for manual re-merges
+        self.gui_app.hand_over_manifest(manifest)
+        self.gui_app.log_message(f"\n✅ PDF created successfully!")
+        self.gui_app.log_message(f"📄 Saved to: {merged['path']} ({merged['bytes'] / 1024:.2f} KB)")
+        
+        # The merge tab's "open PDF" option (on by default, before the tab is built)
+        merge_tab = self.gui_app.pdf_merge_tab
+        if merge_tab is None or merge_tab.open_pdf_var.get():
+            try:
+                os.startfile(merged['path'])
+                self.gui_app.log_message(f"📂 Opened PDF: {merged['path']}")
+            except:
+                self.gui_app.log_message(f"📂 PDF file: {merged['path']}")
\ No newline at end of file
@@ -0,0 +1,197 @@
+# cost_model.py - Render-time model learned from past runs (ETA and scheduling)
+import os
+import json
+import time
+
+from svg_stats import megapixels, render_dpi
+
+# Stored per user, shared by every output folder
+MODEL_DIR = os.path.join(os.path.expanduser('~'), '.inkscape_exporter')
+MODEL_FILENAME = "cost_model.json"
+
+# Keep the most recent samples only, so the model follows machine/Inkscape changes
+MAX_SAMPLES = 2000
+# Below this many samples the heuristic cost is used instead
+MIN_SAMPLES = 5
+# Ridge term that keeps the fit stable with few or collinear samples
+RIDGE = 1e-3
+
+FEATURE_NAMES = ('bias', 'pages', 'page_megapixels', 'paths_k', 'texts_k',
+                 'images', 'raster_mb', 'pdf')
+
+def job_features(stats, dpi, output_format='png'):
+    """Feature vector of one render job (see FEATURE_NAMES)"""
+    pages = stats['pages']
+    area = megapixels(stats, render_dpi(stats, dpi, output_format))
+    return [
+        1.0,
+        float(pages),
+        pages * area,
+        stats.get('path_count', 0) / 1000.0,
+        stats.get('text_count', 0) / 1000.0,
+        float(stats.get('image_count', 0)),
+        stats.get('raster_bytes', 0) / (1024.0 * 1024.0),
+        0.0 if output_format == 'png' else 1.0
+    ]
+
+def solve_linear(matrix, vector):
+    """Solve matrix x = vector by Gaussian elimination with partial pivoting"""
+    n = len(vector)
+    rows = [list(matrix[i]) + [vector[i]] for i in range(n)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(rows[r][col]))
+        if abs(rows[pivot][col]) < 1e-12:
+            return None
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        for r in range(col + 1, n):
+            factor = rows[r][col] / rows[col][col]
+            for c in range(col, n + 1):
+                rows[r][c] -= factor * rows[col][c]
+    solution = [0.0] * n
+    for r in range(n - 1, -1, -1):
+        total = rows[r][n] - sum(rows[r][c] * solution[c] for c in range(r + 1, n))
+        solution[r] = total / rows[r][r]
+    return solution
+
+class CostModel:
+    """
+    Linear regression of render seconds on job features, fitted with ridge
+    least squares over the stored samples. Samples are added as files
+    finish; fit() and save() run once at the end of each batch.
+    """
+    def __init__(self, path=None):
+        self.path = path or os.path.join(MODEL_DIR, MODEL_FILENAME)
+        self.samples = []
+        self.coefficients = None
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get('features') != list(FEATURE_NAMES):
+            # Feature set changed: old samples no longer fit
+            return
+        self.samples = data.get('samples', [])
+        self.coefficients = data.get('coefficients')
+
+    @property
+    def ready(self):
+        return self.coefficients is not None
+
+    def add_sample(self, features, seconds):
+        self.samples.append({'features': features, 'seconds': seconds, 'time': time.time()})
+        if len(self.samples) > MAX_SAMPLES:
+            self.samples = self.samples[-MAX_SAMPLES:]
+
+    def fit(self):
+        """Refit the coefficients; returns True if the model is usable"""
+        if len(self.samples) < MIN_SAMPLES:
+            return False
+        n = len(FEATURE_NAMES)
+        xtx = [[0.0] * n for _ in range(n)]
+        xty = [0.0] * n
+        for sample in self.samples:
+            x = sample['features']
+            for i in range(n):
+                xty[i] += x[i] * sample['seconds']
+                for j in range(n):
+                    xtx[i][j] += x[i] * x[j]
+        # Do not shrink the intercept
+        for i in range(1, n):
+            xtx[i][i] += RIDGE * len(self.samples)
+        coefficients = solve_linear(xtx, xty)
+        if coefficients is None:
+            return False
+        self.coefficients = coefficients
+        return True
+
+    def predict(self, features):
+        """Predicted seconds for a job, or None while the model is untrained"""
+        if not self.ready:
+            return None
+        seconds = sum(c * x for c, x in zip(self.coefficients, features))
+        # A linear fit can undershoot for tiny jobs; never predict free work
+        return max(0.1, seconds)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'features': list(FEATURE_NAMES),
+                'coefficients': self.coefficients,
+                'samples': self.samples
+            }, f)
+        os.replace(temp_path, self.path)
+
+class PageTimer:
+    """Per-page render times, measured between successive page completions"""
+    def __init__(self):
+        self.last = None
+        self.durations = {}
+
+    def start(self):
+        self.last = time.time()
+
+    def page_done(self, page_num):
+        now = time.time()
+        self.durations[page_num] = round(now - (self.last or now), 3)
+        self.last = now
+
+class EtaEstimator:
+    """
+    Time-weighted progress: each file counts by its estimated cost instead
+    of as one of N, and the remaining time is extrapolated from the cost
+    finished so far. Before anything finishes, costs that are already in
+    seconds (model or past timings) give a first guess.
+    """
+    def __init__(self, total_cost, workers=1, costs_in_seconds=False):
+        self.total_cost = total_cost
+        self.done_cost = 0.0
+        # Cost already done of files still rendering (their finished pages)
+        self.partial = {}
+        self.workers = max(1, workers)
+        self.costs_in_seconds = costs_in_seconds
+        self.started = time.time()
+
+    def advance(self, key, cost):
+        """Part of an unfinished file's cost is done"""
+        self.partial[key] = cost
+
+    def complete(self, cost, key=None):
+        self.partial.pop(key, None)
+        self.done_cost += cost
+
+    @property
+    def progress_cost(self):
+        return self.done_cost + sum(self.partial.values())
+
+    @property
+    def fraction(self):
+        if self.total_cost <= 0:
+            return 1.0
+        return min(1.0, self.progress_cost / self.total_cost)
+
+    def remaining(self):
+        """Estimated seconds left, or None if there is nothing to go on yet"""
+        done = self.progress_cost
+        left = max(0.0, self.total_cost - done)
+        if done > 0:
+            return (time.time() - self.started) / done * left
+        if self.costs_in_seconds:
+            return left / self.workers
+        return None
+
+def format_duration(seconds):
+    """Short human-readable duration, e.g. '1h 05m', '3m 20s', '12s'"""
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds}s"
@@ -0,0 +1,603 @@
+# daemon.py - Local conversion daemon: JSON jobs over localhost HTTP, fair queue, warm state
+import os
+import sys
+import hmac
+import json
+import time
+import uuid
+import secrets
+import threading
+import urllib.request
+from collections import deque, OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, urlsplit, parse_qs
+
+from batch_jobs import normalize_job, prepare_job, run_merge, console_log
+from cost_model import CostModel
+from inkscape_shell import ShellPool
+from render_cache import cache_from_environment
+from scheduler import MemoryAwareScheduler, longest_first
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Each daemon writes a fresh token here (readable by its user only);
+# every request must carry it as "Authorization: Bearer <token>"
+TOKEN_DIR = os.path.join(os.path.expanduser('~'), '.inkscape_exporter')
+# Host headers accepted (anything else is a browser page reached through DNS rebinding)
+LOCAL_HOSTS = ('localhost', '127.0.0.1', '::1')
+
+# Finished jobs kept for status queries
+MAX_FINISHED_JOBS = 200
+# Progress events kept per job; older ones are dropped (clients that fall
+# further behind get a "skipped" event in their stream)
+MAX_JOB_EVENTS = 1000
+
+FINAL_STATES = ('done', 'failed', 'cancelled')
+
+def token_path(port=DEFAULT_PORT):
+    return os.path.join(TOKEN_DIR, f"daemon_{port}.token")
+
+def write_token(port):
+    """New random token for a daemon on port, in a file only this user can read"""
+    token = secrets.token_urlsafe(32)
+    os.makedirs(TOKEN_DIR, exist_ok=True)
+    path = token_path(port)
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+    # Created 0600 (never readable by others, not even briefly)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(token)
+    return token
+
+def read_token(port=DEFAULT_PORT):
+    with open(token_path(port), 'r', encoding='utf-8') as f:
+        return f.read().strip()
+
+def inside_folder(path, folder):
+    """Whether path is folder or below it (symlinks and '..' resolved)"""
+    path = os.path.realpath(path)
+    folder = os.path.realpath(folder)
+    return os.path.commonpath([path, folder]) == folder
+
+class DaemonJob:
+    """A submitted job, its state and the progress events streamed to clients"""
+    def __init__(self, spec, client):
+        self.id = uuid.uuid4().hex[:12]
+        self.spec = spec
+        self.client = client
+        self.kind = spec.get('type', 'convert')
+        self.state = 'queued'
+        self.result = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.events = deque(maxlen=MAX_JOB_EVENTS)
+        # seq of the next event: a client's cursor for resuming its stream
+        self.next_seq = 0
+        self.condition = threading.Condition()
+
+    def add_event(self, kind, **data):
+        with self.condition:
+            data.update({'seq': self.next_seq, 'type': kind, 'time': time.time()})
+            self.next_seq += 1
+            self.events.append(data)
+            self.condition.notify_all()
+
+    def set_state(self, state, **data):
+        self.state = state
+        if state == 'running':
+            self.started = time.time()
+        elif state in FINAL_STATES:
+            self.finished = time.time()
+        self.add_event('state', state=state, **data)
+
+    def wait_events(self, since, timeout=1.0):
+        """Kept events with seq >= since, waiting up to timeout for new ones"""
+        with self.condition:
+            if self.next_seq <= since and self.state not in FINAL_STATES:
+                self.condition.wait(timeout)
+            return [event for event in self.events if event['seq'] >= since]
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'client': self.client,
+            'type': self.kind,
+            'state': self.state,
+            'submitted': self.submitted,
+            'started': self.started,
+            'finished': self.finished,
+            'result': self.result,
+            'next_seq': self.next_seq,
+            'spec': self.spec
+        }
+
+class FairQueue:
+    """
+    Per-client FIFO queues served round-robin: pop_ready hands out the next
+    job of the next client in line that may start one, so one client
+    submitting a hundred jobs cannot starve another submitting one.
+    """
+    def __init__(self):
+        self.queues = OrderedDict()
+        self.condition = threading.Condition()
+
+    def submit(self, job):
+        with self.condition:
+            self.queues.setdefault(job.client, deque()).append(job)
+            self.condition.notify_all()
+
+    def cancel(self, job_id):
+        with self.condition:
+            for queue in self.queues.values():
+                for job in queue:
+                    if job.id == job_id:
+                        queue.remove(job)
+                        return job
+        return None
+
+    def depth(self):
+        with self.condition:
+            return {client: len(queue) for client, queue in self.queues.items() if queue}
+
+    def pop_ready(self, ready):
+        """The first queued job of the first client in line for which ready(job) holds, or None"""
+        with self.condition:
+            for client in list(self.queues):
+                queue = self.queues[client]
+                if queue and ready(queue[0]):
+                    # A client served goes to the back of the line
+                    self.queues.move_to_end(client)
+                    return queue.popleft()
+            return None
+
+class ConversionDaemon:
+    """
+    Runs submitted jobs on one long-lived memory-aware worker pool. Every
+    time a worker frees up, the dispatcher gives it the next file of the
+    next client in line (round-robin over clients, then over their
+    files), planning a client's next queued job once the files of its
+    last one have all been handed out; merge jobs start on their own
+    thread once the client's earlier jobs have finished. The Python side
+    (imports, learned cost model, source hash cache, render cache) stays
+    warm between jobs, and so does Inkscape: pages are exported by
+    long-lived "inkscape --shell" renderers (shell_pool), one per worker,
+    where the Inkscape supports it (1.1 and later).
+
+    Clients only describe the work: the daemon chooses the Inkscape it
+    runs (inkscape_path), and every output must be inside output_root.
+    """
+    def __init__(self, workers=None, memory_budget=None, log=None, cache_dir=None,
+                 inkscape_path=None, output_root=None):
+        self.workers = workers
+        self.memory_budget = memory_budget
+        self.inkscape_path = inkscape_path
+        self.output_root = os.path.realpath(output_root or os.getcwd())
+        self.log = log or console_log
+        self.queue = FairQueue()
+        self.jobs = OrderedDict()
+        self.jobs_lock = threading.Lock()
+        self.cost_model = CostModel()
+        self.render_cache = cache_from_environment(cache_dir, log=self.log)
+        self.shell_pool = ShellPool(max_idle=workers or os.cpu_count() or 1, log=self.log)
+        self.scheduler = MemoryAwareScheduler(max_workers=workers, memory_budget=memory_budget,
+                                              log=self.log, shell_pool=self.shell_pool)
+        # Files of started jobs waiting for a worker, per client (dispatcher thread only)
+        self.feeding = OrderedDict()
+        # Started, unfinished jobs per client
+        self.active = {}
+        self.active_lock = threading.Lock()
+        self.running = True
+        self.thread = threading.Thread(target=self.dispatch_loop, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.scheduler.wake()
+        self.shell_pool.close()
+
+    def submit(self, spec, client='default'):
+        if 'inkscape_path' in spec:
+            raise ValueError("inkscape_path is chosen by the daemon (serve --inkscape=...)")
+        if spec.get('type', 'convert') == 'convert':
+            spec = normalize_job(spec)
+            spec['inkscape_path'] = self.inkscape_path
+            output = spec['output_path']
+        elif not (spec.get('inputs') or spec.get('input_folder')) or not spec.get('output'):
+            raise ValueError("Merge jobs need 'inputs' or 'input_folder', and 'output'")
+        else:
+            output = spec['output']
+        if not inside_folder(output, self.output_root):
+            raise ValueError(f"Output {output} is outside the daemon's output folder {self.output_root}")
+        job = DaemonJob(spec, client)
+        with self.jobs_lock:
+            self.jobs[job.id] = job
+            self.prune_finished()
+        job.set_state('queued')
+        self.queue.submit(job)
+        self.scheduler.wake()
+        self.log(f"[DAEMON] Queued {job.kind} job {job.id} from {client}")
+        return job
+
+    def cancel(self, job_id):
+        job = self.queue.cancel(job_id)
+        if job:
+            job.set_state('cancelled')
+        return job
+
+    def get(self, job_id):
+        with self.jobs_lock:
+            return self.jobs.get(job_id)
+
+    def prune_finished(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.state in FINAL_STATES]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+    def status(self):
+        with self.jobs_lock:
+            jobs = list(self.jobs.values())
+        return {
+            'queued': self.queue.depth(),
+            'running': [job.id for job in jobs if job.state == 'running'],
+            'jobs': [{'id': job.id, 'client': job.client, 'type': job.kind, 'state': job.state}
+                     for job in jobs]
+        }
+
+    def dispatch_loop(self):
+        # Runs until stop(): refill keeps the scheduler supplied
+        self.scheduler.run([], refill=self.refill)
+
+    def refill(self, count):
+        """Up to count files for free workers (None once the daemon stops)"""
+        if not self.running:
+            return None
+        jobs = []
+        while len(jobs) < count:
+            job = self.next_render_job()
+            if job is None:
+                break
+            jobs.append(job)
+        return jobs
+
+    def next_render_job(self):
+        """The next file in line: one per client in turn, after starting the next job of idle clients"""
+        job = self.queue.pop_ready(self.can_start)
+        while job is not None:
+            self.start_job(job)
+            job = self.queue.pop_ready(self.can_start)
+        for client in list(self.feeding):
+            waiting = self.feeding[client]
+            if waiting:
+                self.feeding.move_to_end(client)
+                return waiting.popleft()
+            del self.feeding[client]
+        return None
+
+    def can_start(self, job):
+        if self.feeding.get(job.client):
+            return False
+        # A merge may read what the client's earlier jobs write
+        with self.active_lock:
+            return job.kind == 'convert' or not self.active.get(job.client)
+
+    def start_job(self, job):
+        with self.active_lock:
+            self.active[job.client] = self.active.get(job.client, 0) + 1
+        job.set_state('running')
+        if job.kind != 'convert':
+            threading.Thread(target=self.run_merge_job, args=(job,), daemon=True).start()
+            return
+
+        def log(message, job=job):
+            job.add_event('log', message=message)
+
+        def progress(current, total, message, job=job):
+            job.add_event('progress', current=current, total=total, message=message)
+
+        def eta(seconds_left, fraction, job=job):
+            job.add_event('eta', seconds_left=seconds_left, fraction=fraction)
+
+        try:
+            plan = prepare_job(job.spec, log, self.cost_model, progress, eta, self.render_cache)
+            if plan is None:
+                job.result = {'success': False}
+                job.set_state('failed', error="Nothing to convert")
+                self.job_finished(job)
+                return
+            plan.begin(self.scheduler)
+        except Exception as e:
+            self.log(f"[DAEMON] Error starting job {job.id}: {e}")
+            job.set_state('failed', error=str(e))
+            self.job_finished(job)
+            return
+
+        plan.remaining = len(plan.jobs)
+        for render_job in plan.jobs:
+            render_job.log = render_job.log or plan.log
+            render_job.on_done = self.counting(job, plan, render_job.on_done)
+        self.feeding[job.client] = deque(longest_first(plan.jobs))
+        if not plan.jobs:
+            self.plan_done(job, plan)
+
+    def counting(self, job, plan, on_done):
+        """on_done of a file of plan, also finishing the job after its last file"""
+        def done(render_job):
+            try:
+                if on_done:
+                    on_done(render_job)
+            except Exception as e:
+                self.log(f"[DAEMON] Error in job {job.id}: {e}")
+            plan.remaining -= 1
+            if plan.remaining == 0:
+                self.plan_done(job, plan)
+        return done
+
+    def plan_done(self, job, plan):
+        self.cost_model.fit()
+        try:
+            self.cost_model.save()
+        except OSError as e:
+            self.log(f"[WARNING] Could not save render cost model: {e}")
+        # Summary, merge and manifest off the dispatcher thread
+        threading.Thread(target=self.finish_convert_job, args=(job, plan), daemon=True).start()
+
+    def finish_convert_job(self, job, plan):
+        try:
+            success = plan.finish(self.scheduler)
+            manifest = plan.manifest
+            job.result = {
+                'success': success,
+                'output_dir': manifest.output_dir,
+                'successful': manifest.successful,
+                'failed': manifest.failed,
+                'outputs': manifest.output_paths(),
+                'merged': manifest.merged
+            }
+            job.set_state('done' if success else 'failed')
+        except Exception as e:
+            self.log(f"[DAEMON] Error finishing job {job.id}: {e}")
+            job.set_state('failed', error=str(e))
+        finally:
+            self.job_finished(job)
+
+    def run_merge_job(self, job):
+        def log(message):
+            job.add_event('log', message=message)
+
+        try:
+            success = run_merge(job.spec, log)
+        except Exception as e:
+            log(f"[ERROR] Merge failed: {e}")
+            success = False
+        job.result = {'success': success, 'output': job.spec['output']}
+        job.set_state('done' if success else 'failed')
+        self.job_finished(job)
+
+    def job_finished(self, job):
+        with self.active_lock:
+            self.active[job.client] -= 1
+            if not self.active[job.client]:
+                del self.active[job.client]
+        # The client's next job may be waiting for this one
+        self.scheduler.wake()
+
+class DaemonRequestHandler(BaseHTTPRequestHandler):
+    """
+    POST /jobs                  submit a job (JSON; optional "client" for fair queuing)
+    GET  /jobs/<id>             job state and result
+    GET  /jobs/<id>/events      progress events as JSON lines, streamed until the job ends
+                                (?since=<seq> resumes after the events already read)
+    DELETE /jobs/<id>           cancel a queued job
+    GET  /status                queue depth per client and job states
+
+    Every request needs the daemon's token; requests from web pages (an
+    Origin header, or a Host other than localhost) are refused.
+    """
+    daemon_instance = None
+    token = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def refused(self):
+        """Send an error and return True unless the request may be served"""
+        if self.headers.get('Origin') is not None:
+            self.send_json(403, {'error': 'Requests from web pages are not accepted'})
+            return True
+        try:
+            host = urlsplit('//' + self.headers.get('Host', '')).hostname
+        except ValueError:
+            host = None
+        if host not in LOCAL_HOSTS:
+            self.send_json(403, {'error': 'Host must be localhost'})
+            return True
+        scheme, _, token = self.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not hmac.compare_digest(token.strip().encode('utf-8'),
+                                                                 self.token.encode('utf-8')):
+            self.send_json(401, {'error': 'Missing or wrong token (see the daemon token file)'})
+            return True
+        return False
+
+    def route(self):
+        parts = [p for p in urlparse(self.path).path.split('/') if p]
+        job = self.daemon_instance.get(parts[1]) if len(parts) >= 2 and parts[0] == 'jobs' else None
+        return parts, job
+
+    def do_GET(self):
+        if self.refused():
+            return
+        parts, job = self.route()
+        if parts == ['status']:
+            return self.send_json(200, self.daemon_instance.status())
+        if not job:
+            return self.send_json(404, {'error': 'No such job'})
+        if len(parts) == 2:
+            return self.send_json(200, job.to_dict())
+        if len(parts) == 3 and parts[2] == 'events':
+            return self.stream_events(job)
+        self.send_json(404, {'error': 'Not found'})
+
+    def stream_events(self, job):
+        query = parse_qs(urlparse(self.path).query)
+        since = int(query.get('since', ['0'])[0])
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.end_headers()
+        try:
+            while True:
+                events = job.wait_events(since)
+                if events and events[0]['seq'] > since:
+                    # Dropped before this client read them
+                    skipped = {'seq': since, 'type': 'skipped', 'count': events[0]['seq'] - since}
+                    self.wfile.write((json.dumps(skipped) + "\n").encode('utf-8'))
+                for event in events:
+                    self.wfile.write((json.dumps(event) + "\n").encode('utf-8'))
+                if events:
+                    since = events[-1]['seq'] + 1
+                self.wfile.flush()
+                if job.state in FINAL_STATES and since >= job.next_seq:
+                    return
+        except (BrokenPipeError, ConnectionResetError):
+            return
+
+    def do_POST(self):
+        if self.refused():
+            return
+        parts, _ = self.route()
+        if parts != ['jobs']:
+            return self.send_json(404, {'error': 'Not found'})
+        if self.headers.get_content_type() != 'application/json':
+            return self.send_json(415, {'error': 'Jobs must be sent as application/json'})
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            spec = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(spec, dict):
+                raise ValueError("A job must be a JSON object")
+            client = spec.pop('client', None) or self.client_address[0]
+            job = self.daemon_instance.submit(spec, client)
+        except (ValueError, KeyError) as e:
+            return self.send_json(400, {'error': str(e)})
+        self.send_json(202, {'id': job.id, 'state': job.state})
+
+    def do_DELETE(self):
+        if self.refused():
+            return
+        parts, job = self.route()
+        if not job:
+            return self.send_json(404, {'error': 'No such job'})
+        if not self.daemon_instance.cancel(job.id):
+            return self.send_json(409, {'error': f"Job is {job.state}, only queued jobs can be cancelled"})
+        self.send_json(200, {'id': job.id, 'state': 'cancelled'})
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, workers=None, memory_budget=None, log=None,
+          cache_dir=None, inkscape_path=None, output_root=None):
+    """Run the daemon until interrupted (binds to localhost by default)"""
+    daemon = ConversionDaemon(workers, memory_budget, log, cache_dir, inkscape_path, output_root)
+    server = ThreadingHTTPServer((host, port), DaemonRequestHandler)
+    port = server.server_address[1]
+    token = write_token(port)
+    server.RequestHandlerClass = type('Handler', (DaemonRequestHandler,),
+                                      {'daemon_instance': daemon, 'token': token})
+    server.daemon_threads = True
+    daemon.start()
+    daemon.log(f"[DAEMON] Listening on http://{host}:{port} (token in {token_path(port)})")
+    daemon.log(f"[DAEMON] Outputs allowed under: {daemon.output_root}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.stop()
+        server.server_close()
+        try:
+            os.remove(token_path(port))
+        except OSError:
+            pass
+    return 0
+
+# Client helpers (scripts, build systems, the GUI); the token is read from the daemon's token file
+def open_url(path, host=DEFAULT_HOST, port=DEFAULT_PORT, data=None, method='GET'):
+    headers = {'Authorization': f"Bearer {read_token(port)}"}
+    if data is not None:
+        headers['Content-Type'] = 'application/json'
+    request = urllib.request.Request(f"http://{host}:{port}{path}", data=data, headers=headers, method=method)
+    return urllib.request.urlopen(request)
+
+def submit_job(spec, host=DEFAULT_HOST, port=DEFAULT_PORT, client=None):
+    """Submit a job to a running daemon; returns its id"""
+    spec = dict(spec)
+    if client:
+        spec['client'] = client
+    with open_url("/jobs", host, port, json.dumps(spec).encode('utf-8'), 'POST') as response:
+        return json.loads(response.read())['id']
+
+def stream_events(job_id, host=DEFAULT_HOST, port=DEFAULT_PORT, since=0):
+    """Yield a job's progress events until it finishes"""
+    with open_url(f"/jobs/{job_id}/events?since={since}", host, port) as response:
+        for line in response:
+            if line.strip():
+                yield json.loads(line)
+
+def job_status(job_id, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    with open_url(f"/jobs/{job_id}", host, port) as response:
+        return json.loads(response.read())
+
+def main():
+    """Main function for command-line usage"""
+    options = {'host': DEFAULT_HOST, 'port': DEFAULT_PORT, 'workers': None, 'client': None, 'cache': None,
+               'inkscape': None, 'output-root': None}
+    args = []
+    for arg in sys.argv[1:]:
+        if arg.startswith('--') and '=' in arg:
+            key, value = arg[2:].split('=', 1)
+            options[key] = int(value) if key in ('port', 'workers') else value
+        else:
+            args.append(arg)
+
+    if args[:1] == ['serve']:
+        return serve(options['host'], options['port'], options['workers'], cache_dir=options['cache'],
+                     inkscape_path=options['inkscape'], output_root=options['output-root'])
+
+    if args[:1] == ['submit'] and len(args) == 2:
+        with open(args[1], 'r', encoding='utf-8') as f:
+            spec = json.load(f)
+        job_id = submit_job(spec, options['host'], options['port'], options['client'])
+        print(f"[DAEMON] Submitted job {job_id}")
+        for event in stream_events(job_id, options['host'], options['port']):
+            if event['type'] == 'log':
+                console_log(event['message'])
+            elif event['type'] == 'state':
+                print(f"[DAEMON] Job {job_id}: {event['state']}")
+            elif event['type'] == 'skipped':
+                print(f"[DAEMON] ({event['count']} older event(s) no longer kept)")
+        return 0 if job_status(job_id, options['host'], options['port'])['state'] == 'done' else 1
+
+    print("Usage: python daemon.py serve [--port=8765] [--workers=N] [--host=127.0.0.1] [--cache=dir]")
+    print("                                [--inkscape=path] [--output-root=dir]")
+    print("       python daemon.py submit <job.json> [--port=8765] [--client=name]")
+    print("\nOutputs must be inside --output-root (default: the folder the daemon starts in).")
+    print(f"Clients authenticate with the token the daemon writes to {token_path()}")
+    print("(port-specific). Inkscape 1.1+ stays running between files (inkscape --shell).")
+    print("\njob.json is one job as in batch_jobs.py, or a merge job:")
+    print('  {"type": "merge", "format": "pdf", "input_folder": "./output/pdf_files", "output": "./all.pdf"}')
+    print('  (PNG merges flatten transparency onto "background", "#ffffff" by default)')
+    print('  (PDF merges store shared fonts and images once unless "deduplicate" is false)')
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+# folder_scan.py - Folder scans off the Tk main thread: cancellable, incremental and cached
+import os
+import time
+import threading
+
+# Progress callbacks at most this often (and after every subfolder)
+PROGRESS_INTERVAL = 0.1
+
+# Scan results: (kind, folder) -> (signature, result). A signature holds the
+# mtimes of the scanned directories, which change when entries are added,
+# removed or renamed, so a cached result is checked with a few stat calls
+SCAN_CACHE = {}
+CACHE_LOCK = threading.Lock()
+
+class ScanCancelled(Exception):
+    pass
+
+def cache_key(kind, folder):
+    return kind, os.path.normcase(os.path.abspath(folder))
+
+def dir_mtime(path):
+    return os.stat(path).st_mtime_ns
+
+def scan_svg_files(folder, progress=None, cancelled=None):
+    """Names of the SVG files directly in folder (os.scandir order)"""
+    names = []
+    last_report = time.time()
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if cancelled and cancelled.is_set():
+                raise ScanCancelled()
+            if entry.name.lower().endswith('.svg') and entry.is_file():
+                names.append(entry.name)
+            if progress and time.time() - last_report >= PROGRESS_INTERVAL:
+                progress(len(names))
+                last_report = time.time()
+    return names
+
+def scan_png_tree(folder, progress=None, cancelled=None):
+    """
+    Subfolders of folder with the PNG files in each, as a list of
+    (subfolder name, [png names]) in os.scandir order (callers sort)
+    """
+    with os.scandir(folder) as entries:
+        subfolders = [entry.name for entry in entries if entry.is_dir()]
+    tree = []
+    png_count = 0
+    last_report = 0
+    for name in subfolders:
+        if cancelled and cancelled.is_set():
+            raise ScanCancelled()
+        with os.scandir(os.path.join(folder, name)) as entries:
+            pngs = [entry.name for entry in entries
+                    if entry.name.lower().endswith('.png') and entry.is_file()]
+        tree.append((name, pngs))
+        png_count += len(pngs)
+        if progress and time.time() - last_report >= PROGRESS_INTERVAL:
+            progress(len(tree), png_count)
+            last_report = time.time()
+    return tree
+
+SCANNERS = {
+    'svg': scan_svg_files,
+    'png_tree': scan_png_tree
+}
+
+def scan_signature(kind, folder, result):
+    signature = [dir_mtime(folder)]
+    if kind == 'png_tree':
+        signature.extend(dir_mtime(os.path.join(folder, name)) for name, pngs in result)
+    return signature
+
+def cached_scan(folder, kind):
+    """The cached result of scanning folder, if the folder is unchanged since; else None"""
+    with CACHE_LOCK:
+        known = SCAN_CACHE.get(cache_key(kind, folder))
+    if not known:
+        return None
+    signature, result = known
+    try:
+        if scan_signature(kind, folder, result) != signature:
+            return None
+    except OSError:
+        return None
+    return result
+
+def scan_folder(folder, kind, progress=None, cancelled=None, use_cache=True):
+    """Scan folder now (on this thread), reusing an unchanged cached result"""
+    if use_cache:
+        result = cached_scan(folder, kind)
+        if result is not None:
+            return result
+    # Directory mtimes are taken before listing, so changes during the scan invalidate it
+    before = dir_mtime(folder)
+    result = SCANNERS[kind](folder, progress, cancelled)
+    signature = scan_signature(kind, folder, result)
+    if signature[0] == before:
+        with CACHE_LOCK:
+            SCAN_CACHE[cache_key(kind, folder)] = (signature, result)
+    return result
+
+class FolderScan:
+    """
+    One scan on a background thread. on_progress gets incremental counts
+    (files; or subfolders and PNG files), on_done gets (result, error); both
+    run on the scan thread, so GUI callers post them to the main loop.
+    Nothing is reported after cancel().
+    """
+    def __init__(self, folder, kind, on_progress=None, on_done=None):
+        self.folder = folder
+        self.kind = kind
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.cancelled = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def progress(self, *counts):
+        if self.on_progress and not self.cancelled.is_set():
+            self.on_progress(*counts)
+
+    def run(self):
+        try:
+            result, error = scan_folder(self.folder, self.kind, self.progress, self.cancelled), None
+        except ScanCancelled:
+            return
+        except OSError as e:
+            result, error = None, e
+        if self.on_done and not self.cancelled.is_set():
+            self.on_done(result, error)
+
+    def cancel(self):
+        self.cancelled.set()
+
+class FolderScanner:
+    """Runs one scan at a time for its owner: a new scan cancels the previous one"""
+    def __init__(self):
+        self.current = None
+
+    def scan(self, folder, kind, on_progress=None, on_done=None):
+        self.cancel()
+        self.current = FolderScan(folder, kind, on_progress, on_done)
+        return self.current
+
+    def cancel(self):
+        if self.current:
+            self.current.cancel()
+            self.current = None
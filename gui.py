@@ -1,8 +1,19 @@
+import time
+# Startup is measured from here (see startup_timing.py)
+STARTED = time.perf_counter()
+
+import os
+import sys
 import tkinter as tk
 from tkinter import ttk
+from ui_events import UIEventBus, LOG_DIR
 import converter_tab
-import settings_tab
-import pdf_merge_tab
+
+# Tabs built the first time they are selected: attribute, label, module, class
+LAZY_TABS = [
+    ('pdf_merge_tab', 'PDF Merge', 'pdf_merge_tab', 'PDFMergeTab'),
+    ('settings_tab', 'Settings', 'settings_tab', 'SettingsTab')
+]
 
 class SVGtoPNGGUI:
     def __init__(self, root):
@@ -32,6 +43,17 @@ class SVGtoPNGGUI:
         
         # Reference to log text widget (will be set by converter tab)
         self.log_text = None
+        self.log = None
+        
+        # Lazy tabs stay None until first selected
+        self.pdf_merge_tab = None
+        self.settings_tab = None
+        self.tab_holders = {}
+        # Last converter run manifest, handed to the PDF merge tab once it exists
+        self.last_manifest = None
+        
+        # Worker threads reach the widgets only through this queue
+        self.events = UIEventBus(self.root)
         
         self.setup_ui()
     
@@ -41,29 +63,49 @@ class SVGtoPNGGUI:
         main_container.pack(fill='both', expand=True, padx=5, pady=5)
         
         # Create notebook for tabs
-        notebook = ttk.Notebook(main_container)
-        notebook.pack(fill='both', expand=True)
+        self.notebook = ttk.Notebook(main_container)
+        self.notebook.pack(fill='both', expand=True)
         
-        # Initialize all tabs
-        self.converter_tab = converter_tab.ConverterTab(notebook, self.shared_vars, self)
-        self.pdf_merge_tab = pdf_merge_tab.PDFMergeTab(notebook, self.shared_vars, self)
-        self.settings_tab = settings_tab.SettingsTab(notebook, self.shared_vars, self)
+        # Only the converter tab is built up front
+        self.converter_tab = converter_tab.ConverterTab(self.notebook, self.shared_vars, self)
+        self.notebook.add(self.converter_tab.frame, text='SVG to PNG')
         
-        # Add tabs to notebook
-        notebook.add(self.converter_tab.frame, text='SVG to PNG')
-        notebook.add(self.pdf_merge_tab.frame, text='PDF Merge')
-        notebook.add(self.settings_tab.frame, text='Settings')
+        # The others get an empty holder; their module is imported on first selection
+        for attribute, label, module_name, class_name in LAZY_TABS:
+            holder = ttk.Frame(self.notebook)
+            self.notebook.add(holder, text=label)
+            self.tab_holders[str(holder)] = (attribute, module_name, class_name, holder)
+        self.notebook.bind('<<NotebookTabChanged>>', self.on_tab_changed)
+    
+    def on_tab_changed(self, event=None):
+        holder_name = self.notebook.select()
+        if holder_name in self.tab_holders:
+            self.build_tab(*self.tab_holders.pop(holder_name))
+    
+    def build_tab(self, attribute, module_name, class_name, holder):
+        module = __import__(module_name)
+        tab = getattr(module, class_name)(holder, self.shared_vars, self)
+        tab.frame.pack(fill='both', expand=True)
+        setattr(self, attribute, tab)
+        if attribute == 'pdf_merge_tab' and self.last_manifest:
+            tab.set_manifest(self.last_manifest)
+        return tab
+    
+    def hand_over_manifest(self, manifest):
+        """Give the PDF merge tab the converter's run manifest (now, or when it is built)"""
+        self.last_manifest = manifest
+        if self.pdf_merge_tab:
+            self.pdf_merge_tab.set_manifest(manifest)
     
     def set_log_widget(self, log_widget):
         """Allow converter tab to set the log widget reference"""
         self.log_text = log_widget
+        self.log = self.events.add_log_view('converter', log_widget, os.path.join(LOG_DIR, 'converter.log'))
     
     def log_message(self, message):
-        """Centralized logging that both tabs can use"""
-        if self.log_text:
-            self.log_text.insert(tk.END, message + "\n")
-            self.log_text.see(tk.END)
-            self.root.update()
+        """Centralized logging that both tabs can use (safe from any thread)"""
+        if self.log:
+            self.log(message)
 
 def main():
     root = tk.Tk()
@@ -81,6 +123,11 @@ def main():
     center_y = int(screen_height/2 - window_height/2)
     root.geometry(f'{window_width}x{window_height}+{center_x}+{center_y}')
     
+    # --startup-time: report time to first frame and the import breakdown, then quit
+    if '--startup-time' in sys.argv:
+        from startup_timing import report_startup
+        report_startup(root, STARTED)
+    
     app = SVGtoPNGGUI(root)
     root.mainloop()
 
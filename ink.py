@@ -1,38 +1,32 @@
-import subprocess
 import os
 import sys
 
+from inkscape_probe import probe_inkscape
+
 INKSCAPE_PATH = r"C:\Program Files\Inkscape\bin\inkscape.exe"
 
 def check_inkscape():
     """Check Inkscape version and available options"""
-    try:
-        # Check version
-        result = subprocess.run([INKSCAPE_PATH, "--version"], 
-                              capture_output=True, text=True, encoding='utf-8')
-        print("📊 Inkscape Version Info:")
-        print(result.stdout)
-        
-        # Check available export options
-        result = subprocess.run([INKSCAPE_PATH, "--help"], 
-                              capture_output=True, text=True, encoding='utf-8')
-        
-        # Look for export-related options
-        print("\n🔍 Checking for export-pages option...")
-        if "--export-pages" in result.stdout:
-            print("✅ --export-pages option is AVAILABLE")
+    # Fresh probe; the result also updates the cache the converters use
+    capabilities = probe_inkscape(INKSCAPE_PATH, refresh=True)
+    if capabilities is None:
+        print(f"❌ Error checking Inkscape: could not run {INKSCAPE_PATH}")
+        return
+    
+    print("📊 Inkscape Version Info:")
+    print(capabilities.version)
+    
+    print("\n🔍 Checking export options...")
+    for option, present in (("--export-type", capabilities.export_type),
+                            ("--export-page", capabilities.export_page),
+                            ("--actions", capabilities.actions),
+                            ("--shell", capabilities.shell)):
+        if present:
+            print(f"✅ {option} option is AVAILABLE")
         else:
-            print("❌ --export-pages option NOT FOUND")
-            
-        # Print first few lines of help to see syntax
-        print("\n📋 First 50 lines of --help output:")
-        lines = result.stdout.split('\n')[:50]
-        for line in lines:
-            if 'export' in line.lower():
-                print(f"  {line}")
-                
-    except Exception as e:
-        print(f"❌ Error checking Inkscape: {e}")
+            print(f"❌ {option} option NOT FOUND")
+    
+    print(f"\n📋 Export types: {', '.join(capabilities.export_types)}")
 
 if __name__ == "__main__":
     check_inkscape()
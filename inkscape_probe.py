@@ -0,0 +1,180 @@
+# inkscape_probe.py - What an Inkscape binary supports, probed once and cached on disk
+import os
+import re
+import json
+import threading
+import subprocess
+
+# Stored per user, next to the render cost model
+PROBE_DIR = os.path.join(os.path.expanduser('~'), '.inkscape_exporter')
+PROBE_FILENAME = "inkscape_capabilities.json"
+
+PROBE_TIMEOUT = 60.0
+
+# Export types of Inkscape 1.x when --help does not list them
+DEFAULT_EXPORT_TYPES = ['svg', 'png', 'ps', 'eps', 'pdf', 'emf', 'wmf', 'xaml']
+# Inkscape 0.92 has one --export-<type>=FILE option per type instead of --export-type
+LEGACY_EXPORT_TYPES = ['png', 'pdf', 'ps', 'eps', 'emf', 'wmf', 'xaml']
+
+# Probed binaries of this process: real path -> (signature, capabilities)
+PROBED = {}
+PROBE_LOCK = threading.Lock()
+
+class InkscapeCapabilities:
+    """Version and command-line features of one Inkscape binary"""
+    def __init__(self, version='', export_type=True, export_page=False, actions=False,
+                 shell=False, export_types=None):
+        self.version = version
+        self.export_type = export_type
+        self.export_page = export_page
+        self.actions = actions
+        self.shell = shell
+        self.export_types = export_types or []
+
+    @property
+    def version_tuple(self):
+        match = re.search(r'(\d+)\.(\d+)(?:\.(\d+))?', self.version)
+        return tuple(int(part or 0) for part in match.groups()) if match else ()
+
+    def supports(self, output_format):
+        return output_format in self.export_types
+
+    def describe(self):
+        features = [name for name, present in (('export-page', self.export_page),
+                                               ('actions', self.actions),
+                                               ('shell', self.shell)) if present]
+        if not self.export_type:
+            features.append('legacy export options')
+        return (f"{self.version or 'Inkscape (unknown version)'}: "
+                f"{', '.join(features) or 'no page export'}; "
+                f"exports {', '.join(self.export_types) or 'nothing'}")
+
+    def to_dict(self):
+        return {
+            'version': self.version,
+            'export_type': self.export_type,
+            'export_page': self.export_page,
+            'actions': self.actions,
+            'shell': self.shell,
+            'export_types': self.export_types
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('version', ''), data.get('export_type', True), data.get('export_page', False),
+                   data.get('actions', False), data.get('shell', False), data.get('export_types'))
+
+def parse_help(version_text, help_text):
+    """Capabilities from the output of --version and --help"""
+    version = version_text.strip().split('\n')[0].strip()
+    export_type = '--export-type' in help_text
+    if export_type:
+        # e.g. "--export-type=TYPE[,TYPE]*  File type(s) to export: [svg,png,ps,eps,pdf,emf,wmf,xaml]"
+        listed = re.search(r'--export-type\S*[^\n\[]*\[([a-z0-9,\s]+)\]', help_text)
+        if listed:
+            export_types = [t.strip() for t in listed.group(1).split(',') if t.strip()]
+        else:
+            export_types = list(DEFAULT_EXPORT_TYPES)
+    else:
+        export_types = [t for t in LEGACY_EXPORT_TYPES if f'--export-{t}' in help_text]
+    return InkscapeCapabilities(
+        version=version,
+        export_type=export_type,
+        # --export-page (Inkscape 1.2+), not the older --export-page-* options
+        export_page=bool(re.search(r'--export-page(?![-\w])', help_text)),
+        actions='--actions' in help_text,
+        shell='--shell' in help_text,
+        export_types=export_types
+    )
+
+def binary_signature(inkscape_path):
+    stat = os.stat(inkscape_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def load_probe_cache(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_probe_cache(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    os.replace(temp_path, path)
+
+def run_probe(inkscape_path):
+    """Run --version and --help; returns capabilities or None if Inkscape does not answer"""
+    try:
+        version = subprocess.run([inkscape_path, '--version'], capture_output=True, text=True,
+                                 encoding='utf-8', errors='replace', timeout=PROBE_TIMEOUT)
+        help_output = subprocess.run([inkscape_path, '--help'], capture_output=True, text=True,
+                                     encoding='utf-8', errors='replace', timeout=PROBE_TIMEOUT)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if version.returncode != 0 and help_output.returncode != 0:
+        return None
+    # Some builds print help or version to stderr
+    return parse_help(version.stdout or version.stderr, help_output.stdout + help_output.stderr)
+
+def probe_inkscape(inkscape_path, log=None, cache_path=None, refresh=False):
+    """
+    Capabilities of inkscape_path, probed once per binary (path, size and
+    mtime) and remembered in memory and on disk. Returns None if the
+    binary cannot be run; callers then fall back to trial and error.
+    """
+    if not inkscape_path:
+        return None
+    real_path = os.path.realpath(inkscape_path)
+    try:
+        signature = binary_signature(real_path)
+    except OSError:
+        return None
+
+    with PROBE_LOCK:
+        known = PROBED.get(real_path)
+        if known and known[0] == signature and not refresh:
+            return known[1]
+
+        cache_path = cache_path or os.path.join(PROBE_DIR, PROBE_FILENAME)
+        data = load_probe_cache(cache_path)
+        entry = data.get(real_path)
+        if entry and entry.get('signature') == signature and not refresh:
+            capabilities = InkscapeCapabilities.from_dict(entry['capabilities'])
+        else:
+            capabilities = run_probe(real_path)
+            if capabilities is None:
+                if log:
+                    log(f"[WARNING] Could not probe Inkscape at: {inkscape_path}")
+                return None
+            if log:
+                log(f"[INKSCAPE] {capabilities.describe()}")
+            data[real_path] = {'signature': signature, 'capabilities': capabilities.to_dict()}
+            try:
+                save_probe_cache(cache_path, data)
+            except OSError:
+                # Still probed once per process
+                pass
+
+        PROBED[real_path] = (signature, capabilities)
+        return capabilities
+
+def export_command(capabilities, inkscape_path, svg_path, output_format, output_file, dpi=None, page=None):
+    """
+    The one export command this Inkscape understands, as an argv list (run
+    without a shell, so paths need no quoting). capabilities None (binary
+    not probed) gives the Inkscape 1.x syntax.
+    """
+    if capabilities and not capabilities.export_type:
+        # Inkscape 0.92: no pages, one option per export type
+        argv = [inkscape_path, '-z', svg_path, f'--export-{output_format}={output_file}']
+        return argv + ([f'--export-dpi={dpi}'] if dpi else [])
+    argv = [inkscape_path, svg_path, f'--export-type={output_format}']
+    if page:
+        argv.append(f'--export-page={page}')
+    if dpi:
+        argv.append(f'--export-dpi={dpi}')
+    argv.append(f'--export-filename={output_file}')
+    return argv
@@ -0,0 +1,487 @@
+# inkscape_runner.py - Runs Inkscape exports with timeouts, process-tree kill and retries
+import os
+import sys
+import json
+import time
+import signal
+import threading
+import shutil
+import subprocess
+from collections import deque
+
+import telemetry
+from svg_stats import megapixels
+
+# psutil is optional: CPU affinity and I/O priority outside Linux
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Failures worth retrying: a hung, crashed or memory-capped Inkscape may
+# succeed next time, a clean "no such page" exit will not
+RETRYABLE_REASONS = ('timeout', 'crash', 'memory_limit')
+
+QUARANTINE_FILENAME = ".quarantine.json"
+
+# Inkscape can print megabytes of GTK warnings; only the tail of stderr is kept
+MAX_CAPTURE_BYTES = 64 * 1024
+
+# How often a memory-capped Inkscape's RSS is checked
+MEMORY_POLL_INTERVAL = 0.25
+
+# Live Inkscape processes (pid -> job id), so a scheduler can watch their memory
+ACTIVE_PROCESSES = {}
+ACTIVE_PROCESSES_LOCK = threading.Lock()
+
+# Set by the scheduler in each worker thread to tag the processes it spawns
+# (key: the scheduler's job id) and to say which of its worker slots runs them (slot of slots);
+# shell_pool, if set, is an inkscape_shell.ShellPool exports may run in
+JOB_CONTEXT = threading.local()
+
+class TimeoutPolicy:
+    """Per-page and per-file timeouts scaled to the expected render cost"""
+    def __init__(self, base=60.0, per_megapixel=10.0, minimum=30.0, maximum=3600.0):
+        self.base = base
+        self.per_megapixel = per_megapixel
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def page_timeout(self, stats, dpi):
+        seconds = self.base + self.per_megapixel * megapixels(stats, dpi)
+        return max(self.minimum, min(self.maximum, seconds))
+
+    def file_timeout(self, stats, dpi):
+        # One extra page: the export loop probes the page after the last one
+        return self.page_timeout(stats, dpi) * (stats['pages'] + 1)
+
+class RetryPolicy:
+    """Bounded retries with exponential backoff"""
+    def __init__(self, max_attempts=3, initial_delay=1.0, backoff=2.0):
+        self.max_attempts = max_attempts
+        self.initial_delay = initial_delay
+        self.backoff = backoff
+
+    def delay(self, attempt):
+        """Seconds to wait before retry number attempt (1-based)"""
+        return self.initial_delay * (self.backoff ** (attempt - 1))
+
+class ResourceLimits:
+    """
+    Per-process controls for Inkscape children:
+      memory_limit  RSS cap in bytes; the process tree is killed when it grows past it
+      nice          CPU niceness 1-19 (Windows: below normal, or idle from 15)
+      ionice        'idle' or 'low' disk priority (Linux via ionice, elsewhere psutil)
+      cpu_affinity  True to split this machine's CPUs between the workers, or a
+                    list of CPU ids to split; each worker slot gets its own cores
+    """
+    def __init__(self, memory_limit=None, nice=None, ionice=None, cpu_affinity=None):
+        self.memory_limit = memory_limit
+        self.nice = nice
+        self.ionice = ionice
+        self.cpu_affinity = cpu_affinity
+
+    @classmethod
+    def from_config(cls, data):
+        """From a config dict (memory_limit_mb, nice, ionice, cpu_affinity); None if empty"""
+        if not data:
+            return None
+        memory_limit = int(float(data['memory_limit_mb']) * 1024 * 1024) if data.get('memory_limit_mb') else None
+        return cls(memory_limit, data.get('nice'), data.get('ionice'), data.get('cpu_affinity'))
+
+    @classmethod
+    def from_args(cls, argv):
+        """
+        Pull --memory-limit=MB, --nice=N, --ionice=idle|low and --pin-cpus
+        out of a command line; returns (limits or None, remaining args)
+        """
+        config = {}
+        remaining = []
+        for arg in argv:
+            if arg.startswith('--memory-limit='):
+                config['memory_limit_mb'] = arg.split('=', 1)[1]
+            elif arg.startswith('--nice='):
+                config['nice'] = int(arg.split('=', 1)[1])
+            elif arg.startswith('--ionice='):
+                config['ionice'] = arg.split('=', 1)[1]
+            elif arg == '--pin-cpus':
+                config['cpu_affinity'] = True
+            else:
+                remaining.append(arg)
+        return cls.from_config(config), remaining
+
+    def to_config(self):
+        return {
+            'memory_limit_mb': self.memory_limit // (1024 * 1024) if self.memory_limit else None,
+            'nice': self.nice,
+            'ionice': self.ionice,
+            'cpu_affinity': self.cpu_affinity
+        }
+
+    def cpus_for(self, slot, slots):
+        """This worker slot's share of the allowed CPUs, or None for no pinning"""
+        if not self.cpu_affinity:
+            return None
+        if isinstance(self.cpu_affinity, (list, tuple)):
+            cpus = sorted(self.cpu_affinity)
+        elif hasattr(os, 'sched_getaffinity'):
+            cpus = sorted(os.sched_getaffinity(0))
+        else:
+            cpus = list(range(os.cpu_count() or 1))
+        per_slot = max(1, len(cpus) // max(1, slots))
+        start = (slot * per_slot) % len(cpus)
+        return cpus[start:start + per_slot]
+
+    def command(self, argv):
+        """argv, prefixed with ionice on Linux (it execs Inkscape, so the pid is unchanged)"""
+        if self.ionice and sys.platform.startswith('linux') and shutil.which('ionice'):
+            io_class = ['-c', '3'] if self.ionice == 'idle' else ['-c', '2', '-n', '7']
+            return ['ionice'] + io_class + list(argv)
+        return argv
+
+    def creation_flags(self):
+        """Windows priority class for nice"""
+        if sys.platform != 'win32' or not self.nice:
+            return 0
+        if self.nice >= 15:
+            return subprocess.IDLE_PRIORITY_CLASS
+        return subprocess.BELOW_NORMAL_PRIORITY_CLASS
+
+    def apply(self, pid, slot=0, slots=1):
+        """Priority and affinity of a just-started child (best effort)"""
+        try:
+            if self.nice and sys.platform != 'win32':
+                os.setpriority(os.PRIO_PROCESS, pid, self.nice)
+            cpus = self.cpus_for(slot, slots)
+            windows_io = self.ionice and sys.platform == 'win32'
+            if cpus and hasattr(os, 'sched_setaffinity'):
+                os.sched_setaffinity(pid, cpus)
+            elif psutil and (cpus or windows_io):
+                proc = psutil.Process(pid)
+                if cpus and hasattr(proc, 'cpu_affinity'):
+                    proc.cpu_affinity(cpus)
+                if windows_io:
+                    proc.ionice(psutil.IOPRIO_VERYLOW if self.ionice == 'idle' else psutil.IOPRIO_LOW)
+        except Exception:
+            # The child already exited, or the platform lacks the control
+            pass
+
+DEFAULT_TIMEOUT_POLICY = TimeoutPolicy()
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+class RunOutcome:
+    def __init__(self, returncode, stdout, stderr, timed_out, duration, memory_exceeded=None):
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.timed_out = timed_out
+        self.duration = duration
+        # RSS that broke the memory limit, if the process was killed for it
+        self.memory_exceeded = memory_exceeded
+
+    @property
+    def reason(self):
+        """Failure class of this run, or None if Inkscape exited cleanly"""
+        if self.memory_exceeded:
+            return 'memory_limit'
+        if self.timed_out:
+            return 'timeout'
+        if self.returncode == 0:
+            return None
+        if self.returncode == 1:
+            return 'no_output'
+        # Killed by a signal (negative on POSIX) or an abnormal exit code
+        return 'crash'
+
+class PageOutcome:
+    def __init__(self, ok, failure=None, attempts=0):
+        self.ok = ok
+        self.failure = failure
+        self.attempts = attempts
+
+    @property
+    def retryable(self):
+        return bool(self.failure) and self.failure['reason'] in RETRYABLE_REASONS
+
+class ConversionResult:
+    """Result of converting one SVG file (subprocess-like, plus structured failure)"""
+    def __init__(self, files_created, failure=None, kind="PNG"):
+        self.files_created = files_created
+        self.failure = failure
+        if files_created and not failure:
+            self.returncode = 0
+            self.stdout = f"Created {len(files_created)} {kind} file(s)"
+            self.stderr = ""
+        else:
+            self.returncode = 1
+            self.stdout = f"Created {len(files_created)} {kind} file(s)" if files_created else ""
+            self.stderr = describe_failure(failure, kind)
+
+def make_failure(reason, page=None, attempts=1, returncode=None, stderr='', timeout=None, memory_limit=None):
+    failure = {
+        'reason': reason,
+        'page': page,
+        'attempts': attempts,
+        'returncode': returncode,
+        'timeout': timeout,
+        'stderr': (stderr or '').strip()[-500:]
+    }
+    if memory_limit:
+        failure['memory_limit'] = memory_limit
+    return failure
+
+def describe_failure(failure, kind="PNG"):
+    """Human-readable one-liner for a structured failure"""
+    if not failure:
+        return f"Failed to create any {kind} files"
+
+    page = f"page {failure['page']}" if failure.get('page') else "file"
+    attempts = failure.get('attempts') or 1
+    tries = f" ({attempts} attempts)" if attempts > 1 else ""
+    reason = failure['reason']
+
+    if reason == 'timeout':
+        message = f"Inkscape hung on {page}, killed after {failure['timeout']:.0f}s{tries}"
+    elif reason == 'file_timeout':
+        message = f"File time budget of {failure['timeout']:.0f}s exhausted before {page}"
+    elif reason == 'memory_limit':
+        message = (f"Inkscape went over the {failure['memory_limit'] / (1024 * 1024):.0f} MB memory limit "
+                   f"on {page} and was stopped{tries}")
+    elif reason == 'crash':
+        message = f"Inkscape crashed on {page} (exit code {failure['returncode']}){tries}"
+    elif reason == 'unsupported':
+        message = f"This Inkscape cannot export {kind} files"
+    elif reason == 'quarantined':
+        message = "Skipped: file is quarantined after repeated failures"
+    else:
+        message = f"Failed to create any {kind} files (exit code {failure['returncode']})"
+
+    if failure.get('stderr'):
+        message += f": {failure['stderr']}"
+    return message
+
+def kill_process_tree(proc):
+    """Kill a process and everything it spawned"""
+    try:
+        if sys.platform == 'win32':
+            subprocess.run(['taskkill', '/F', '/T', '/PID', str(proc.pid)],
+                           capture_output=True)
+        else:
+            # The child runs in its own session, so its pid is the group id
+            os.killpg(proc.pid, signal.SIGKILL)
+    except (OSError, subprocess.SubprocessError):
+        pass
+    try:
+        proc.kill()
+    except OSError:
+        pass
+
+class TailCapture:
+    """Drains a pipe on a thread, keeping only its last max_bytes"""
+    def __init__(self, pipe, max_bytes=MAX_CAPTURE_BYTES):
+        self.pipe = pipe
+        self.max_bytes = max_bytes
+        self.chunks = deque()
+        self.size = 0
+        self.thread = threading.Thread(target=self.drain, daemon=True)
+        self.thread.start()
+
+    def drain(self):
+        fd = self.pipe.fileno()
+        try:
+            while True:
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    break
+                self.chunks.append(chunk)
+                self.size += len(chunk)
+                while self.size - len(self.chunks[0]) >= self.max_bytes:
+                    self.size -= len(self.chunks.popleft())
+        except OSError:
+            pass
+        finally:
+            self.pipe.close()
+
+    def text(self, timeout=5.0):
+        self.thread.join(timeout)
+        return self.tail()
+
+    def tail(self):
+        """What was captured so far (the pipe may still be open)"""
+        return b''.join(list(self.chunks))[-self.max_bytes:].decode('utf-8', errors='replace')
+
+def process_group_options(limits=None):
+    """Popen options giving a child its own process group (so its whole tree can be killed)"""
+    kwargs = {}
+    if sys.platform == 'win32':
+        kwargs['creationflags'] = subprocess.CREATE_NEW_PROCESS_GROUP
+        if limits:
+            kwargs['creationflags'] |= limits.creation_flags()
+    else:
+        kwargs['start_new_session'] = True
+    return kwargs
+
+def run_command(argv, timeout, cwd=None, env=None, limits=None):
+    """
+    Run one Inkscape command (an argv list, no shell) with an explicit
+    working directory and environment (None inherits ours). On timeout,
+    or when it breaks the memory limit of limits (ResourceLimits), its
+    whole process tree is killed. stdout is discarded, stderr kept up to
+    MAX_CAPTURE_BYTES.
+    """
+    kwargs = process_group_options(limits)
+    if limits:
+        argv = limits.command(argv)
+
+    started = time.time()
+    # close_fds: the child inherits only its three standard handles
+    # (closed with one close_range call where the platform has it)
+    proc = subprocess.Popen(argv, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, cwd=cwd, env=env, close_fds=True, **kwargs)
+    stderr = TailCapture(proc.stderr)
+    if limits:
+        limits.apply(proc.pid, getattr(JOB_CONTEXT, 'slot', 0), getattr(JOB_CONTEXT, 'slots', 1))
+    with ACTIVE_PROCESSES_LOCK:
+        ACTIVE_PROCESSES[proc.pid] = getattr(JOB_CONTEXT, 'key', None)
+    memory_exceeded = None
+    try:
+        # stderr reaches EOF when Inkscape exits: blocking on the reader
+        # avoids the sleep-polling loop of wait(timeout)
+        if limits and limits.memory_limit:
+            memory_exceeded = watch_memory(proc, stderr, started + timeout, limits.memory_limit)
+        else:
+            stderr.thread.join(timeout)
+        timed_out = not memory_exceeded and stderr.thread.is_alive() and proc.poll() is None
+        if not timed_out and not memory_exceeded:
+            # A child can close stderr and keep running: the wait is bounded too
+            try:
+                proc.wait(timeout=max(0.0, started + timeout - time.time()))
+            except subprocess.TimeoutExpired:
+                timed_out = True
+        if timed_out or memory_exceeded:
+            kill_process_tree(proc)
+        proc.wait()
+    finally:
+        with ACTIVE_PROCESSES_LOCK:
+            ACTIVE_PROCESSES.pop(proc.pid, None)
+
+    return RunOutcome(proc.returncode, '', stderr.text(), timed_out, time.time() - started, memory_exceeded)
+
+def watch_memory(proc, stderr, deadline, memory_limit):
+    """Wait for proc until deadline, sampling its tree's RSS; returns the RSS that broke the limit"""
+    # Imported here: the scheduler imports this module
+    from scheduler import process_tree_rss
+    while True:
+        remaining = deadline - time.time()
+        stderr.thread.join(max(0.0, min(MEMORY_POLL_INTERVAL, remaining)))
+        if not stderr.thread.is_alive() or remaining <= 0 or proc.poll() is not None:
+            return None
+        rss = process_tree_rss([proc.pid]).get(proc.pid, 0)
+        if rss > memory_limit:
+            return rss
+
+def export_page(cmd, output_file, timeout, page=None, retry_policy=None, deadline=None, log=None,
+                limits=None):
+    """
+    Run an export command (argv list) until it exits cleanly with
+    output_file written, retrying hangs, crashes and memory-limit kills
+    with backoff (a file left by a killed run is deleted, never kept). The file-level
+    deadline caps every attempt. Inkscape runs in the output folder,
+    under limits (ResourceLimits) if given.
+    """
+    retry_policy = retry_policy or DEFAULT_RETRY_POLICY
+
+    # A stale file from an earlier run must not count as this run's output
+    if os.path.exists(output_file):
+        os.remove(output_file)
+    telemetry.page_started(page)
+
+    failure = None
+    for attempt in range(1, retry_policy.max_attempts + 1):
+        attempt_timeout = timeout
+        if deadline is not None:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return PageOutcome(False, make_failure('file_timeout', page, attempt - 1,
+                                                       timeout=timeout), attempt - 1)
+            attempt_timeout = min(timeout, remaining)
+
+        cwd = os.path.dirname(output_file) or None
+        # A warm shell renderer when the scheduler has a pool, else a process of its own
+        shell_pool = getattr(JOB_CONTEXT, 'shell_pool', None)
+        outcome = shell_pool.run(cmd, attempt_timeout, cwd, limits) if shell_pool else None
+        if outcome is None:
+            outcome = run_command(cmd, attempt_timeout, cwd=cwd, limits=limits)
+
+        if outcome.reason is None and os.path.exists(output_file):
+            telemetry.page_done(output_file, page)
+            return PageOutcome(True, None, attempt)
+        # A run killed for time or memory (or that failed) may have left half a file
+        if os.path.exists(output_file):
+            os.remove(output_file)
+
+        reason = outcome.reason or 'no_output'
+        failure = make_failure(reason, page, attempt, outcome.returncode, outcome.stderr,
+                               timeout=attempt_timeout, memory_limit=limits.memory_limit if limits else None)
+
+        if reason not in RETRYABLE_REASONS or attempt == retry_policy.max_attempts:
+            break
+
+        delay = retry_policy.delay(attempt)
+        if log:
+            if reason == 'timeout':
+                what = "timed out"
+            elif reason == 'memory_limit':
+                what = f"went over the memory limit ({outcome.memory_exceeded / (1024 * 1024):.0f} MB)"
+            else:
+                what = f"crashed (exit code {outcome.returncode})"
+            log(f"  [RETRY] Page {page} {what}, retrying in {delay:.0f}s "
+                f"(attempt {attempt + 1}/{retry_policy.max_attempts})")
+        time.sleep(delay)
+
+    return PageOutcome(False, failure, failure['attempts'])
+
+class Quarantine:
+    """
+    Files that failed with a hang or crash in quarantine_after separate runs
+    are skipped by later batches until their content changes.
+    """
+    def __init__(self, output_dir, quarantine_after=2):
+        self.path = os.path.join(output_dir, QUARANTINE_FILENAME)
+        self.quarantine_after = quarantine_after
+        self.entries = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f).get('files', {})
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def is_quarantined(self, svg_file, input_sha256):
+        entry = self.entries.get(svg_file)
+        if not entry or entry['input'] != input_sha256:
+            return None
+        return entry if entry['failures'] >= self.quarantine_after else None
+
+    def record_failure(self, svg_file, input_sha256, failure):
+        """Count a hang/crash failure; returns True if the file is now quarantined"""
+        entry = self.entries.get(svg_file)
+        if not entry or entry['input'] != input_sha256:
+            entry = {'input': input_sha256, 'failures': 0}
+        entry['failures'] += 1
+        entry['reason'] = failure['reason']
+        entry['page'] = failure.get('page')
+        entry['time'] = time.time()
+        self.entries[svg_file] = entry
+        self.save()
+        return entry['failures'] >= self.quarantine_after
+
+    def record_success(self, svg_file):
+        if self.entries.pop(svg_file, None) is not None:
+            self.save()
+
+    def save(self):
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'quarantine_after': self.quarantine_after, 'files': self.entries}, f, indent=2)
+        os.replace(temp_path, self.path)
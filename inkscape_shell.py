@@ -0,0 +1,220 @@
+# inkscape_shell.py - Warm Inkscape renderers: long-lived "inkscape --shell" processes reused across exports
+import os
+import json
+import time
+import queue
+import threading
+import subprocess
+
+from inkscape_runner import (RunOutcome, TailCapture, kill_process_tree, process_group_options,
+                             ACTIVE_PROCESSES, ACTIVE_PROCESSES_LOCK, JOB_CONTEXT, MEMORY_POLL_INTERVAL)
+from inkscape_probe import probe_inkscape
+
+# Inkscape prints this when it is ready for the next command line
+PROMPT = b'> '
+STARTUP_TIMEOUT = 60.0
+QUIT_TIMEOUT = 2.0
+# A renderer is restarted after this many exports (Inkscape leaks a little per document)
+MAX_EXPORTS_PER_RENDERER = 200
+# file-open, file-close and export-do as actions
+MIN_SHELL_VERSION = (1, 1)
+
+def shell_actions(argv, cwd=None):
+    """
+    The action line doing what an export_command argv does, or None if it
+    cannot run in a shell (legacy syntax, unknown options, paths the
+    action syntax cannot carry). Relative paths resolve against cwd, as
+    they would for a process started there.
+    """
+    if len(argv) < 3 or argv[1].startswith('-'):
+        return None
+    options = {}
+    for arg in argv[2:]:
+        name, _, value = arg.partition('=')
+        if name not in ('--export-type', '--export-page', '--export-dpi', '--export-filename') or not value:
+            return None
+        options[name[2:]] = value
+    if 'export-type' not in options or 'export-filename' not in options:
+        return None
+    svg_path = os.path.join(cwd or '', argv[1])
+    output_file = os.path.join(cwd or '', options['export-filename'])
+    if any(c in path for path in (svg_path, output_file) for c in ';\n\r'):
+        return None
+    # Export settings outlive a document in the shell: every one is set each time
+    actions = [f"file-open:{os.path.abspath(svg_path)}",
+               f"export-type:{options['export-type']}",
+               f"export-dpi:{options.get('export-dpi', 96)}"]
+    if 'export-page' in options:
+        actions.append(f"export-page:{options['export-page']}")
+    actions += [f"export-filename:{os.path.abspath(output_file)}", "export-do", "file-close"]
+    return '; '.join(actions)
+
+class ShellRenderer:
+    """One "inkscape --shell" process, running one action line at a time"""
+    def __init__(self, inkscape_path, limits=None):
+        argv = [inkscape_path, '--shell']
+        if limits:
+            argv = limits.command(argv)
+        self.proc = subprocess.Popen(argv, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                     stderr=subprocess.PIPE, close_fds=True, **process_group_options(limits))
+        self.stderr = TailCapture(self.proc.stderr)
+        self.output = queue.Queue()
+        self.exports = 0
+        threading.Thread(target=self.read_output, daemon=True).start()
+
+    def read_output(self):
+        fd = self.proc.stdout.fileno()
+        try:
+            while True:
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    break
+                self.output.put(chunk)
+        except OSError:
+            pass
+        finally:
+            self.output.put(None)
+
+    def wait_prompt(self, deadline, memory_limit=None):
+        """
+        Wait for the prompt: returns ('ok', None), ('timeout', None),
+        ('exited', None) or ('memory', rss)
+        """
+        # Imported here: the scheduler imports inkscape_runner
+        from scheduler import process_tree_rss
+        received = b''
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return 'timeout', None
+            try:
+                chunk = self.output.get(timeout=min(MEMORY_POLL_INTERVAL, remaining))
+            except queue.Empty:
+                chunk = b''
+            if chunk is None:
+                return 'exited', None
+            received = (received + chunk)[-len(PROMPT) - 1:]
+            if received.endswith(PROMPT):
+                return 'ok', None
+            if memory_limit:
+                rss = process_tree_rss([self.proc.pid]).get(self.proc.pid, 0)
+                if rss > memory_limit:
+                    return 'memory', rss
+
+    def start(self):
+        """Wait for the first prompt; False if this Inkscape does not come up"""
+        return self.wait_prompt(time.time() + STARTUP_TIMEOUT)[0] == 'ok'
+
+    def run(self, actions, timeout, memory_limit=None):
+        try:
+            self.proc.stdin.write((actions + '\n').encode('utf-8'))
+            self.proc.stdin.flush()
+        except OSError:
+            return 'exited', None
+        return self.wait_prompt(time.time() + timeout, memory_limit)
+
+    def close(self):
+        try:
+            self.proc.stdin.write(b'quit\n')
+            self.proc.stdin.close()
+            self.proc.wait(timeout=QUIT_TIMEOUT)
+        except (OSError, subprocess.TimeoutExpired):
+            kill_process_tree(self.proc)
+            self.proc.wait()
+
+    def kill(self):
+        kill_process_tree(self.proc)
+        self.proc.wait()
+
+class ShellPool:
+    """
+    Idle shell renderers per Inkscape binary and resource limits, handed
+    to one export at a time. run() takes the argv of an export command and
+    returns a RunOutcome like run_command, or None when the export has to
+    run as its own process (old Inkscape, no shell, an unusual command).
+    A renderer that hangs, crashes or breaks the memory limit is killed,
+    so the retry of that page gets a fresh one.
+    """
+    def __init__(self, max_idle=4, log=None):
+        self.max_idle = max_idle
+        self.log = log
+        self.idle = {}
+        self.supported = {}
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def usable(self, inkscape_path):
+        known = self.supported.get(inkscape_path)
+        if known is None:
+            capabilities = probe_inkscape(inkscape_path, log=self.log)
+            known = bool(capabilities and capabilities.shell and capabilities.actions
+                         and capabilities.version_tuple >= MIN_SHELL_VERSION)
+            self.supported[inkscape_path] = known
+        return known
+
+    def acquire(self, key, limits):
+        with self.lock:
+            idle = self.idle.get(key)
+            if idle:
+                return idle.pop()
+        renderer = ShellRenderer(key[0], limits)
+        if not renderer.start():
+            renderer.kill()
+            # Startup failed: this binary's exports run as separate processes from now on
+            with self.lock:
+                first = self.supported.get(key[0]) is not False
+                self.supported[key[0]] = False
+            if first and self.log:
+                self.log(f"[WARNING] Inkscape shell did not start, exporting without it: {key[0]}")
+            return None
+        return renderer
+
+    def release(self, key, renderer):
+        with self.lock:
+            idle = self.idle.setdefault(key, [])
+            if not self.closed and renderer.exports < MAX_EXPORTS_PER_RENDERER and len(idle) < self.max_idle:
+                idle.append(renderer)
+                return
+        renderer.close()
+
+    def run(self, argv, timeout, cwd=None, limits=None):
+        actions = shell_actions(argv, cwd)
+        if actions is None or self.closed or not self.usable(argv[0]):
+            return None
+        key = (argv[0], json.dumps(limits.to_config(), sort_keys=True) if limits else None)
+        renderer = self.acquire(key, limits)
+        if renderer is None:
+            return None
+        if limits:
+            limits.apply(renderer.proc.pid, getattr(JOB_CONTEXT, 'slot', 0), getattr(JOB_CONTEXT, 'slots', 1))
+        started = time.time()
+        with ACTIVE_PROCESSES_LOCK:
+            ACTIVE_PROCESSES[renderer.proc.pid] = getattr(JOB_CONTEXT, 'key', None)
+        try:
+            status, rss = renderer.run(actions, timeout, limits.memory_limit if limits else None)
+        finally:
+            with ACTIVE_PROCESSES_LOCK:
+                ACTIVE_PROCESSES.pop(renderer.proc.pid, None)
+        duration = time.time() - started
+        if status == 'ok':
+            renderer.exports += 1
+            self.release(key, renderer)
+            return RunOutcome(0, '', '', False, duration)
+        renderer.kill()
+        stderr = renderer.stderr.tail()
+        if status == 'timeout':
+            return RunOutcome(renderer.proc.returncode, '', stderr, True, duration)
+        if status == 'memory':
+            return RunOutcome(renderer.proc.returncode, '', stderr, False, duration, memory_exceeded=rss)
+        # The shell never exits on its own: count it as a crash whatever its exit code
+        returncode = renderer.proc.returncode
+        return RunOutcome(returncode if returncode not in (0, 1) else -1, '', stderr, False, duration)
+
+    def close(self):
+        """Stop every idle renderer; busy ones stop when they are handed back"""
+        with self.lock:
+            self.closed = True
+            idle = [renderer for renderers in self.idle.values() for renderer in renderers]
+            self.idle = {}
+        for renderer in idle:
+            renderer.close()
@@ -0,0 +1,133 @@
+# journal.py - Append-only checkpoint journal for resumable batch conversions
+import os
+import json
+import time
+import hashlib
+import threading
+
+JOURNAL_FILENAME = ".conversion_journal.jsonl"
+
+def settings_key(settings):
+    """Stable short hash of the settings that affect the rendered output"""
+    encoded = json.dumps(settings, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+class CheckpointJournal:
+    """
+    Records finished pages, finished files and finished merges in the output
+    directory, one JSON object per line. Each record carries the input hash
+    and a settings key, so a resumed run only trusts work that was produced
+    from the same input with the same settings and whose output still exists.
+    """
+    def __init__(self, output_dir, resume=False):
+        self.path = os.path.join(output_dir, JOURNAL_FILENAME)
+        self.lock = threading.Lock()
+        self.pages = {}
+        self.files = {}
+        self.merges = {}
+
+        if resume:
+            self.load()
+        elif os.path.exists(self.path):
+            # A fresh run starts a fresh journal
+            os.remove(self.path)
+
+        self.handle = open(self.path, 'a', encoding='utf-8')
+        self.append({'type': 'run', 'resume': bool(resume)})
+
+    def load(self):
+        """Read an existing journal, ignoring a torn last line"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                self.apply(record)
+
+    def apply(self, record):
+        kind = record.get('type')
+        if kind == 'page':
+            key = (record['file'], record['input'], record['settings'])
+            self.pages.setdefault(key, {})[record['page']] = record
+        elif kind == 'file':
+            self.files[(record['file'], record['input'], record['settings'])] = record
+        elif kind == 'merge':
+            self.merges[record['output']] = record
+
+    def append(self, record):
+        record['time'] = time.time()
+        line = json.dumps(record) + "\n"
+        with self.lock:
+            self.handle.write(line)
+            self.handle.flush()
+            os.fsync(self.handle.fileno())
+            self.apply(record)
+
+    def record_page(self, svg_file, input_sha256, settings, page, output_path):
+        self.append({
+            'type': 'page',
+            'file': svg_file,
+            'input': input_sha256,
+            'settings': settings,
+            'page': page,
+            'output': output_path,
+            'bytes': os.path.getsize(output_path)
+        })
+
+    def record_file(self, svg_file, input_sha256, settings, output_paths):
+        self.append({
+            'type': 'file',
+            'file': svg_file,
+            'input': input_sha256,
+            'settings': settings,
+            'outputs': output_paths
+        })
+
+    def record_merge(self, output_path, inputs_key):
+        self.append({
+            'type': 'merge',
+            'output': output_path,
+            'inputs': inputs_key,
+            'bytes': os.path.getsize(output_path)
+        })
+
+    def completed_file(self, svg_file, input_sha256, settings):
+        """Output paths of a finished file, or None if it must be (re)done"""
+        record = self.files.get((svg_file, input_sha256, settings))
+        if not record or not record['outputs']:
+            return None
+        if not all(os.path.exists(path) for path in record['outputs']):
+            return None
+        return record['outputs']
+
+    def completed_pages(self, svg_file, input_sha256, settings):
+        """{page number: output path} for pages finished by an interrupted run"""
+        done = {}
+        for page, record in self.pages.get((svg_file, input_sha256, settings), {}).items():
+            path = record['output']
+            if os.path.exists(path) and os.path.getsize(path) == record['bytes']:
+                done[page] = path
+        return done
+
+    def merge_done(self, output_path, inputs_key):
+        record = self.merges.get(output_path)
+        if not record or record['inputs'] != inputs_key:
+            return False
+        return os.path.exists(output_path) and os.path.getsize(output_path) == record['bytes']
+
+    def close(self):
+        with self.lock:
+            if not self.handle.closed:
+                self.handle.close()
+
+def merge_inputs_key(manifest):
+    """Hash of the ordered merge inputs (path and content hash of each page)"""
+    digest = hashlib.sha256()
+    for entry in manifest.ordered_files():
+        for output in entry['outputs']:
+            digest.update(output['path'].encode('utf-8'))
+            digest.update(output['sha256'].encode('ascii'))
+    return digest.hexdigest()
@@ -0,0 +1,194 @@
+# manifest.py - In-memory record of what a conversion run produced
+import os
+import json
+import time
+import hashlib
+import threading
+
+MANIFEST_FILENAME = "conversion_manifest.json"
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """Return the SHA-256 hex digest of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Source hashes keyed by (path, size, mtime), shared by every batch in the process
+SOURCE_HASHES = {}
+SOURCE_HASHES_LOCK = threading.Lock()
+
+def source_sha256(path):
+    """file_sha256 for input files, cached while the file is unchanged"""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    with SOURCE_HASHES_LOCK:
+        digest = SOURCE_HASHES.get(key)
+    if digest is None:
+        digest = file_sha256(path)
+        with SOURCE_HASHES_LOCK:
+            SOURCE_HASHES[key] = digest
+    return digest
+
+class RunManifest:
+    """
+    Collects source files, pages, output paths, sizes, hashes and timings
+    while a batch runs, so the summary and the merge step never have to
+    walk the output tree (which would also pick up stale files).
+    """
+    def __init__(self, svg_folder, output_dir, output_format, dpi, settings=None):
+        self.svg_folder = svg_folder
+        self.output_dir = output_dir
+        self.output_format = output_format
+        self.dpi = str(dpi)
+        self.settings = settings or {}
+        self.started = time.time()
+        self.finished = None
+        self.files = []
+        self.merged = None
+
+    def add_file(self, svg_file, svg_path, output_dir, output_files, started, finished,
+                 error=None, order=None, source_sha256=None, resumed=False, failure=None,
+                 page_durations=None):
+        """Record one converted SVG; output_files are names relative to output_dir"""
+        outputs = []
+        for page_num, name in enumerate(output_files, 1):
+            path = os.path.join(output_dir, name)
+            if not os.path.exists(path):
+                continue
+            outputs.append({
+                'page': page_num,
+                'path': path,
+                'bytes': os.path.getsize(path),
+                'sha256': file_sha256(path),
+                'duration': (page_durations or {}).get(page_num)
+            })
+
+        if source_sha256 is None:
+            try:
+                source_sha256 = file_sha256(svg_path)
+            except OSError:
+                source_sha256 = None
+
+        entry = {
+            'source': svg_file,
+            'source_path': svg_path,
+            'source_sha256': source_sha256,
+            'order': order if order is not None else len(self.files),
+            'status': 'ok' if outputs and not error else 'failed',
+            'error': error,
+            'failure': failure,
+            'pages': len(outputs),
+            'outputs': outputs,
+            'resumed': resumed,
+            'started': started,
+            'duration': round(finished - started, 3)
+        }
+        self.files.append(entry)
+        return entry
+
+    def set_merged(self, merged_path, started, finished):
+        """Record the merged PDF produced from this run's outputs"""
+        self.merged = {
+            'path': merged_path,
+            'bytes': os.path.getsize(merged_path) if os.path.exists(merged_path) else 0,
+            'duration': round(finished - started, 3)
+        }
+
+    def finish(self):
+        self.finished = time.time()
+
+    def ordered_files(self):
+        """File entries in the original (alphabetical) source order"""
+        return sorted(self.files, key=lambda entry: entry['order'])
+
+    def output_paths(self):
+        """All output paths, in source order then page order"""
+        paths = []
+        for entry in self.ordered_files():
+            for output in entry['outputs']:
+                paths.append(output['path'])
+        return paths
+
+    def durations(self):
+        """{(source, source sha256): seconds} for files rendered (not resumed) successfully"""
+        return {(entry['source'], entry['source_sha256']): entry['duration']
+                for entry in self.files
+                if entry['status'] == 'ok' and not entry.get('resumed') and entry['duration'] > 0}
+
+    @property
+    def successful(self):
+        return sum(1 for entry in self.files if entry['status'] == 'ok')
+
+    @property
+    def failed(self):
+        return sum(1 for entry in self.files if entry['status'] != 'ok')
+
+    @property
+    def total_outputs(self):
+        return sum(len(entry['outputs']) for entry in self.files)
+
+    @property
+    def total_bytes(self):
+        return sum(output['bytes'] for entry in self.files for output in entry['outputs'])
+
+    def to_dict(self):
+        return {
+            'svg_folder': self.svg_folder,
+            'output_dir': self.output_dir,
+            'output_format': self.output_format,
+            'dpi': self.dpi,
+            'settings': self.settings,
+            'started': self.started,
+            'finished': self.finished,
+            'totals': {
+                'files': len(self.files),
+                'successful': self.successful,
+                'failed': self.failed,
+                'outputs': self.total_outputs,
+                'bytes': self.total_bytes
+            },
+            'files': self.ordered_files(),
+            'merged': self.merged
+        }
+
+    def write(self, path=None):
+        """Write the manifest as JSON (atomically) and return its path"""
+        if path is None:
+            path = os.path.join(self.output_dir, MANIFEST_FILENAME)
+        temp_path = path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(temp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        """Load a manifest previously written with write()"""
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        manifest = cls(data['svg_folder'], data['output_dir'],
+                       data['output_format'], data['dpi'], data.get('settings'))
+        manifest.started = data.get('started', manifest.started)
+        manifest.finished = data.get('finished')
+        manifest.files = data.get('files', [])
+        manifest.merged = data.get('merged')
+        return manifest
+
+def load_manifest_for(folder, output_format=None):
+    """Return the manifest written into folder, or None if missing/unreadable"""
+    path = os.path.join(folder, MANIFEST_FILENAME)
+    if not os.path.exists(path):
+        return None
+    try:
+        manifest = RunManifest.load(path)
+    except (OSError, ValueError, KeyError):
+        return None
+    if output_format and manifest.output_format != output_format:
+        return None
+    return manifest
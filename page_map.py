@@ -0,0 +1,123 @@
+# page_map.py - Which input made which pages of a merged PDF, so a re-merge only redoes what changed
+import os
+import json
+
+from manifest import source_sha256
+
+PAGE_MAP_SUFFIX = ".pagemap.json"
+# Replaced pages stay in an incrementally updated PDF; past this share of
+# the file the next merge rewrites it from scratch
+MAX_DEAD_FRACTION = 0.5
+
+def page_map_path(output_path):
+    return output_path + PAGE_MAP_SUFFIX
+
+def fingerprint(path, previous=None):
+    """Size, mtime and SHA-256 of an input; the hash of previous is reused while size and mtime match"""
+    stat = os.stat(path)
+    if previous and previous.get('bytes') == stat.st_size and previous.get('mtime_ns') == stat.st_mtime_ns:
+        sha256 = previous['sha256']
+    else:
+        sha256 = source_sha256(path)
+    return {'path': os.path.abspath(path), 'bytes': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+            'sha256': sha256}
+
+class PageMap:
+    """
+    Sidecar of a merged PDF listing its inputs in order: each input's
+    fingerprint and where its pages are (first page and page count; PNG
+    merges also keep the page object and the byte range written for it).
+    A map is only used while the PDF still has the size and mtime it was
+    saved with, so a PDF changed by anything else is rebuilt.
+    """
+    def __init__(self, kind, entries=None, info=None):
+        self.kind = kind
+        self.entries = entries or []
+        self.info = info or {}
+        self.pdf_bytes = 0
+        self.by_path = {entry['path']: entry for entry in self.entries}
+        # Entries not yet claimed by take(), by content hash
+        self.unclaimed = {}
+        for entry in self.entries:
+            self.unclaimed.setdefault(entry['sha256'], []).append(entry)
+
+    @classmethod
+    def load(cls, output_path, kind):
+        """The map saved with output_path, or None if missing, unreadable or out of date"""
+        try:
+            with open(page_map_path(output_path), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            stat = os.stat(output_path)
+        except (OSError, ValueError):
+            return None
+        if data.get('kind') != kind or data.get('pdf_bytes') != stat.st_size \
+                or data.get('pdf_mtime_ns') != stat.st_mtime_ns:
+            return None
+        page_map = cls(kind, data.get('entries', []), data.get('info', {}))
+        page_map.pdf_bytes = stat.st_size
+        return page_map
+
+    @classmethod
+    def for_update(cls, output_path, kind, variant=None):
+        """
+        The map a new merge into output_path can keep pages from: None if
+        there is none, it was made for another variant, or replaced pages
+        take up more than MAX_DEAD_FRACTION of the PDF (time to rewrite it)
+        """
+        page_map = cls.load(output_path, kind)
+        if page_map is None or page_map.info.get('variant') != variant:
+            return None
+        if page_map.info.get('dead_bytes', 0) > MAX_DEAD_FRACTION * page_map.pdf_bytes:
+            return None
+        return page_map
+
+    def fingerprint(self, path):
+        return fingerprint(path, self.by_path.get(os.path.abspath(path)))
+
+    def take(self, input_fingerprint):
+        """The unclaimed entry with the same content, or None (each entry is used once)"""
+        candidates = self.unclaimed.get(input_fingerprint['sha256'])
+        if not candidates:
+            return None
+        # Prefer the same file when identical pages appear more than once
+        for index, entry in enumerate(candidates):
+            if entry['path'] == input_fingerprint['path']:
+                return candidates.pop(index)
+        return candidates.pop(0)
+
+    def unchanged(self, paths):
+        """The paths whose content is already in the PDF"""
+        return {path for path in paths if self.fingerprint(path)['sha256'] in self.unclaimed}
+
+    def same_merge(self, taken):
+        """Whether taken (what take() returned for each input, in order) is exactly the merge this map describes"""
+        return len(taken) == len(self.entries) and all(kept is entry for kept, entry in zip(taken, self.entries))
+
+    def unclaimed_entries(self):
+        return [entry for entries in self.unclaimed.values() for entry in entries]
+
+    def save(self, pdf_path, output_path=None):
+        """
+        Write the map of pdf_path (atomically). output_path is where the
+        PDF will be moved to, if elsewhere: renames keep size and mtime.
+        """
+        stat = os.stat(pdf_path)
+        data = {
+            'kind': self.kind,
+            'pdf_bytes': stat.st_size,
+            'pdf_mtime_ns': stat.st_mtime_ns,
+            'info': self.info,
+            'entries': self.entries
+        }
+        path = page_map_path(output_path or pdf_path)
+        temp_path = path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+
+def discard(output_path):
+    """Remove the map of output_path (after it was written without one)"""
+    try:
+        os.remove(page_map_path(output_path))
+    except OSError:
+        pass
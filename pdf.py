@@ -1,9 +1,9 @@
 import os
 import sys
-import img2pdf
 from pathlib import Path
+from png_pdf import write_pdf
 
-def pngs_to_pdf_using_img2pdf():
+def pngs_to_pdf():
     script_dir = Path(__file__).parent.resolve()
     png_root_dir = script_dir / "png_output"
     output_pdf = script_dir / "combined_output2.pdf"
@@ -43,8 +43,8 @@ def pngs_to_pdf_using_img2pdf():
         sys.exit(1)
 
     try:
-        with open(output_pdf, "wb") as f:
-            f.write(img2pdf.convert(all_png_paths))
+        # Pages are streamed to the file one at a time
+        write_pdf(all_png_paths, str(output_pdf))
 
         print(f"\n✅ PDF created successfully: {output_pdf}")
         print(f"📊 File size: {output_pdf.stat().st_size / 1024:.2f} KB")
@@ -54,6 +54,7 @@ def pngs_to_pdf_using_img2pdf():
         sys.exit(1)
 
 if __name__ == "__main__":
-    # pip install img2pdf Pillow
-    pngs_to_pdf_using_img2pdf()
+    # No dependencies; Pillow (optional) speeds up PNGs with transparency and
+    # is needed for interlaced pages and palette pages with transparent colours
+    pngs_to_pdf()
     input("\nPress Enter to exit...")
\ No newline at end of file
@@ -0,0 +1,124 @@
+# pdf_dedupe.py - Store identical fonts, images and form XObjects of a merged PDF only once (pikepdf)
+import hashlib
+
+# Objects tied to one place in the document are never shared
+KEEP_TYPES = ('/Page', '/Pages', '/Catalog', '/Annot', '/Outlines')
+# Keys pointing back to a parent (annotations, outline items, form fields)
+BACK_REFERENCES = ('/Parent', '/P')
+
+def shareable(pikepdf, obj):
+    if isinstance(obj, pikepdf.Array):
+        return True
+    if not isinstance(obj, (pikepdf.Dictionary, pikepdf.Stream)):
+        return False
+    if str(obj.get('/Type', '')) in KEEP_TYPES:
+        return False
+    return not any(key in obj for key in BACK_REFERENCES)
+
+def object_key(pikepdf, obj, reference_key):
+    """
+    Digest of an object's content. References enter as reference_key(target),
+    so objects pointing at identical objects get identical digests.
+    """
+    digest = hashlib.sha256()
+
+    def feed(value):
+        if not isinstance(value, pikepdf.Object):
+            # Numbers and booleans come back as Python values
+            digest.update(f"{type(value).__name__}:{value!r}\0".encode('utf-8'))
+        elif value.is_indirect:
+            digest.update(b'R' + reference_key(value) + b'\0')
+        else:
+            feed_direct(value)
+
+    def feed_direct(value):
+        if isinstance(value, pikepdf.Array):
+            digest.update(b'[')
+            for item in value:
+                feed(item)
+            digest.update(b']')
+        elif isinstance(value, (pikepdf.Dictionary, pikepdf.Stream)):
+            digest.update(b'<<')
+            for key in sorted(value.keys()):
+                # The data itself is hashed, so its (possibly indirect) length is not
+                if key == '/Length' and isinstance(value, pikepdf.Stream):
+                    continue
+                digest.update(key.encode('utf-8') + b'\0')
+                feed(value.get(key))
+            digest.update(b'>>')
+        else:
+            digest.update(value.unparse() + b'\0')
+
+    feed_direct(obj)
+    if isinstance(obj, pikepdf.Stream):
+        digest.update(b'stream')
+        digest.update(obj.read_raw_bytes())
+    return digest.digest()
+
+def replace_references(pikepdf, obj, replacements):
+    """Point references held by obj (and its direct children) at the kept copies"""
+    if isinstance(obj, pikepdf.Array):
+        items = enumerate(list(obj))
+    elif isinstance(obj, (pikepdf.Dictionary, pikepdf.Stream)):
+        items = [(key, obj.get(key)) for key in list(obj.keys())]
+    else:
+        return
+    for key, value in items:
+        # Numbers, strings and names come back as Python values
+        if not isinstance(value, pikepdf.Object):
+            continue
+        if value.is_indirect:
+            kept = replacements.get(value.objgen)
+            if kept is not None:
+                obj[key] = kept
+        else:
+            replace_references(pikepdf, value, replacements)
+
+def deduplicate(pdf, pikepdf):
+    """
+    Make every reference to identical objects point to one of them.
+    Streams compare by their dictionary and compressed data; dictionaries
+    and arrays by their content, with references compared by what they
+    point to, so a font whose file is a duplicate is a duplicate too.
+    Every object is hashed once (bottom-up, through its references) and
+    references are rewritten in one pass. Duplicates are no longer
+    referenced and are left out when the PDF is saved. Returns (objects
+    removed, bytes of stream data removed).
+    """
+    keys = {}
+    hashing = set()
+
+    def reference_key(obj):
+        objgen = obj.objgen
+        if objgen in keys:
+            return keys[objgen]
+        if not isinstance(obj, (pikepdf.Array, pikepdf.Dictionary, pikepdf.Stream)):
+            # An indirect number or string counts as its value
+            return b'v' + obj.unparse(resolved=True)
+        if objgen in hashing or not shareable(pikepdf, obj):
+            # Pages, parents and reference cycles are only ever equal to themselves
+            return f"id {objgen[0]} {objgen[1]}".encode('ascii')
+        hashing.add(objgen)
+        try:
+            keys[objgen] = object_key(pikepdf, obj, reference_key)
+        finally:
+            hashing.discard(objgen)
+        return keys[objgen]
+
+    kept = {}
+    replacements = {}
+    removed_bytes = 0
+    for obj in pdf.objects:
+        if obj.objgen == (0, 0) or obj.objgen in replacements or not shareable(pikepdf, obj):
+            continue
+        first = kept.setdefault(reference_key(obj), obj)
+        if first.objgen != obj.objgen:
+            replacements[obj.objgen] = first
+            if isinstance(obj, pikepdf.Stream):
+                removed_bytes += len(obj.read_raw_bytes())
+    if replacements:
+        for obj in pdf.objects:
+            if obj.objgen not in replacements:
+                replace_references(pikepdf, obj, replacements)
+        replace_references(pikepdf, pdf.Root, replacements)
+    return len(replacements), removed_bytes
@@ -4,13 +4,9 @@ import os
 import sys
 import threading
 from pathlib import Path
-
-# Import img2pdf at module level
-try:
-    import img2pdf
-    IMG2PDF_AVAILABLE = True
-except ImportError:
-    IMG2PDF_AVAILABLE = False
+from ui_events import LOG_DIR
+import folder_scan
+from folder_scan import FolderScanner
 
 class PDFMergeTab:
     def __init__(self, parent, shared_vars, gui_app):
@@ -18,6 +14,11 @@ class PDFMergeTab:
         self.shared_vars = shared_vars
         self.gui_app = gui_app
         
+        # Run manifest handed over by the converter (avoids rescanning its output)
+        self.manifest = None
+        # PNG folders are scanned in the background; the merge reuses the result
+        self.scanner = FolderScanner()
+        
         # Create tab frame
         self.frame = ttk.Frame(parent)
         self.setup_ui()
@@ -66,13 +67,6 @@ class PDFMergeTab:
         ttk.Label(title_frame, text="Combine PNG files from subfolders into a single PDF",
                  font=("Arial", 9)).pack()
         
-        # Show img2pdf status
-        if not IMG2PDF_AVAILABLE:
-            warning_frame = ttk.Frame(content)
-            warning_frame.pack(fill='x', padx=10, pady=5)
-            ttk.Label(warning_frame, text="⚠️ img2pdf not installed! Please run: pip install img2pdf", 
-                     foreground="red", font=("Arial", 9, "bold")).pack()
-        
         # ====== PNG FOLDER SELECTION ======
         folder_frame = ttk.LabelFrame(content, text="PNG Folder Selection", padding="10")
         folder_frame.pack(fill='x', padx=10, pady=10)
@@ -190,6 +184,8 @@ class PDFMergeTab:
         
         self.log_text = scrolledtext.ScrolledText(log_frame, height=8, wrap=tk.WORD)
         self.log_text.grid(row=0, column=0, sticky='nsew')
+        # Bounded widget fed from the GUI event queue; the full log goes to disk
+        self.log = self.gui_app.events.add_log_view('merge', self.log_text, os.path.join(LOG_DIR, 'pdf_merge.log'))
         
         # ====== CONTROL BUTTONS ======
         button_frame = ttk.Frame(bottom_container)
@@ -228,10 +224,6 @@ class PDFMergeTab:
                  bg="#ffc107", fg="black",
                  font=("Arial", 9),
                  padx=15, pady=8).pack(side='right', padx=(0, 10))
-        
-        # Disable merge button if img2pdf not available
-        if not IMG2PDF_AVAILABLE:
-            self.merge_btn.config(state='disabled', bg="#6c757d", text="MERGE (install img2pdf)")
     
     def browse_png_folder(self):
         folder = filedialog.askdirectory(title="Select folder containing PNG subfolders")
@@ -313,63 +305,83 @@ class PDFMergeTab:
         
         return os.path.join(output_location, pdf_filename)
     
+    def set_manifest(self, manifest):
+        """Use a converter run manifest as the page list for its output folder"""
+        self.manifest = manifest
+    
+    def get_manifest_for(self, png_folder):
+        """Return the handed-over manifest if it describes png_folder"""
+        if not self.manifest or self.manifest.output_format != 'png':
+            return None
+        if os.path.normcase(os.path.abspath(png_folder)) != os.path.normcase(self.manifest.output_dir):
+            return None
+        return self.manifest
+    
     def scan_folder(self):
         png_folder = self.get_selected_folder()
         if not png_folder or not os.path.exists(png_folder):
             self.log_message("❌ Please select a valid PNG folder first")
             return
         
-        try:
-            # Count folders and PNG files
-            png_root = Path(png_folder)
-            folders = [d for d in png_root.iterdir() if d.is_dir()]
-            
-            if not folders:
-                self.folder_info_label.config(
-                    text=f"No subfolders found in: {png_folder}")
-                self.log_message("⚠ No subfolders found in selected folder")
-                return
-            
-            total_pngs = 0
-            folder_info = []
-            
-            for folder in sorted(folders, key=lambda d: d.name.lower()):
-                png_files = list(folder.glob("*.png"))
-                png_count = len(png_files)
-                total_pngs += png_count
-                folder_info.append(f"{folder.name}: {png_count} PNGs")
-            
-            # Update display
-            info_text = f"Found {len(folders)} folders with {total_pngs} PNG files"
+        # The converter already knows what it produced
+        manifest = self.get_manifest_for(png_folder)
+        if manifest:
+            info_text = f"Last conversion: {manifest.successful} files with {manifest.total_outputs} PNG files"
             self.folder_info_label.config(text=info_text)
-            
-            self.log_message(f"📁 Scanned folder: {png_folder}")
-            self.log_message(f"📊 Found {len(folders)} subfolders")
-            self.log_message(f"🖼️ Total PNG files: {total_pngs}")
-            
-            for i, info in enumerate(folder_info[:5]):  # Show first 5
-                self.log_message(f"  {info}")
-            if len(folder_info) > 5:
-                self.log_message(f"  ... and {len(folder_info) - 5} more folders")
-            
-        except Exception as e:
-            self.log_message(f"❌ Error scanning folder: {str(e)}")
+            self.log_message(f"📁 Using conversion manifest for: {png_folder}")
+            self.log_message(f"🖼️ Total PNG files: {manifest.total_outputs}")
+            return
+        
+        self.folder_info_label.config(text=f"Scanning: {png_folder}")
+        events = self.gui_app.events
+        self.scanner.scan(png_folder, 'png_tree',
+                          on_progress=lambda folders, pngs: events.progress('png_scan', self.show_scan_progress, folders, pngs),
+                          on_done=lambda tree, error: events.call(self.scan_done, png_folder, tree, error))
+    
+    def show_scan_progress(self, folder_count, png_count):
+        self.folder_info_label.config(text=f"Scanning... {folder_count} folders, {png_count} PNG files so far")
+    
+    def scan_done(self, png_folder, tree, error):
+        if error:
+            self.folder_info_label.config(text=f"Could not scan: {png_folder}")
+            self.log_message(f"❌ Error scanning folder: {str(error)}")
+            return
+        
+        if not tree:
+            self.folder_info_label.config(
+                text=f"No subfolders found in: {png_folder}")
+            self.log_message("⚠ No subfolders found in selected folder")
+            return
+        
+        total_pngs = sum(len(pngs) for name, pngs in tree)
+        folder_info = [f"{name}: {len(pngs)} PNGs" for name, pngs in sorted(tree, key=lambda item: item[0].lower())]
+        
+        # Update display
+        info_text = f"Found {len(tree)} folders with {total_pngs} PNG files"
+        self.folder_info_label.config(text=info_text)
+        
+        self.log_message(f"📁 Scanned folder: {png_folder}")
+        self.log_message(f"📊 Found {len(tree)} subfolders")
+        self.log_message(f"🖼️ Total PNG files: {total_pngs}")
+        
+        for i, info in enumerate(folder_info[:5]):  # Show first 5
+            self.log_message(f"  {info}")
+        if len(folder_info) > 5:
+            self.log_message(f"  ... and {len(folder_info) - 5} more folders")
     
     def log_message(self, message):
-        self.log_text.insert(tk.END, message + "\n")
-        self.log_text.see(tk.END)
-        self.gui_app.root.update()
+        """Log to this tab (safe from any thread)"""
+        self.log(message)
+    
+    def merge_log(self, message):
+        """Messages of the merge stage (pages were listed before, so not each page again)"""
+        if not message.startswith("[MERGE] Adding:"):
+            self.log(message)
     
     def clear_log(self):
-        self.log_text.delete(1.0, tk.END)
+        self.gui_app.events.clear_log('merge')
     
     def start_merge(self):
-        # Check if img2pdf is available
-        if not IMG2PDF_AVAILABLE:
-            messagebox.showerror("Error", 
-                "img2pdf is not installed!\n\nPlease run:\npip install img2pdf")
-            return
-        
         png_folder = self.get_selected_folder()
         if not png_folder or not os.path.exists(png_folder):
             messagebox.showerror("Error", "Please select a valid PNG folder")
@@ -411,21 +423,20 @@ class PDFMergeTab:
                     except:
                         self.log_message(f"📂 PDF file: {output_pdf}")
                 
-                messagebox.showinfo("Success", "PDF merge completed successfully!")
+                self.gui_app.events.call(messagebox.showinfo, "Success", "PDF merge completed successfully!")
             else:
                 self.log_message("\n❌ PDF merge failed!")
-                messagebox.showerror("Error", "PDF merge failed. Check log for details.")
+                self.gui_app.events.call(messagebox.showerror, "Error", "PDF merge failed. Check log for details.")
             
         except Exception as e:
             self.log_message(f"❌ Error: {str(e)}")
-            messagebox.showerror("Error", f"An error occurred:\n{str(e)}")
+            self.gui_app.events.call(messagebox.showerror, "Error", f"An error occurred:\n{str(e)}")
         finally:
             # Re-enable button
-            if IMG2PDF_AVAILABLE:
-                self.gui_app.root.after(0, lambda: self.merge_btn.config(state='normal', bg="#28a745"))
+            self.gui_app.events.call(lambda: self.merge_btn.config(state='normal', bg="#28a745"))
     
     def merge_pngs_to_pdf(self, png_folder, output_pdf):
-        """Core merge function using img2pdf"""
+        """Core merge function: PNG pages streamed into one PDF"""
         try:
             png_root = Path(png_folder)
             
@@ -433,14 +444,17 @@ class PDFMergeTab:
                 self.log_message(f"❌ PNG folder not found: {png_folder}")
                 return False
             
-            # Get all folders
+            manifest = self.get_manifest_for(png_folder)
+            if manifest:
+                # Page list comes straight from the converter run
+                all_png_paths = manifest.output_paths()
+                self.log_message(f"\n📂 Using conversion manifest ({len(all_png_paths)} PNG files)")
+                return self.write_pdf(all_png_paths, output_pdf)
+            
+            # Get all folders (the last scan's listing, if the folders are unchanged)
+            folders = folder_scan.scan_folder(png_folder, 'png_tree')
             if self.sort_alphabetically_var.get():
-                folders = sorted(
-                    [d for d in png_root.iterdir() if d.is_dir()],
-                    key=lambda d: d.name.lower()
-                )
-            else:
-                folders = [d for d in png_root.iterdir() if d.is_dir()]
+                folders = sorted(folders, key=lambda item: item[0].lower())
             
             if not folders:
                 self.log_message("❌ No subfolders found in PNG folder")
@@ -449,23 +463,30 @@ class PDFMergeTab:
             all_png_paths = []
             
             self.log_message(f"\n📂 Processing {len(folders)} folders:")
-            for folder in folders:
-                self.log_message(f"  ▶ Folder: {folder.name}")
+            for folder_name, png_names in folders:
+                self.log_message(f"  ▶ Folder: {folder_name}")
                 
                 # Get PNG files in folder
                 if self.sort_alphabetically_var.get():
-                    png_files = sorted(folder.glob("*.png"), key=lambda p: p.name.lower())
-                else:
-                    png_files = list(folder.glob("*.png"))
+                    png_names = sorted(png_names, key=lambda name: name.lower())
                 
-                if not png_files:
+                if not png_names:
                     self.log_message(f"    ⚠ No PNG files in this folder")
                     continue
                 
-                for png in png_files:
-                    all_png_paths.append(str(png))
-                    self.log_message(f"      - {png.name}")
+                for png_name in png_names:
+                    all_png_paths.append(str(png_root / folder_name / png_name))
+                    self.log_message(f"      - {png_name}")
+            
+            return self.write_pdf(all_png_paths, output_pdf)
             
+        except Exception as e:
+            self.log_message(f"❌ Error during PDF creation: {str(e)}")
+            return False
+    
+    def write_pdf(self, all_png_paths, output_pdf):
+        """Write the given PNG files, in order, into one PDF"""
+        try:
             if not all_png_paths:
                 self.log_message("❌ No PNG files found to merge")
                 return False
@@ -479,9 +500,32 @@ class PDFMergeTab:
             self.log_message(f"\n🔄 Creating PDF: {os.path.basename(output_pdf)}")
             self.log_message(f"📊 Total pages: {len(all_png_paths)}")
             
-            # Use img2pdf (now imported at module level)
-            with open(output_pdf, "wb") as f:
-                f.write(img2pdf.convert(all_png_paths))
+            # Pages already in the previous merge (same content) are kept as they are
+            from png_preflight import preflight, background_name, DEFAULT_BACKGROUND
+            from page_map import PageMap
+            from pipeline import merge_files
+            background = background_name(DEFAULT_BACKGROUND)
+            previous = PageMap.for_update(output_pdf, 'png', background)
+            unchanged = previous.unchanged(all_png_paths) if previous else set()
+            
+            # Check every other page first (in parallel): a broken page fails the
+            # merge before anything is written, and transparent pages are flattened
+            self.log_message("🔍 Checking PNG files...")
+            checked = preflight(all_png_paths, background, unchanged=unchanged)
+            try:
+                for path, problem in checked.problems:
+                    self.log_message(f"    ❌ {os.path.basename(path)}: {problem}")
+                if not checked.ok:
+                    self.log_message(f"❌ {len(checked.problems)} PNG file(s) cannot be merged")
+                    return False
+                self.log_message(f"✅ {checked.summary()}")
+                
+                # One page at a time: memory stays flat however many pages there are
+                if not merge_files(output_pdf, 'png', checked.pages, all_png_paths,
+                                   log=self.merge_log, variant=background):
+                    return False
+            finally:
+                checked.cleanup()
             
             # Show file size
             file_size = os.path.getsize(output_pdf) / 1024  # KB
@@ -497,29 +541,37 @@ class PDFMergeTab:
         """Test function to check dependencies and folder structure"""
         self.log_message("\n🔍 Running Merge Test...")
         
-        # Check img2pdf
-        if IMG2PDF_AVAILABLE:
-            self.log_message("✅ img2pdf is installed")
-        else:
-            self.log_message("❌ img2pdf is NOT installed")
-            self.log_message("   Run: pip install img2pdf")
+        # PDFs are written by png_pdf; Pillow only speeds up pages with transparency
+        from png_pdf import PILLOW_AVAILABLE
+        self.log_message("✅ PNG to PDF writer built in")
+        if not PILLOW_AVAILABLE:
+            self.log_message("⚠️ Pillow is not installed: PNGs with transparency merge slowly")
+            self.log_message("   Run: pip install Pillow")
         
-        # Check folder
+        # Check folder (scanned in the background)
         png_folder = self.get_selected_folder()
         if png_folder and os.path.exists(png_folder):
             self.log_message(f"✅ PNG folder exists: {png_folder}")
-            
+            events = self.gui_app.events
+            self.scanner.scan(png_folder, 'png_tree',
+                              on_progress=lambda folders, pngs: events.progress('png_scan', self.show_scan_progress, folders, pngs),
+                              on_done=lambda tree, error: events.call(self.test_merge_done, tree, error))
+        else:
+            self.log_message("❌ No valid PNG folder selected")
+            self.log_message("✅ Test completed")
+    
+    def test_merge_done(self, tree, error):
+        if error:
+            self.log_message(f"❌ Error scanning folder: {str(error)}")
+        else:
             # Count folders
-            png_root = Path(png_folder)
-            folders = [d for d in png_root.iterdir() if d.is_dir()]
-            self.log_message(f"   Found {len(folders)} subfolders")
+            self.log_message(f"   Found {len(tree)} subfolders")
+            self.folder_info_label.config(text=f"Found {len(tree)} folders with "
+                                               f"{sum(len(pngs) for name, pngs in tree)} PNG files")
             
-            if folders:
+            if tree:
                 # Count PNGs in first folder
-                first_folder = folders[0]
-                png_files = list(first_folder.glob("*.png"))
-                self.log_message(f"   First folder '{first_folder.name}' has {len(png_files)} PNGs")
-        else:
-            self.log_message("❌ No valid PNG folder selected")
+                first_name, first_pngs = tree[0]
+                self.log_message(f"   First folder '{first_name}' has {len(first_pngs)} PNGs")
         
         self.log_message("✅ Test completed")
\ No newline at end of file
@@ -0,0 +1,405 @@
+# pipeline.py - Streaming merge stage: pages join the merged PDF while later files still render
+import os
+import queue
+import shutil
+import tempfile
+import threading
+
+from page_map import PageMap, fingerprint
+
+# Pages waiting for the writer thread; a full queue makes the producer wait
+DEFAULT_MAX_PENDING = 16
+
+class PdfAppender:
+    """
+    Appends PDF files to one output PDF (PyPDF2, or pikepdf as a fallback).
+    With the page map of the previous merge, inputs that did not change
+    are copied from the previous merged PDF, which is read once, instead
+    of from their own files. deduplicate (pikepdf only) stores fonts,
+    images and forms shared by several files once, in object streams.
+    """
+    def __init__(self, output_path, log=None, variant=None, deduplicate=False):
+        self.output_path = output_path
+        self.log = log
+        self.merger = None
+        self.pikepdf = None
+        if deduplicate:
+            try:
+                import pikepdf
+                self.pikepdf = pikepdf
+            except ImportError:
+                if log:
+                    log("[WARNING] pikepdf is not installed (pip install pikepdf): "
+                        "resources shared between files are stored once per file")
+        if not self.pikepdf:
+            try:
+                import PyPDF2
+                self.PyPDF2 = PyPDF2
+                self.merger = PyPDF2.PdfMerger()
+            except ImportError:
+                try:
+                    import pikepdf
+                    self.pikepdf = pikepdf
+                except ImportError:
+                    raise ImportError("Neither PyPDF2 nor pikepdf is installed "
+                                      "(pip install PyPDF2 or pip install pikepdf)")
+        if self.pikepdf:
+            self.pdf = self.pikepdf.Pdf.new()
+            # Sources stay open until the output is saved
+            self.sources = []
+        self.deduplicate = deduplicate and self.pikepdf is not None
+        self.previous = PageMap.for_update(output_path, 'pdf', variant)
+        self.variant = variant
+        self.old = None
+        self.entries = []
+        self.taken = []
+        self.page_count = 0
+        self.kept = 0
+
+    def old_pdf(self):
+        """The previous merged PDF, opened on first use"""
+        if self.old is None:
+            if self.merger:
+                self.old = self.PyPDF2.PdfReader(self.output_path)
+            else:
+                self.old = self.pikepdf.Pdf.open(self.output_path)
+        return self.old
+
+    def pages(self):
+        return len(self.merger.pages) if self.merger else len(self.pdf.pages)
+
+    def prepare(self, path, source=None):
+        """Work for append() that can start when a file is added (none for PDFs)"""
+        return None
+
+    def append(self, path, source=None, prepared=None):
+        """Append path; source is the file it was made from, if not path itself (see MergeStage.add)"""
+        entry = self.previous.fingerprint(source or path) if self.previous else fingerprint(source or path)
+        kept = self.previous.take(entry) if self.previous else None
+        self.taken.append(kept)
+        if kept:
+            first, last = kept['start'], kept['start'] + kept['pages']
+            if self.merger:
+                self.merger.append(self.old_pdf(), pages=(first, last))
+            else:
+                self.pdf.pages.extend(self.old_pdf().pages[first:last])
+            self.kept += 1
+        elif self.merger:
+            self.merger.append(path)
+        else:
+            source_pdf = self.pikepdf.Pdf.open(path)
+            self.sources.append(source_pdf)
+            self.pdf.pages.extend(source_pdf.pages)
+        entry['start'] = self.page_count
+        entry['pages'] = self.pages() - self.page_count
+        self.page_count += entry['pages']
+        self.entries.append(entry)
+
+    def write(self, temp_path):
+        """Write the merged PDF to temp_path; False if the previous merge is already exactly this one"""
+        if self.previous and self.previous.same_merge(self.taken):
+            PageMap('pdf', self.entries, self.previous.info).save(self.output_path)
+            if self.log:
+                self.log("[MERGE] No input changed since the last merge, PDF left as it is")
+            return False
+        if self.merger:
+            with open(temp_path, 'wb') as f:
+                self.merger.write(f)
+        elif self.deduplicate:
+            from pdf_dedupe import deduplicate
+            removed, removed_bytes = deduplicate(self.pdf, self.pikepdf)
+            self.pdf.save(temp_path, compress_streams=True,
+                          object_stream_mode=self.pikepdf.ObjectStreamMode.generate)
+            if self.log:
+                input_bytes = sum(entry['bytes'] for entry in self.entries)
+                output_bytes = os.path.getsize(temp_path)
+                saved = 100.0 * (input_bytes - output_bytes) / input_bytes if input_bytes else 0.0
+                self.log(f"[MERGE] Shared resources stored once: {removed} duplicate object(s), "
+                         f"{removed_bytes / (1024 ** 2):.1f} MB of streams; "
+                         f"{output_bytes / (1024 ** 2):.1f} MB instead of {input_bytes / (1024 ** 2):.1f} MB "
+                         f"of input files ({saved:.0f}% saved)")
+        else:
+            self.pdf.save(temp_path)
+        if self.pikepdf and self.old is not None:
+            # Windows cannot replace a file that is still open
+            self.old.close()
+            self.old = None
+        PageMap('pdf', self.entries, {'variant': self.variant}).save(temp_path, self.output_path)
+        if self.log and self.previous:
+            self.log(f"[MERGE] {self.kept} unchanged file(s) copied from the previous merge, "
+                     f"{len(self.entries) - self.kept} merged again")
+        return True
+
+    def close(self):
+        if self.merger:
+            self.merger.close()
+        else:
+            self.pdf.close()
+            for source in self.sources:
+                source.close()
+            if self.old is not None:
+                self.old.close()
+
+class ImageAppender:
+    """
+    Streams PNG pages into one output PDF as they arrive (memory stays
+    flat). With the page map of the previous merge, the previous PDF is
+    updated instead: unchanged pages keep their objects and only new or
+    changed pages are written, as an incremental update of a copy (made
+    when the first page differs), so the PDF stays as it was until the
+    merge succeeds. Nothing is written if no page changed. The PDF is
+    rewritten from scratch once replaced pages make up too much of it
+    (see PageMap.for_update). With a background, every page written is
+    checked and its transparency flattened first (see png_preflight.py),
+    for callers that did not run a preflight: prepare() hands each page to
+    a process pool as soon as it is added, so pages are checked in
+    parallel while this thread appends the results in order.
+    """
+    def __init__(self, output_path, log=None, variant=None, background=None):
+        from png_pdf import PdfImageWriter
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        self.output_path = output_path
+        self.log = log
+        self.variant = variant
+        self.background = background
+        self.flattened = 0
+        self.partial_path = output_path + ".partial"
+        self.previous = PageMap.for_update(output_path, 'png', variant)
+        # Updates open their writer once something has to be written
+        self.writer = None if self.previous else PdfImageWriter(self.partial_path)
+        self.entries = []
+        self.taken = []
+        self.kept = 0
+        self.finished = False
+        # Page checks (background only): a process pool and a folder for flattened copies, made on first use
+        self.pool = None
+        self.temp_dir = None
+        self.checks = 0
+
+    def open_update(self):
+        """Copy the previous PDF and start an update of the copy, keeping the pages appended so far"""
+        from png_pdf import PdfImageWriter
+        shutil.copyfile(self.output_path, self.partial_path)
+        info = self.previous.info
+        self.writer = PdfImageWriter(self.partial_path, update=(info['next_id'], info['xref']))
+        for entry in self.entries:
+            self.writer.add_existing_page(entry['page'])
+
+    def prepare(self, path, source=None):
+        """
+        Fingerprint a page and, with a background, start its check in the
+        pool unless the previous PDF already has it; returns what append()
+        takes as prepared. Runs on the thread adding pages.
+        """
+        entry = self.previous.fingerprint(source or path) if self.previous else fingerprint(source or path)
+        if not self.background or (self.previous and entry['sha256'] in self.previous.unclaimed):
+            return entry, None, None
+        from png_preflight import check_page, default_workers
+        if self.pool is None:
+            from concurrent.futures import ProcessPoolExecutor
+            self.pool = ProcessPoolExecutor(max_workers=default_workers())
+            self.temp_dir = tempfile.mkdtemp(prefix='preflight_')
+        out_path = os.path.join(self.temp_dir, f"{self.checks:05d}.png")
+        self.checks += 1
+        return entry, self.pool.submit(check_page, path, self.background, out_path), out_path
+
+    def append(self, path, source=None, prepared=None):
+        """Append path; source is the file it was made from, if not path itself (see MergeStage.add)"""
+        entry, check, out_path = prepared or (None, None, None)
+        if entry is None:
+            entry = self.previous.fingerprint(source or path) if self.previous else fingerprint(source or path)
+        kept = self.previous.take(entry) if self.previous else None
+        self.taken.append(kept)
+        if kept:
+            if self.writer:
+                self.writer.add_existing_page(kept['page'])
+            entry.update(page=kept['page'], start=kept['start'], end=kept['end'])
+            self.kept += 1
+        else:
+            page_path = self.checked_page(path, check, out_path) if self.background else path
+            if self.writer is None:
+                self.open_update()
+            start = self.writer.file.tell()
+            try:
+                self.writer.add_png(page_path)
+            finally:
+                if page_path != path:
+                    os.remove(page_path)
+            entry.update(page=self.writer.page_ids[-1], start=start, end=self.writer.file.tell())
+        self.entries.append(entry)
+
+    def checked_page(self, path, check=None, out_path=None):
+        """
+        path, or a copy flattened onto the background if it has transparency
+        (check is the page's check started by prepare(), writing out_path;
+        without one the page is checked here)
+        """
+        from png_pdf import PngError
+        from png_preflight import check_page
+        if check is not None:
+            name, flattened, error = check.result()
+        else:
+            out_path = self.partial_path + ".png"
+            name, flattened, error = check_page(path, self.background, out_path)
+        if error:
+            raise PngError(f"{os.path.basename(path)}: {error}")
+        if not flattened:
+            return path
+        self.flattened += 1
+        return out_path
+
+    def write(self, temp_path):
+        """Write the merged PDF to temp_path; False if the previous PDF already has these pages in this order"""
+        if self.previous and self.previous.same_merge(self.taken):
+            # Refreshed fingerprints spare the next merge re-hashing re-rendered pages
+            PageMap('png', self.entries, self.previous.info).save(self.output_path)
+            self.finished = True
+            if self.log:
+                self.log("[MERGE] No page changed since the last merge, PDF left as it is")
+            return False
+        if self.writer is None:
+            # Pages were only removed or moved
+            self.open_update()
+        self.writer.close()
+        dead_bytes = 0
+        if self.previous:
+            dead_bytes = self.previous.info.get('dead_bytes', 0) + sum(
+                entry['end'] - entry['start'] for entry in self.previous.unclaimed_entries())
+        os.replace(self.partial_path, temp_path)
+        self.finished = True
+        PageMap('png', self.entries, {'variant': self.variant, 'next_id': self.writer.next_id,
+                                      'xref': self.writer.xref_offset, 'dead_bytes': dead_bytes}
+                ).save(temp_path, self.output_path)
+        if self.log and self.flattened:
+            from png_preflight import background_name
+            self.log(f"[PREFLIGHT] {self.flattened} transparent page(s) flattened onto "
+                     f"{background_name(self.background)}")
+        if self.log and self.previous:
+            self.log(f"[MERGE] Updated: {self.kept} unchanged page(s) kept, "
+                     f"{len(self.entries) - self.kept} written")
+        return True
+
+    def close(self):
+        if self.pool is not None:
+            # Waits for the few checks still queued (at most the merge stage's pending pages)
+            self.pool.shutdown()
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+            self.pool = None
+        if self.finished or self.writer is None:
+            return
+        self.writer.abort()
+        if self.previous:
+            # The copy; the previous PDF itself was never touched
+            try:
+                os.remove(self.partial_path)
+            except OSError:
+                pass
+
+def make_appender(output_path, kind='pdf', log=None, variant=None, deduplicate=False, background=None):
+    if kind == 'png':
+        return ImageAppender(output_path, log, variant, background)
+    return PdfAppender(output_path, log, variant, deduplicate)
+
+class MergeStage:
+    """
+    Builds one merged PDF while a batch is still rendering. Files finish in
+    any order (the scheduler runs the most expensive first), so add() keeps
+    a reorder buffer and releases files in source order; a writer thread
+    appends their pages behind a bounded queue. close() writes the output
+    atomically and returns True on success; abort() discards it.
+    on_progress, if given, gets (pages written, pages added so far) from
+    the writer thread. A page map saved next to the output lets the next
+    merge keep unchanged pages (see page_map.py); variant names anything
+    else the pages depend on, and a different one rebuilds the PDF.
+    deduplicate stores resources shared by PDF inputs once (see PdfAppender);
+    background checks and flattens PNG pages in a process pool from the
+    moment they are added (see ImageAppender).
+    """
+    def __init__(self, output_path, kind='pdf', log=None, max_pending=DEFAULT_MAX_PENDING,
+                 on_progress=None, variant=None, deduplicate=False, background=None):
+        self.output_path = output_path
+        self.kind = kind
+        self.log = log
+        self.appender = make_appender(output_path, kind, log, variant, deduplicate, background)
+        self.pages = queue.Queue(maxsize=max_pending)
+        self.waiting = {}
+        self.next_order = 0
+        self.page_count = 0
+        self.written = 0
+        self.on_progress = on_progress
+        self.error = None
+        self.aborted = False
+        self.thread = threading.Thread(target=self.write_pages, daemon=True)
+        self.thread.start()
+
+    def add(self, order, paths, sources=None):
+        """
+        Pages of the file at position order in the batch ([] for a failed
+        or skipped file). sources, if given, are the files the pages were
+        made from (e.g. before flattening): the page map compares those.
+        """
+        pages = []
+        for path, source in zip(paths, sources or [None] * len(paths)):
+            try:
+                # e.g. a PNG page's check starts now, in parallel with the others
+                prepared = self.appender.prepare(path, source)
+            except Exception:
+                # append() does the work itself, and reports what went wrong
+                prepared = None
+            pages.append((path, source, prepared))
+        self.waiting[order] = pages
+        while self.next_order in self.waiting:
+            for path, source, prepared in self.waiting.pop(self.next_order):
+                if self.log:
+                    self.log(f"[MERGE] Adding: {os.path.basename(source or path)}")
+                self.pages.put((path, source, prepared))
+                self.page_count += 1
+            self.next_order += 1
+
+    def write_pages(self):
+        while True:
+            item = self.pages.get()
+            if item is None:
+                return
+            if self.error is None and not self.aborted:
+                try:
+                    self.appender.append(*item)
+                    self.written += 1
+                    if self.on_progress:
+                        self.on_progress(self.written, self.page_count)
+                except Exception as e:
+                    # Keep draining so add() never blocks; close() reports it
+                    self.error = e
+
+    def close(self):
+        """Flush the remaining pages and write the merged PDF; True on success"""
+        self.pages.put(None)
+        self.thread.join()
+        try:
+            if self.error is not None:
+                raise self.error
+            if self.aborted:
+                return False
+            if self.waiting:
+                raise RuntimeError(f"files missing before position {min(self.waiting)}")
+            os.makedirs(os.path.dirname(os.path.abspath(self.output_path)), exist_ok=True)
+            temp_path = self.output_path + ".tmp"
+            if self.appender.write(temp_path):
+                os.replace(temp_path, self.output_path)
+            return True
+        except Exception as e:
+            if self.log:
+                self.log(f"[ERROR] Failed to merge PDFs: {str(e)}")
+            return False
+        finally:
+            self.appender.close()
+
+    def abort(self):
+        self.aborted = True
+        self.close()
+
+def merge_files(output_path, kind, paths, sources=None, log=None, variant=None, deduplicate=False):
+    """Merge paths into output_path in one go (outside a batch); True on success"""
+    merge_stage = MergeStage(output_path, kind, log, variant=variant, deduplicate=deduplicate)
+    merge_stage.add(0, paths, sources)
+    return merge_stage.close()
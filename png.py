@@ -1,21 +1,21 @@
-import subprocess
 import os
 import sys
 import json
-from pathlib import Path
 import tempfile
+import time
 import xml.etree.ElementTree as ET
+from svg_stats import analyze_svg
+from inkscape_runner import export_page, ConversionResult, make_failure, DEFAULT_TIMEOUT_POLICY, ResourceLimits
+from render_cache import applicable_layer_rules
+from pipeline import MergeStage
+from png_preflight import DEFAULT_BACKGROUND, background_name
+from inkscape_probe import probe_inkscape, export_command
+import run_log
+import batch_driver
+from batch_driver import BatchFormat
 
-# Global variable for log callback
-global_log_callback = None
-
-def get_svg_files(folder_path):
-    """Get all SVG files from folder, sorted alphabetically"""
-    svg_files = []
-    for file in sorted(os.listdir(folder_path)):
-        if file.lower().endswith('.svg'):
-            svg_files.append(file)
-    return svg_files
+# Manifest of the most recent batch_convert run (used by the merge step)
+last_manifest = None
 
 def parse_svg_layers(svg_content):
     """Parse SVG to extract layer information"""
@@ -44,10 +44,7 @@ def parse_svg_layers(svg_content):
         
         return layers
     except Exception as e:
-        if global_log_callback:
-            global_log_callback(f"Warning: Could not parse SVG layers: {e}")
-        else:
-            print(f"Warning: Could not parse SVG layers: {e}")
+        run_log.current()(f"Warning: Could not parse SVG layers: {e}")
         return {}
 
 def apply_layer_visibility(svg_content, layer_rules, filename=None):
@@ -64,23 +61,8 @@ def apply_layer_visibility(svg_content, layer_rules, filename=None):
         
         root = ET.fromstring(svg_content)
         
-        # Check both global rules and filename-specific rules
-        applicable_rules = {}
-        
-        # Add global rules
-        if 'global' in layer_rules:
-            applicable_rules.update(layer_rules['global'])
-        
-        # Add filename-specific rules
-        if filename:
-            # Try exact match first
-            if filename in layer_rules:
-                applicable_rules.update(layer_rules[filename])
-            
-            # Try without extension
-            basename = os.path.splitext(filename)[0]
-            if basename in layer_rules:
-                applicable_rules.update(layer_rules[basename])
+        # Global rules, then rules for the file name with and without extension
+        applicable_rules = applicable_layer_rules(layer_rules, filename)
         
         if not applicable_rules:
             return svg_content
@@ -127,31 +109,55 @@ def apply_layer_visibility(svg_content, layer_rules, filename=None):
                 elem.set('style', new_style)
                 
                 layers_modified += 1
-                if global_log_callback:
-                    global_log_callback(f"  Applied {action} to layer: {layer_key}")
-                else:
-                    print(f"  Applied {action} to layer: {layer_key}")
+                run_log.detail(f"  Applied {action} to layer: {layer_key}")
         
         if layers_modified > 0:
-            if global_log_callback:
-                global_log_callback(f"  Modified {layers_modified} layers")
-            else:
-                print(f"  Modified {layers_modified} layers")
+            run_log.detail(f"  Modified {layers_modified} layers")
             return ET.tostring(root, encoding='unicode')
         else:
             return svg_content
             
     except Exception as e:
-        if global_log_callback:
-            global_log_callback(f"Warning: Error applying layer rules: {e}")
-        else:
-            print(f"Warning: Error applying layer rules: {e}")
+        run_log.current()(f"Warning: Error applying layer rules: {e}")
         return svg_content
 
-def convert_svg_to_png(svg_path, output_pattern, dpi, inkscape_path, layer_rules=None):
-    """Convert a single SVG file to PNG(s) with optional layer control"""
-    # Use global log_callback
-    global global_log_callback
+def write_layered_svg(svg_path, layer_rules):
+    """Temporary copy of svg_path with the layer rules applied, or None to use the original"""
+    svg_filename = os.path.basename(svg_path)
+    try:
+        # Read SVG content
+        with open(svg_path, 'r', encoding='utf-8') as f:
+            svg_content = f.read()
+        
+        # Apply layer visibility rules
+        run_log.detail(f"  Applying layer rules to: {svg_filename}")
+        
+        svg_content = apply_layer_visibility(svg_content, layer_rules, svg_filename)
+        
+        # Create temporary SVG file with modified layers
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.svg', delete=False, encoding='utf-8') as temp_svg:
+            temp_svg.write(svg_content)
+            return temp_svg.name
+        
+    except Exception as e:
+        run_log.current()(f"Warning: Could not apply layer rules ({e}), using original file")
+        return None
+
+def convert_svg_to_png(svg_path, output_pattern, dpi, inkscape_path, layer_rules=None,
+                       done_pages=None, page_callback=None, timeout_policy=None, retry_policy=None,
+                       resource_limits=None, prepared_svg=None):
+    """
+    Convert a single SVG file to PNG(s) with optional layer control.
+    done_pages maps page numbers already rendered by an interrupted run to
+    their output paths; those pages are not exported again. page_callback
+    is called with (page_num, output_path) after each page is written.
+    Each Inkscape run is bounded by timeout_policy and resource_limits
+    (memory cap, priority, CPU affinity); hangs, crashes and memory-limit
+    kills are retried per retry_policy. The result carries a structured
+    failure. prepared_svg is a copy with the layer rules already applied.
+    """
+    done_pages = done_pages or {}
+    timeout_policy = timeout_policy or DEFAULT_TIMEOUT_POLICY
     
     # Ensure output directory exists
     output_dir = os.path.dirname(output_pattern)
@@ -167,35 +173,14 @@ def convert_svg_to_png(svg_path, output_pattern, dpi, inkscape_path, layer_rules
     svg_filename = os.path.basename(svg_path)
     
     # Check if layer control is needed
-    if layer_rules:
-        try:
-            # Read SVG content
-            with open(svg_path, 'r', encoding='utf-8') as f:
-                svg_content = f.read()
-            
-            # Apply layer visibility rules
-            if global_log_callback:
-                global_log_callback(f"  Applying layer rules to: {svg_filename}")
-            else:
-                print(f"  Applying layer rules to: {svg_filename}")
-            
-            svg_content = apply_layer_visibility(svg_content, layer_rules, svg_filename)
-            
-            # Create temporary SVG file with modified layers
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.svg', delete=False, encoding='utf-8') as temp_svg:
-                temp_svg.write(svg_content)
-                temp_svg_path = temp_svg.name
-            
-            # Clean up flag
-            cleanup_temp = True
-            
-        except Exception as e:
-            if global_log_callback:
-                global_log_callback(f"Warning: Could not apply layer rules ({e}), using original file")
-            else:
-                print(f"Warning: Could not apply layer rules ({e}), using original file")
-            temp_svg_path = svg_path
-            cleanup_temp = False
+    if prepared_svg:
+        # Layers were already rewritten ahead of the render (the caller cleans up)
+        temp_svg_path = prepared_svg
+        cleanup_temp = False
+    elif layer_rules:
+        temp_svg_path = write_layered_svg(svg_path, layer_rules)
+        cleanup_temp = temp_svg_path is not None
+        temp_svg_path = temp_svg_path or svg_path
     else:
         # No layer control needed
         temp_svg_path = svg_path
@@ -203,46 +188,78 @@ def convert_svg_to_png(svg_path, output_pattern, dpi, inkscape_path, layer_rules
     
     # List to track created files
     files_created = []
+    failure = None
     
-    # Change to output directory before running commands
-    original_dir = os.getcwd()
-    os.chdir(output_dir)
+    # Timeouts scale with the page size at this DPI
+    stats = analyze_svg(temp_svg_path)
+    page_timeout = timeout_policy.page_timeout(stats, dpi)
+    deadline = time.time() + timeout_policy.file_timeout(stats, dpi)
+    runner_log = run_log.current()
     
+    # One known-good command line per page instead of trial and error
+    capabilities = probe_inkscape(inkscape_path, log=runner_log)
+    if capabilities and not capabilities.supports('png'):
+        if cleanup_temp and os.path.exists(temp_svg_path):
+            os.unlink(temp_svg_path)
+        return ConversionResult([], make_failure('unsupported', stderr=capabilities.version), kind="PNG")
+    
+    # Output paths are absolute: workers run concurrently, so no os.chdir
     try:
         # Convert using the temporary/modified SVG
         # COMMAND 1: Export page 1
-        output_file_1 = f"{base_name}.png"
-        cmd1 = f'"{inkscape_path}" "{temp_svg_path}" --export-type=png --export-dpi={dpi} --export-filename="{output_file_1}"'
-        
-        result1 = subprocess.run(cmd1, shell=True, capture_output=True, text=True, encoding='utf-8')
-        
-        if os.path.exists(output_file_1):
+        output_file_1 = os.path.join(output_dir, f"{base_name}.png")
+        if 1 in done_pages:
+            # Already rendered by an interrupted run
             files_created.append(output_file_1)
         else:
-            # Try with --export-page=1 if basic export fails
-            cmd1b = f'"{inkscape_path}" "{temp_svg_path}" --export-type=png --export-page=1 --export-dpi={dpi} --export-filename="{output_file_1}"'
-            result1b = subprocess.run(cmd1b, shell=True, capture_output=True, text=True, encoding='utf-8')
+            # A binary known to support --export-page exports page 1 explicitly
+            page = 1 if capabilities and capabilities.export_page else None
+            cmd1 = export_command(capabilities, inkscape_path, temp_svg_path, 'png', output_file_1, dpi, page)
+            outcome = export_page(cmd1, output_file_1, page_timeout, 1, retry_policy, deadline, runner_log,
+                                      resource_limits)
+            
+            if not outcome.ok and not outcome.retryable and capabilities is None:
+                # Unprobed binary: try with --export-page=1 if basic export fails (never after a hang or crash)
+                cmd1b = export_command(None, inkscape_path, temp_svg_path, 'png', output_file_1, dpi, 1)
+                outcome = export_page(cmd1b, output_file_1, page_timeout, 1, retry_policy, deadline, runner_log,
+                                      resource_limits)
             
-            if os.path.exists(output_file_1):
+            if outcome.ok:
                 files_created.append(output_file_1)
+                if page_callback:
+                    page_callback(1, output_file_1)
+            else:
+                failure = outcome.failure
         
-        # COMMAND 2-5: Export additional pages
+        # COMMAND 2-5: Export additional pages (not after page 1 hung or crashed)
         for page_num in range(2, 6):
-            output_file = f"{base_name}_p{page_num}.png"
-            cmd = f'"{inkscape_path}" "{temp_svg_path}" --export-type=png --export-page={page_num} --export-dpi={dpi} --export-filename="{output_file}"'
+            if failure and failure['reason'] != 'no_output':
+                break
+            if capabilities and not capabilities.export_page:
+                # Without --export-page only the first page can be exported
+                break
             
-            result = subprocess.run(cmd, shell=True, capture_output=True, text=True, encoding='utf-8')
+            output_file = os.path.join(output_dir, f"{base_name}_p{page_num}.png")
+            if page_num in done_pages:
+                files_created.append(output_file)
+                continue
+            
+            cmd = export_command(capabilities, inkscape_path, temp_svg_path, 'png', output_file, dpi, page_num)
+            outcome = export_page(cmd, output_file, page_timeout, page_num, retry_policy, deadline, runner_log,
+                                  resource_limits)
             
-            if os.path.exists(output_file):
+            if outcome.ok:
                 files_created.append(output_file)
+                if page_callback:
+                    page_callback(page_num, output_file)
             else:
+                if outcome.failure['reason'] != 'no_output':
+                    # Hung, crashed or out of time: the file is incomplete
+                    failure = outcome.failure
                 # Stop if this page doesn't exist
                 break
     
     finally:
-        # Change back to original directory
-        os.chdir(original_dir)
-        
         # Clean up temporary file if created
         if cleanup_temp and os.path.exists(temp_svg_path):
             try:
@@ -250,204 +267,116 @@ def convert_svg_to_png(svg_path, output_pattern, dpi, inkscape_path, layer_rules
             except:
                 pass
     
-    # Create result object
-    if files_created:
-        # Success result
-        class SuccessResult:
-            def __init__(self, files):
-                self.returncode = 0
-                self.stdout = f"Created {len(files)} PNG file(s)"
-                self.stderr = ""
-                self.files_created = files
-        return SuccessResult(files_created)
-    else:
-        # Error result
-        class ErrorResult:
-            def __init__(self):
-                self.returncode = 1
-                self.stdout = ""
-                self.stderr = "Failed to create any PNG files"
-        return ErrorResult()
-
-def batch_convert(svg_folder, output_path, dpi, create_subfolders=True, 
-                  inkscape_path=None, log_callback=None, progress_callback=None,
-                  layer_rules=None):
-    """
-    Batch convert all SVG files in a folder to PNG with progress reporting
-    """
-    # Store log_callback in global variable for use in other functions
-    global global_log_callback
-    global_log_callback = log_callback
-    
-    def log(message):
-        if log_callback:
-            log_callback(message)
-        else:
-            # Remove or replace emojis for Windows console compatibility
-            clean_message = message
-            # Replace all Unicode symbols with ASCII equivalents
-            replacements = {
-                '📁': '[FOLDER]',
-                '🎯': '[TARGET]', 
-                '📊': '[STATS]',
-                '✅': '[OK]',
-                '❌': '[ERROR]',
-                '⚠️': '[WARNING]',
-                '📂': '[FOLDER]',
-                '→': '->',  # Replace arrow with ASCII arrow
-                '🖼️': '[IMAGE]'
-            }
-            
-            for unicode_char, ascii_char in replacements.items():
-                clean_message = clean_message.replace(unicode_char, ascii_char)
-            
-            # Safe print for Windows console
-            try:
-                print(clean_message)
-            except UnicodeEncodeError:
-                # If still fails, remove all non-ASCII
-                safe_message = clean_message.encode('ascii', 'ignore').decode('ascii')
-                print(safe_message)
-    
-    # Default Inkscape path if not provided
-    if not inkscape_path:
-        inkscape_path = r"C:\Program Files\Inkscape\bin\inkscape.exe"
-    
-    # Get absolute paths
-    svg_folder = os.path.abspath(svg_folder)
-    output_dir = os.path.abspath(output_path)
-    
-    # Create output directory
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # Check if Inkscape exists
-    if not os.path.exists(inkscape_path):
-        log(f"[ERROR] Inkscape not found at: {inkscape_path}")
-        return False
-    
-    # Get SVG files
-    svg_files = get_svg_files(svg_folder)
+    # A missing page 1 only counts as a failure if nothing was produced
+    if files_created and failure and failure['reason'] == 'no_output':
+        failure = None
     
-    if not svg_files:
-        log("[ERROR] No SVG files found in: " + svg_folder)
-        return False
-    
-    log(f"[FOLDER] Found {len(svg_files)} SVG files in: {svg_folder}")
-    log(f"[FOLDER] Output folder: {output_dir}")
-    log(f"[TARGET] DPI: {dpi}")
-    log(f"[INKSCAPE] Using: {inkscape_path}")
-    log(f"[OPTION] Create subfolders: {create_subfolders}")
+    # Report names relative to the output directory, as before
+    files_created = [os.path.basename(path) for path in files_created]
+    return ConversionResult(files_created, failure, kind="PNG")
+
+class PngBatch(BatchFormat):
+    """PNG pages, optionally merged into combined_output.pdf"""
+    name = 'png'
+    label = "PNG"
+    merged_name = "combined_output.pdf"
     
-    if layer_rules:
-        rule_count = sum(len(rules) for rules in layer_rules.values())
-        log(f"[LAYER CONTROL] Enabled with {rule_count} rule(s)")
+    def layered_svg(self, svg_path, layer_rules):
+        return write_layered_svg(svg_path, layer_rules)
     
-    total_files = len(svg_files)
-    successful = 0
-    failed = 0
+    def convert(self, svg_path, output_pattern, dpi, inkscape_path, layer_rules, **options):
+        return convert_svg_to_png(svg_path, output_pattern, dpi, inkscape_path, layer_rules, **options)
     
-    # Send initial progress (0%)
-    if progress_callback:
-        progress_callback(0, total_files, "Starting conversion...")
+    def merge_stage(self, merged_pdf_path, log, on_progress):
+        # Pages are checked and flattened onto white as they are merged, as a preflight would
+        return MergeStage(merged_pdf_path, 'png', log, on_progress=on_progress,
+                          variant=background_name(DEFAULT_BACKGROUND), background=DEFAULT_BACKGROUND)
     
-    # Process each SVG file
-    for i, svg_file in enumerate(svg_files, 1):
-        svg_path = os.path.join(svg_folder, svg_file)
-        file_base_name = os.path.splitext(svg_file)[0]
-        
-        # Update progress before starting this file
-        if progress_callback:
-            progress_callback(i-1, total_files, f"Processing: {svg_file}")
-        
-        if create_subfolders:
-            # Create subfolder for each SVG file
-            file_output_dir = os.path.join(output_dir, file_base_name)
-            os.makedirs(file_output_dir, exist_ok=True)
-            # Output pattern: use SVG filename as base
-            output_pattern = os.path.join(file_output_dir, f"{file_base_name}.png")
-            target_dir = file_output_dir
+    def finish_merge(self, merge, manifest, log, progress_callback):
+        if merge.stage and not manifest.total_outputs:
+            merge.abort()
+            return
+        if merge.stage:
+            log(f"[MERGE] Writing {manifest.total_outputs} PNG pages to: {merge.path}")
+        if merge.finish():
+            log(f"[OK] Merged PDF: {merge.path} ({os.path.getsize(merge.path)} bytes)")
         else:
-            # All PNGs in same folder
-            # Output pattern: use SVG filename as base
-            output_pattern = os.path.join(output_dir, f"{file_base_name}.png")
-            target_dir = output_dir
-        
-        log(f"\n[{i}/{total_files}] Processing: {svg_file}")
-        
-        result = convert_svg_to_png(svg_path, output_pattern, dpi, inkscape_path, layer_rules)
-        
-        if result.returncode == 0:
-            successful += 1
-            
-            # Get list of created files
-            if hasattr(result, 'files_created'):
-                # New format: result has files_created attribute
-                png_files = result.files_created
-            else:
-                # Old format: list directory
-                if os.path.exists(target_dir):
-                    png_files = [f for f in os.listdir(target_dir) if f.lower().endswith('.png')]
-                else:
-                    png_files = []
-            
-            if png_files:
-                log(f"[OK] Success! Created {len(png_files)} PNG files:")
-                for png in sorted(png_files):
-                    file_path = os.path.join(target_dir, png)
-                    if os.path.exists(file_path):
-                        file_size = os.path.getsize(file_path)
-                        log(f"      -> {png} ({file_size} bytes)")
-                    else:
-                        log(f"      -> {png}")
-            else:
-                log(f"[WARNING] No PNG files generated for {svg_file}")
-        else:
-            failed += 1
-            log(f"[ERROR] Failed to process {svg_file}")
-            if result.stderr:
-                error_msg = result.stderr[:500]
-                log(f"   Error: {error_msg}")
-    
-    # Send final progress (100%)
-    if progress_callback:
-        progress_callback(total_files, total_files, "Conversion complete!")
-    
-    # Summary
-    log("\n" + "="*50)
-    log("CONVERSION SUMMARY")
-    log("="*50)
-    log(f"[STATS] Total SVG files processed: {total_files}")
-    log(f"[OK] Successful conversions: {successful}")
-    log(f"[ERROR] Failed conversions: {failed}")
-    log(f"[FOLDER] Output location: {output_dir}")
-    
-    # Count total PNG files created (walk through all directories)
-    total_pngs = 0
-    if create_subfolders:
-        for root, dirs, files in os.walk(output_dir):
-            pngs = [f for f in files if f.lower().endswith('.png')]
-            total_pngs += len(pngs)
-            if pngs:
-                log(f"[INFO] In {root}: {len(pngs)} PNG files")
-                for png in sorted(pngs):
-                    log(f"      {png}")
-    else:
-        pngs = [f for f in os.listdir(output_dir) if f.lower().endswith('.png')]
-        total_pngs = len(pngs)
-        if pngs:
-            log(f"[INFO] PNG files in output directory:")
-            for png in sorted(pngs):
-                log(f"      {png}")
-    
-    log(f"[STATS] Total PNG files created: {total_pngs}")
-    log("="*50)
-    
-    return successful > 0
+            log("[ERROR] Failed to merge PNG files to PDF")
+
+def prepare_batch(svg_folder, output_path, dpi, create_subfolders=True, 
+                  inkscape_path=None, log_callback=None, progress_callback=None,
+                  layer_rules=None, resume=False, timeout_policy=None, retry_policy=None,
+                  eta_callback=None, cost_model=None, name=None, render_cache=None,
+                  resource_limits=None, auto_merge_pdf=False,
+                  log_level=None, log_file=None, event_callback=None):
+    """
+    Plan a PNG batch without running it (see batch_driver.prepare_batch).
+    auto_merge_pdf streams the PNG pages, in source order, into
+    combined_output.pdf as files finish.
+    """
+    global last_manifest
+    plan = batch_driver.prepare_batch(PngBatch(), svg_folder, output_path, dpi, create_subfolders,
+                                      inkscape_path, log_callback, progress_callback,
+                                      layer_rules=layer_rules, resume=resume,
+                                      timeout_policy=timeout_policy, retry_policy=retry_policy,
+                                      eta_callback=eta_callback, cost_model=cost_model, name=name,
+                                      render_cache=render_cache, resource_limits=resource_limits,
+                                      auto_merge_pdf=auto_merge_pdf, log_level=log_level,
+                                      log_file=log_file, event_callback=event_callback)
+    if plan:
+        last_manifest = plan.manifest
+    return plan
+
+def batch_convert(svg_folder, output_path, dpi, create_subfolders=True, 
+                  inkscape_path=None, log_callback=None, progress_callback=None,
+                  layer_rules=None, resume=False, timeout_policy=None, retry_policy=None,
+                  workers=None, memory_budget=None, eta_callback=None, render_cache=None,
+                  resource_limits=None, auto_merge_pdf=False,
+                  log_level=None, log_file=None, run_telemetry=None, event_callback=None):
+    """
+    Batch convert all SVG files in a folder to PNG with progress reporting.
+    With resume=True, files and pages recorded in the output folder's
+    checkpoint journal by an interrupted run are not converted again.
+    Files that keep hanging or crashing Inkscape are quarantined and
+    skipped by later runs until they change.
+    Files are rendered by up to workers Inkscape processes at once (default:
+    CPU count), admitted only while their estimated memory fits in
+    memory_budget bytes (default: 75% of available RAM).
+    eta_callback, if given, is called with (seconds_left or None, fraction)
+    after each file, where fraction weights files by their predicted cost.
+    resource_limits (ResourceLimits) caps the memory, priority and CPUs of
+    each Inkscape process; a process over its memory cap is killed and
+    retried like a crash.
+    auto_merge_pdf also writes combined_output.pdf, built while files render.
+    log_level hides messages below it (default 'info'; 'detail' shows
+    per-layer rules) and log_file keeps a rotating log of the run.
+    run_telemetry (RunTelemetry) collects live throughput, worker, cache and
+    memory statistics of the run, e.g. for a dashboard.
+    event_callback(event, info) receives page-level progress events: file
+    and page started/finished (with bytes and duration) and merge progress.
+    """
+    plan = prepare_batch(svg_folder, output_path, dpi, create_subfolders, inkscape_path,
+                         log_callback, progress_callback, layer_rules=layer_rules, resume=resume,
+                         auto_merge_pdf=auto_merge_pdf,
+                         timeout_policy=timeout_policy, retry_policy=retry_policy,
+                         eta_callback=eta_callback, render_cache=render_cache,
+                         resource_limits=resource_limits, log_level=log_level, log_file=log_file,
+                         event_callback=event_callback)
+    return batch_driver.run_batch(plan, workers, memory_budget, run_telemetry)
 
 # Function to handle command line interface (backward compatible)
-def batch_convert_cli(svg_folder, output_path, dpi, create_subfolders=True, inkscape_path=None):
+def batch_convert_cli(svg_folder, output_path, dpi, create_subfolders=True, inkscape_path=None,
+                      resume=False, workers=None, resource_limits=None, log_level=None, log_file=None):
     """CLI wrapper for batch_convert without callbacks"""
-    return batch_convert(svg_folder, output_path, dpi, create_subfolders, inkscape_path)
+    return batch_convert(svg_folder, output_path, dpi, create_subfolders, inkscape_path,
+                         resume=resume, workers=workers, resource_limits=resource_limits,
+                         log_level=log_level, log_file=log_file)
+
+def config_output_path(config, default_folder='png_output'):
+    """Output folder of a config: output_path, or output_location/output_folder as the GUI builds it"""
+    if config.get('output_path'):
+        return config['output_path']
+    return os.path.join(config.get('output_location') or '.', config.get('output_folder', default_folder))
 
 def convert_from_config(config_file='conversion_config.json'):
     """Convert using configuration from JSON file"""
@@ -458,10 +387,15 @@ def convert_from_config(config_file='conversion_config.json'):
         # Run conversion
         return batch_convert_cli(
             svg_folder=config.get('svg_folder', '.'),
-            output_path=config.get('output_path', './png_output'),
+            output_path=config_output_path(config),
             dpi=str(config.get('dpi', '96')),
             create_subfolders=config.get('create_subfolders', True),
-            inkscape_path=config.get('inkscape_path')
+            inkscape_path=config.get('inkscape_path'),
+            resume=config.get('resume', False),
+            workers=config.get('workers'),
+            resource_limits=ResourceLimits.from_config(config.get('limits')),
+            log_level=config.get('log_level'),
+            log_file=config.get('log_file')
         )
     except FileNotFoundError:
         print("[ERROR] Config file not found: " + config_file)
@@ -472,17 +406,47 @@ def convert_from_config(config_file='conversion_config.json'):
 
 def main():
     """Main function for command-line usage"""
-    if len(sys.argv) >= 4:
+    # --worker=QUEUE_DIR renders tasks from a shared work queue (see workqueue.py)
+    for arg in sys.argv:
+        if arg.startswith('--worker='):
+            from workqueue import run_worker
+            inkscape_path = None
+            for option in sys.argv:
+                if option.startswith('--inkscape='):
+                    inkscape_path = option.split('=', 1)[1]
+            run_worker(arg.split('=', 1)[1], inkscape_path)
+            return 0
+    
+    # --resume may appear anywhere on the command line
+    resume = '--resume' in sys.argv
+    # --workers=N caps the number of parallel Inkscape processes
+    workers = None
+    for arg in sys.argv:
+        if arg.startswith('--workers='):
+            workers = int(arg.split('=', 1)[1])
+    # --log-level=detail shows per-layer messages; --log-file=path keeps a rotating log
+    log_level = None
+    log_file = None
+    for arg in sys.argv:
+        if arg.startswith('--log-level='):
+            log_level = arg.split('=', 1)[1]
+        elif arg.startswith('--log-file='):
+            log_file = arg.split('=', 1)[1]
+    # --memory-limit=MB, --nice=N, --ionice=idle|low and --pin-cpus limit each Inkscape process
+    resource_limits, argv = ResourceLimits.from_args(sys.argv)
+    argv = [arg for arg in argv if arg != '--resume' and not arg.startswith(('--workers=', '--log-level=', '--log-file='))]
+    
+    if len(argv) >= 4:
         # Get arguments from command line
-        svg_folder = sys.argv[1]
-        output_path = sys.argv[2]
-        dpi = sys.argv[3]
-        create_subfolders = True if len(sys.argv) < 5 else sys.argv[4].lower() == 'true'
+        svg_folder = argv[1]
+        output_path = argv[2]
+        dpi = argv[3]
+        create_subfolders = True if len(argv) < 5 else argv[4].lower() == 'true'
         
         # Check for custom inkscape path (6th argument)
         inkscape_path = None
-        if len(sys.argv) >= 6:
-            inkscape_path = sys.argv[5]
+        if len(argv) >= 6:
+            inkscape_path = argv[5]
         
         # Use ASCII-safe printing for command line
         print("Command line conversion:")
@@ -492,9 +456,17 @@ def main():
         print("Create Subfolders: " + str(create_subfolders))
         if inkscape_path:
             print("Inkscape Path: " + inkscape_path)
+        print("Resume: " + str(resume))
+        print("Workers: " + (str(workers) if workers else "auto"))
+        if resource_limits:
+            print("Limits: " + str(resource_limits.to_config()))
+        if log_file:
+            print("Log file: " + log_file)
         print("="*50)
         
-        success = batch_convert_cli(svg_folder, output_path, dpi, create_subfolders, inkscape_path)
+        success = batch_convert_cli(svg_folder, output_path, dpi, create_subfolders, inkscape_path,
+                                    resume=resume, workers=workers, resource_limits=resource_limits,
+                                    log_level=log_level, log_file=log_file)
         
         if success:
             print("\n[OK] Conversion completed successfully!")
@@ -503,10 +475,15 @@ def main():
             print("\n[ERROR] Conversion failed or no files processed!")
             return 1
     else:
-        print("Usage: python png.py <svg_folder> <output_path> <dpi> [create_subfolders] [inkscape_path]")
+        print("Usage: python png.py <svg_folder> <output_path> <dpi> [create_subfolders] [inkscape_path] [--resume] [--workers=N]")
         print("Example: python png.py ./svgs ./output/png_files 150 true")
         print("Example: python png.py ./svgs ./output 300 false \"C:\\Custom\\inkscape.exe\"")
+        print("Example: python png.py ./svgs ./output/png_files 150 true --resume")
         print("\nNote: output_path should include the folder name")
+        print("Add --resume to skip files finished by an interrupted run")
+        print("Add --workers=N to limit the number of parallel Inkscape processes")
+        print("Add --log-level=detail to show per-layer messages, --log-file=path to keep a log")
+        print("Or run as a render worker: --worker=<queue_dir> [--inkscape=path] (see workqueue.py)")
         print("\nOr use with GUI: python gui.py")
         return 1
 
@@ -0,0 +1,413 @@
+# png_pdf.py - Streaming PNG-to-PDF writer: one page at a time, memory flat whatever the page count
+import os
+import zlib
+import struct
+import importlib.util
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# Samples per pixel for each PNG colour type
+COLOR_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+COLOR_SPACES = {0: '/DeviceGray', 2: '/DeviceRGB', 4: '/DeviceGray', 6: '/DeviceRGB'}
+
+# Page size of PNGs without a pHYs resolution (img2pdf's default too)
+DEFAULT_DPI = 96.0
+# Streams are written and compressed in pieces of this size
+CHUNK_SIZE = 256 * 1024
+
+# Pillow (optional) decodes pages that cannot pass through much faster than Python
+PILLOW_AVAILABLE = importlib.util.find_spec('PIL') is not None
+
+class PngError(ValueError):
+    pass
+
+class PngInfo:
+    """Header of a PNG: size, format, palette and resolution"""
+    def __init__(self, width, height, bit_depth, color_type, interlace):
+        self.width = width
+        self.height = height
+        self.bit_depth = bit_depth
+        self.color_type = color_type
+        self.interlace = interlace
+        self.palette = None
+        self.transparency = None
+        self.dpi = None
+
+    @property
+    def channels(self):
+        return COLOR_CHANNELS[self.color_type]
+
+    @property
+    def has_alpha(self):
+        return self.color_type in (4, 6)
+
+    @property
+    def palette_transparency(self):
+        return self.color_type == 3 and self.transparency is not None
+
+    @property
+    def passthrough(self):
+        """
+        Its IDAT data can go into the PDF as it is (Flate with PNG
+        predictors); a gray or RGB tRNS colour becomes a /Mask colour key
+        """
+        return not self.has_alpha and not self.interlace and not self.palette_transparency
+
+    def color_key(self):
+        """The /Mask entry for a tRNS colour ('' without one)"""
+        if self.transparency is None or self.color_type not in (0, 2):
+            return ""
+        key = struct.unpack(f'>{self.channels}H', self.transparency[:self.channels * 2])
+        return " /Mask [" + ' '.join(f"{value} {value}" for value in key) + "]"
+
+    @property
+    def row_bytes(self):
+        return (self.width * self.channels * self.bit_depth + 7) // 8
+
+def read_chunks(f):
+    """(type, data) of each chunk of an open PNG, CRCs checked, up to IEND"""
+    if f.read(8) != PNG_SIGNATURE:
+        raise PngError("not a PNG file")
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            raise PngError("truncated (no IEND chunk)")
+        length, chunk_type = struct.unpack('>I4s', header)
+        data = f.read(length)
+        crc = f.read(4)
+        if len(data) < length or len(crc) < 4:
+            raise PngError(f"truncated in {chunk_type.decode('latin-1')} chunk")
+        if zlib.crc32(chunk_type + data) != struct.unpack('>I', crc)[0]:
+            raise PngError(f"bad CRC in {chunk_type.decode('latin-1')} chunk")
+        yield chunk_type, data
+        if chunk_type == b'IEND':
+            return
+
+def parse_header(chunk_type, data, info):
+    """Fill info from one chunk before the image data (IHDR creates it)"""
+    if chunk_type == b'IHDR':
+        width, height, bit_depth, color_type, _, _, interlace = struct.unpack('>IIBBBBB', data)
+        if color_type not in COLOR_CHANNELS:
+            raise PngError(f"unknown colour type {color_type}")
+        return PngInfo(width, height, bit_depth, color_type, interlace)
+    if info is None:
+        raise PngError("IHDR is not the first chunk")
+    if chunk_type == b'PLTE':
+        info.palette = data
+    elif chunk_type == b'tRNS':
+        info.transparency = data
+    elif chunk_type == b'pHYs' and len(data) == 9:
+        x, y, unit = struct.unpack('>IIB', data)
+        if unit == 1 and x and y:
+            # Pixels per metre
+            info.dpi = (x * 0.0254, y * 0.0254)
+    return info
+
+def png_info(path):
+    """PngInfo of a PNG file (reads only up to the image data)"""
+    info = None
+    with open(path, 'rb') as f:
+        for chunk_type, data in read_chunks(f):
+            if chunk_type in (b'IDAT', b'IEND'):
+                break
+            info = parse_header(chunk_type, data, info)
+    if info is None:
+        raise PngError("no IHDR chunk")
+    return info
+
+def paeth(a, b, c):
+    p = a + b - c
+    pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+    if pa <= pb and pa <= pc:
+        return a
+    return b if pb <= pc else c
+
+def unfilter_rows(compressed_chunks, info):
+    """Raw rows of a non-interlaced PNG, decoded one row at a time"""
+    stride = info.row_bytes
+    bpp = max(1, info.channels * info.bit_depth // 8)
+    decompressor = zlib.decompressobj()
+    pending = bytearray()
+    previous = bytearray(stride)
+    rows = 0
+
+    def rows_in(pending, previous):
+        while len(pending) > stride:
+            filter_type = pending[0]
+            row = bytearray(pending[1:stride + 1])
+            del pending[:stride + 1]
+            if filter_type == 1:
+                for i in range(bpp, stride):
+                    row[i] = (row[i] + row[i - bpp]) & 0xFF
+            elif filter_type == 2:
+                for i in range(stride):
+                    row[i] = (row[i] + previous[i]) & 0xFF
+            elif filter_type == 3:
+                for i in range(stride):
+                    left = row[i - bpp] if i >= bpp else 0
+                    row[i] = (row[i] + ((left + previous[i]) >> 1)) & 0xFF
+            elif filter_type == 4:
+                for i in range(stride):
+                    left = row[i - bpp] if i >= bpp else 0
+                    upper_left = previous[i - bpp] if i >= bpp else 0
+                    row[i] = (row[i] + paeth(left, previous[i], upper_left)) & 0xFF
+            elif filter_type != 0:
+                raise PngError(f"unknown row filter {filter_type}")
+            yield row
+            previous = row
+
+    for chunk in compressed_chunks:
+        pending += decompressor.decompress(chunk)
+        for row in rows_in(pending, previous):
+            previous = row
+            rows += 1
+            yield row
+    pending += decompressor.flush()
+    for row in rows_in(pending, previous):
+        rows += 1
+        yield row
+    if rows != info.height:
+        raise PngError(f"image data has {rows} of {info.height} rows")
+
+def split_alpha(row, info):
+    """(colour bytes, alpha bytes) of one decoded row with an alpha channel"""
+    sample = info.bit_depth // 8
+    pixel = info.channels * sample
+    color_size = pixel - sample
+    color = bytearray(info.width * color_size)
+    alpha = bytearray(info.width * sample)
+    for k in range(color_size):
+        color[k::color_size] = row[k::pixel]
+    for k in range(sample):
+        alpha[k::sample] = row[color_size + k::pixel]
+    return color, alpha
+
+class PdfImageWriter:
+    """
+    Writes PNG pages to a PDF file as they are added. Each page is written
+    out completely before the next one is read, so memory use does not grow
+    with the page count; the page tree, catalog and cross-reference table
+    follow at close(). Opaque PNGs keep their compressed data unchanged;
+    PNGs with alpha get a soft mask (decoded by Pillow if installed, else
+    row by row here).
+    update, if given, is (next object number, cross-reference offset) of
+    a PDF this class wrote earlier: pages are then appended to that file
+    as an incremental update, and add_existing_page() keeps its pages.
+    """
+    def __init__(self, path, default_dpi=DEFAULT_DPI, update=None):
+        self.path = path
+        self.default_dpi = default_dpi
+        self.offsets = {}
+        self.page_ids = []
+        self.xref_offset = None
+        if update:
+            self.next_id, self.previous_xref = update
+            self.file = open(path, 'r+b')
+            self.original_size = self.file.seek(0, os.SEEK_END)
+            return
+        self.previous_xref = None
+        self.file = open(path, 'wb')
+        # 1 and 2 are the catalog and page tree, written last
+        self.next_id = 3
+        # Binary comment marks the file as binary for transfer tools
+        self.file.write(b'%PDF-1.5\n%\xe2\xe3\xcf\xd3\n')
+
+    @property
+    def page_count(self):
+        return len(self.page_ids)
+
+    def new_id(self):
+        self.next_id += 1
+        return self.next_id - 1
+
+    def write_object(self, obj_id, body):
+        self.offsets[obj_id] = self.file.tell()
+        self.file.write(f"{obj_id} 0 obj\n{body}\nendobj\n".encode('latin-1'))
+
+    def write_stream(self, obj_id, dictionary, chunks):
+        """A stream object from an iterable of bytes; its length follows as its own object"""
+        length_id = self.new_id()
+        self.offsets[obj_id] = self.file.tell()
+        self.file.write(f"{obj_id} 0 obj\n<< {dictionary} /Length {length_id} 0 R >>\nstream\n".encode('latin-1'))
+        length = 0
+        for chunk in chunks:
+            self.file.write(chunk)
+            length += len(chunk)
+        self.file.write(b"\nendstream\nendobj\n")
+        self.write_object(length_id, str(length))
+
+    def add_png(self, path):
+        """Append path as one page, sized from its resolution"""
+        with open(path, 'rb') as f:
+            chunks = read_chunks(f)
+            info = None
+            first_data = None
+            for chunk_type, data in chunks:
+                if chunk_type == b'IDAT':
+                    first_data = data
+                    break
+                if chunk_type == b'IEND':
+                    raise PngError("no image data")
+                info = parse_header(chunk_type, data, info)
+            if info is None:
+                raise PngError("no IHDR chunk")
+
+            def image_data():
+                # Consecutive IDAT chunks, without holding more than one
+                yield first_data
+                for chunk_type, data in chunks:
+                    if chunk_type != b'IDAT':
+                        break
+                    yield data
+                # Read on to IEND so truncated files are caught
+                for _ in chunks:
+                    pass
+
+            image_id = self.new_id()
+            if info.passthrough:
+                self.write_passthrough(image_id, info, image_data())
+            elif PILLOW_AVAILABLE or info.interlace or info.palette_transparency:
+                self.write_decoded(image_id, info, path)
+            else:
+                self.write_with_mask(image_id, info, unfilter_rows(image_data(), info))
+        self.add_page(image_id, info)
+
+    def color_space(self, info):
+        if info.color_type != 3:
+            return COLOR_SPACES[info.color_type]
+        if not info.palette:
+            raise PngError("palette image without PLTE chunk")
+        return f"[/Indexed /DeviceRGB {len(info.palette) // 3 - 1} <{info.palette.hex()}>]"
+
+    def write_passthrough(self, image_id, info, data):
+        dictionary = (f"/Type /XObject /Subtype /Image /Width {info.width} /Height {info.height} "
+                      f"/ColorSpace {self.color_space(info)} /BitsPerComponent {info.bit_depth} "
+                      f"/Filter /FlateDecode /DecodeParms << /Predictor 15 /Colors {info.channels} "
+                      f"/BitsPerComponent {info.bit_depth} /Columns {info.width} >>{info.color_key()}")
+        self.write_stream(image_id, dictionary, data)
+
+    def write_with_mask(self, image_id, info, rows):
+        """Colour into the image stream as rows decode; the (small) compressed alpha is written after it"""
+        mask_id = self.new_id()
+        color_compressor = zlib.compressobj(6)
+        alpha_compressor = zlib.compressobj(6)
+        alpha_data = []
+
+        def color_data():
+            buffered = bytearray()
+            for row in rows:
+                color, alpha = split_alpha(row, info)
+                alpha_data.append(alpha_compressor.compress(bytes(alpha)))
+                buffered += color
+                if len(buffered) >= CHUNK_SIZE:
+                    yield color_compressor.compress(bytes(buffered))
+                    buffered.clear()
+            yield color_compressor.compress(bytes(buffered))
+            yield color_compressor.flush()
+            alpha_data.append(alpha_compressor.flush())
+
+        bits = info.bit_depth
+        self.write_stream(image_id, f"/Type /XObject /Subtype /Image /Width {info.width} /Height {info.height} "
+                                    f"/ColorSpace {COLOR_SPACES[info.color_type]} /BitsPerComponent {bits} "
+                                    f"/SMask {mask_id} 0 R /Filter /FlateDecode", color_data())
+        self.write_stream(mask_id, f"/Type /XObject /Subtype /Image /Width {info.width} /Height {info.height} "
+                                   f"/ColorSpace /DeviceGray /BitsPerComponent {bits} /Filter /FlateDecode",
+                          alpha_data)
+
+    def write_decoded(self, image_id, info, path):
+        """Decode one page whole with Pillow (needed for interlaced PNGs and palette transparency)"""
+        try:
+            from PIL import Image
+        except ImportError:
+            what = "interlaced PNG" if info.interlace else "palette PNG with transparency"
+            raise PngError(f"{what} needs Pillow (pip install Pillow)")
+        with Image.open(path) as image:
+            if 'transparency' in image.info:
+                # tRNS becomes an alpha channel, and so a soft mask
+                image = image.convert('LA' if image.mode == 'L' else 'RGBA')
+            alpha = image.getchannel('A') if 'A' in image.getbands() else None
+            color = image.convert('L' if image.mode in ('L', 'LA', 'I', 'I;16') else 'RGB')
+        mask_id = self.new_id() if alpha is not None else None
+        space = '/DeviceGray' if color.mode == 'L' else '/DeviceRGB'
+        smask = f" /SMask {mask_id} 0 R" if mask_id else ""
+        self.write_stream(image_id, f"/Type /XObject /Subtype /Image /Width {info.width} /Height {info.height} "
+                                    f"/ColorSpace {space} /BitsPerComponent 8{smask} /Filter /FlateDecode",
+                          [zlib.compress(color.tobytes(), 6)])
+        if mask_id:
+            self.write_stream(mask_id, f"/Type /XObject /Subtype /Image /Width {info.width} /Height {info.height} "
+                                       f"/ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /FlateDecode",
+                              [zlib.compress(alpha.tobytes(), 6)])
+
+    def add_page(self, image_id, info):
+        dpi_x, dpi_y = info.dpi or (self.default_dpi, self.default_dpi)
+        width = info.width * 72.0 / dpi_x
+        height = info.height * 72.0 / dpi_y
+        content_id = self.new_id()
+        page_id = self.new_id()
+        self.write_stream(content_id, "", [f"q {width:.4f} 0 0 {height:.4f} 0 0 cm /Im0 Do Q".encode('latin-1')])
+        self.write_object(page_id, f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width:.4f} {height:.4f}] "
+                                   f"/Resources << /XObject << /Im0 {image_id} 0 R >> >> "
+                                   f"/Contents {content_id} 0 R >>")
+        self.page_ids.append(page_id)
+
+    def add_existing_page(self, page_id):
+        """Keep a page of the PDF being updated, in this position"""
+        self.page_ids.append(page_id)
+
+    def close(self):
+        """Write the page tree, catalog and cross-reference table"""
+        kids = ' '.join(f"{page_id} 0 R" for page_id in self.page_ids)
+        self.write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>")
+        if not self.previous_xref:
+            self.write_object(1, "<< /Type /Catalog /Pages 2 0 R >>")
+        self.xref_offset = self.file.tell()
+        # An update lists only the objects it wrote, in runs of consecutive numbers;
+        # every table starts with the free entry 0, as readers expect
+        entries = [(0, None)] + sorted(self.offsets.items())
+        lines = ["xref\n"]
+        run_start = 0
+        for index in range(1, len(entries) + 1):
+            if index == len(entries) or entries[index][0] != entries[index - 1][0] + 1:
+                lines.append(f"{entries[run_start][0]} {index - run_start}\n")
+                for _, offset in entries[run_start:index]:
+                    lines.append("0000000000 65535 f \n" if offset is None else f"{offset:010d} 00000 n \n")
+                run_start = index
+        previous = f" /Prev {self.previous_xref}" if self.previous_xref else ""
+        lines.append(f"trailer\n<< /Size {self.next_id} /Root 1 0 R{previous} >>\n"
+                     f"startxref\n{self.xref_offset}\n%%EOF\n")
+        self.file.write(''.join(lines).encode('latin-1'))
+        self.file.close()
+
+    def abort(self):
+        """Discard what was written (an updated file is cut back to its old end)"""
+        if self.previous_xref:
+            self.file.truncate(self.original_size)
+            self.file.close()
+            return
+        self.file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+def write_pdf(png_paths, output_pdf, on_page=None):
+    """
+    Write png_paths, in order, as the pages of output_pdf (atomically, via
+    a temporary file); on_page gets (pages written, total) after each page
+    """
+    temp_path = output_pdf + ".tmp"
+    writer = PdfImageWriter(temp_path)
+    try:
+        for path in png_paths:
+            try:
+                writer.add_png(path)
+            except PngError as e:
+                raise PngError(f"{os.path.basename(path)}: {e}")
+            if on_page:
+                on_page(writer.page_count, len(png_paths))
+        writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+    os.replace(temp_path, output_pdf)
+    return writer.page_count
@@ -0,0 +1,234 @@
+# png_preflight.py - Check PNG pages and flatten their transparency in parallel before a merge
+import os
+import zlib
+import shutil
+import struct
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from png_pdf import PNG_SIGNATURE, PngError, PILLOW_AVAILABLE, read_chunks, parse_header, unfilter_rows, CHUNK_SIZE
+
+# Transparent areas are flattened onto the export background (Inkscape's page colour is white by default)
+DEFAULT_BACKGROUND = (255, 255, 255)
+COLOR_NAMES = {0: 'gray', 2: 'RGB', 3: 'palette', 4: 'gray+alpha', 6: 'RGBA'}
+# Fewer pages than this are checked in-process (starting a pool costs more)
+MIN_POOL_PAGES = 4
+
+def default_workers():
+    return max(1, min(8, os.cpu_count() or 2))
+
+def parse_background(color):
+    """(r, g, b) from a tuple or '#rrggbb'"""
+    if isinstance(color, str):
+        value = color.lstrip('#')
+        if len(value) != 6:
+            raise ValueError(f"background colour must be #rrggbb, not {color!r}")
+        return tuple(int(value[i:i + 2], 16) for i in (0, 2, 4))
+    return tuple(color)
+
+def background_name(color):
+    """'#rrggbb' of a background, e.g. as the page map variant of flattened pages"""
+    return '#' + ''.join(f"{value:02x}" for value in parse_background(color))
+
+def png_chunk(chunk_type, data):
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data))
+
+def blend(color, alpha, background):
+    return (color * alpha + background * (255 - alpha) + 127) // 255
+
+def flatten_palette(info, background):
+    """PLTE with the tRNS alpha of each entry blended in (no pixels to decode)"""
+    palette = bytearray(info.palette)
+    alphas = info.transparency or b''
+    for index, alpha in enumerate(alphas[:len(palette) // 3]):
+        for k in range(3):
+            palette[index * 3 + k] = blend(palette[index * 3 + k], alpha, background[k])
+    return bytes(palette)
+
+def flatten_row(row, info, background, gray):
+    """One decoded 8 or 16 bit row as 8-bit gray or RGB over background"""
+    sample = info.bit_depth // 8
+    # 16-bit samples keep their high byte
+    values = row[::sample] if sample > 1 else row
+    colors = 1 if info.color_type in (0, 4) else 3
+    step = colors + (1 if info.has_alpha else 0)
+    if info.has_alpha:
+        alphas = values[colors::step]
+    else:
+        # tRNS names one colour that is fully transparent
+        key = struct.unpack(f'>{colors}H', info.transparency[:colors * 2])
+        alphas = bytearray(info.width)
+        for x in range(info.width):
+            if sample > 1:
+                pixel = struct.unpack_from(f'>{colors}H', row, x * colors * 2)
+            else:
+                pixel = tuple(values[x * colors:x * colors + colors])
+            alphas[x] = 0 if pixel == key else 255
+    sources = [values[k::step] for k in range(colors)]
+    if colors == 1 and not gray:
+        sources *= 3
+    channels = [bytes(blend(c, a, background[k]) for c, a in zip(source, alphas))
+                for k, source in enumerate(sources)]
+    if gray:
+        return channels[0]
+    out = bytearray(info.width * 3)
+    for k in range(3):
+        out[k::3] = channels[k]
+    return bytes(out)
+
+def flatten_with_python(path, info, extra_chunks, background, out_path):
+    """Decode rows, blend and write an opaque 8-bit PNG, one row at a time"""
+    if info.interlace or info.bit_depth < 8:
+        raise PngError("interlaced or low bit depth transparency needs Pillow (pip install Pillow)")
+    gray = info.color_type in (0, 4) and background[0] == background[1] == background[2]
+    color_type = 0 if gray else 2
+
+    def idat_chunks():
+        with open(path, 'rb') as f:
+            for chunk_type, data in read_chunks(f):
+                if chunk_type == b'IDAT':
+                    yield data
+
+    compressor = zlib.compressobj(6)
+    with open(out_path, 'wb') as out:
+        out.write(PNG_SIGNATURE)
+        out.write(png_chunk(b'IHDR', struct.pack('>IIBBBBB', info.width, info.height, 8, color_type, 0, 0, 0)))
+        for chunk in extra_chunks:
+            out.write(chunk)
+        buffered = bytearray()
+        for row in unfilter_rows(idat_chunks(), info):
+            # Filter type 0 (none) for each row
+            buffered += compressor.compress(b'\x00' + flatten_row(row, info, background, gray))
+            if len(buffered) >= CHUNK_SIZE:
+                out.write(png_chunk(b'IDAT', bytes(buffered)))
+                buffered.clear()
+        buffered += compressor.flush()
+        out.write(png_chunk(b'IDAT', bytes(buffered)))
+        out.write(png_chunk(b'IEND', b''))
+
+def flatten_with_pillow(path, info, background, out_path):
+    from PIL import Image
+    with Image.open(path) as image:
+        image = image.convert('RGBA')
+    flat = Image.new('RGB', image.size, background)
+    flat.paste(image, mask=image.getchannel('A'))
+    if info.color_type in (0, 4) and background[0] == background[1] == background[2]:
+        flat = flat.convert('L')
+    flat.save(out_path, dpi=info.dpi or (96, 96), compress_level=6)
+
+def check_page(path, background, out_path):
+    """
+    Check one PNG and flatten it to out_path if it has transparency. Runs
+    in a worker process; returns (colour name, flattened, error message)
+    """
+    try:
+        info = None
+        image_data = 0
+        keep = []
+        with open(path, 'rb') as f:
+            for chunk_type, data in read_chunks(f):
+                if chunk_type == b'IDAT':
+                    image_data += len(data)
+                elif chunk_type != b'IEND':
+                    info = parse_header(chunk_type, data, info)
+                    if chunk_type == b'pHYs':
+                        keep.append(png_chunk(chunk_type, data))
+        if info is None:
+            raise PngError("no IHDR chunk")
+        if not image_data:
+            raise PngError("no image data")
+        name = COLOR_NAMES[info.color_type]
+        if not info.has_alpha and info.transparency is None:
+            return name, False, None
+
+        if info.color_type == 3:
+            # Rewrite the palette only; the pixel data is copied as it is
+            with open(path, 'rb') as f, open(out_path, 'wb') as out:
+                out.write(PNG_SIGNATURE)
+                for chunk_type, data in read_chunks(f):
+                    if chunk_type == b'PLTE':
+                        data = flatten_palette(info, background)
+                    if chunk_type != b'tRNS':
+                        out.write(png_chunk(chunk_type, data))
+        elif PILLOW_AVAILABLE:
+            flatten_with_pillow(path, info, background, out_path)
+        else:
+            flatten_with_python(path, info, keep, background, out_path)
+        return name, True, None
+    except (PngError, OSError, ValueError, zlib.error) as e:
+        try:
+            os.remove(out_path)
+        except OSError:
+            pass
+        return None, False, str(e)
+
+class PreflightResult:
+    """
+    Outcome of a preflight: pages (the paths to merge, flattened copies in
+    place of transparent pages), problems [(path, message)] and colour type
+    counts. cleanup() removes the flattened copies once merged.
+    """
+    def __init__(self, pages, problems, colors, flattened, unchanged, temp_dir):
+        self.pages = pages
+        self.problems = problems
+        self.colors = colors
+        self.flattened = flattened
+        self.unchanged = unchanged
+        self.temp_dir = temp_dir
+
+    @property
+    def ok(self):
+        return not self.problems
+
+    def summary(self):
+        colors = ', '.join(f"{count} {name}" for name, count in sorted(self.colors.items()))
+        colors = f" ({colors})" if colors else ""
+        unchanged = f", {self.unchanged} unchanged since the last merge" if self.unchanged else ""
+        return (f"{len(self.pages)} page(s){colors}, {self.flattened} flattened, "
+                f"{len(self.problems)} unreadable{unchanged}")
+
+    def cleanup(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+def preflight(png_paths, background=DEFAULT_BACKGROUND, workers=None, log=None, unchanged=()):
+    """
+    Check every page before a merge, in a process pool: chunk CRCs up to
+    IEND, colour type, and transparency flattened onto background. Only
+    transparent pages are rewritten (into a temporary folder); opaque ones
+    merge as they are. All problems are reported together, up front.
+    Pages in unchanged (already merged, see PageMap.unchanged) are passed
+    through unread: the merge keeps them without reading them either.
+    """
+    background = parse_background(background)
+    temp_dir = tempfile.mkdtemp(prefix='preflight_')
+    out_paths = [os.path.join(temp_dir, f"{index:05d}.png") for index in range(len(png_paths))]
+    checked = [index for index, path in enumerate(png_paths) if path not in unchanged]
+    paths = [png_paths[index] for index in checked]
+    outs = [out_paths[index] for index in checked]
+    backgrounds = [background] * len(paths)
+    if len(paths) < MIN_POOL_PAGES:
+        results = list(map(check_page, paths, backgrounds, outs))
+    else:
+        with ProcessPoolExecutor(max_workers=workers or default_workers()) as pool:
+            results = list(pool.map(check_page, paths, backgrounds, outs, chunksize=4))
+    results = dict(zip(checked, results))
+
+    pages, problems, colors, flattened = [], [], {}, 0
+    for index, (path, out_path) in enumerate(zip(png_paths, out_paths)):
+        if index not in results:
+            pages.append(path)
+            continue
+        name, was_flattened, error = results[index]
+        if error:
+            problems.append((path, error))
+            if log:
+                log(f"[ERROR] {os.path.basename(path)}: {error}")
+            continue
+        colors[name] = colors.get(name, 0) + 1
+        if was_flattened:
+            flattened += 1
+        pages.append(out_path if was_flattened else path)
+    result = PreflightResult(pages, problems, colors, flattened, len(png_paths) - len(paths), temp_dir)
+    if log:
+        log(f"[PREFLIGHT] {result.summary()}")
+    return result
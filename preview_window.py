@@ -0,0 +1,157 @@
+# preview_window.py - Page thumbnails of the SVG folder, refreshed as the layer rules change
+import os
+import tkinter as tk
+from tkinter import ttk
+
+from folder_scan import FolderScanner
+
+# Thumbnails are shrunk to at most this many pixels wide
+THUMBNAIL_WIDTH = 160
+# Wait this long after the last edit to the layer rules before refreshing
+REFRESH_DELAY_MS = 800
+
+class PreviewWindow:
+    """
+    A window listing the SVG files of the converter's folder with a small
+    preview of each page. Previews render on idle background workers and
+    come from the thumbnail cache when the file and its layer rules are
+    unchanged; editing the rules refreshes them.
+    """
+    def __init__(self, converter_tab):
+        self.tab = converter_tab
+        self.gui_app = converter_tab.gui_app
+        self.shared_vars = converter_tab.shared_vars
+        self.renderer = converter_tab.thumbnails()
+        self.scanner = FolderScanner()
+        self.rows = {}
+        # Tk drops images without a Python reference
+        self.images = {}
+        self.ready = 0
+        self.refresh_pending = None
+
+        self.window = tk.Toplevel(self.gui_app.root)
+        self.window.title("Page Previews")
+        self.window.geometry("560x700")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        header = ttk.Frame(self.window, padding="10 10 10 5")
+        header.pack(fill='x')
+        self.status_label = ttk.Label(header, text="")
+        self.status_label.pack(side='left')
+        ttk.Button(header, text="Refresh", command=self.refresh, width=10).pack(side='right')
+
+        body = ttk.Frame(self.window)
+        body.pack(fill='both', expand=True)
+        self.canvas = tk.Canvas(body, highlightthickness=0)
+        scrollbar = ttk.Scrollbar(body, orient='vertical', command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side='right', fill='y')
+        self.canvas.pack(side='left', fill='both', expand=True)
+        self.list_frame = ttk.Frame(self.canvas, padding=10)
+        self.canvas.create_window((0, 0), window=self.list_frame, anchor='nw')
+        self.list_frame.bind('<Configure>',
+                             lambda e: self.canvas.configure(scrollregion=self.canvas.bbox('all')))
+
+        # Rule changes (and a new folder) refresh the previews
+        self.traces = []
+        for name in ('svg_folder', 'layer_control_enabled', 'layer_control_mode', 'layer_csv_path'):
+            variable = self.shared_vars[name]
+            self.traces.append((variable, variable.trace_add('write', self.schedule_refresh)))
+        self.text_binding = self.tab.layer_text.bind('<KeyRelease>', self.schedule_refresh, add='+')
+
+        self.refresh()
+
+    def schedule_refresh(self, *args):
+        if self.refresh_pending:
+            self.window.after_cancel(self.refresh_pending)
+        self.refresh_pending = self.window.after(REFRESH_DELAY_MS, self.refresh)
+
+    def refresh(self):
+        """List the folder again and request previews with the current layer rules"""
+        self.refresh_pending = None
+        folder = self.shared_vars['svg_folder'].get()
+        if not folder or not os.path.isdir(folder):
+            self.show_files(folder, [], None)
+            self.status_label.config(text="Select an SVG folder to preview its pages")
+            return
+        self.status_label.config(text="Listing SVG files...")
+        events = self.gui_app.events
+        self.scanner.scan(folder, 'svg',
+                          on_done=lambda names, error: events.call(self.show_files, folder, names, error))
+
+    def show_files(self, folder, svg_files, error):
+        if error:
+            self.status_label.config(text=f"Could not read folder: {error}")
+            return
+        for row in self.rows.values():
+            row.destroy()
+        self.rows = {}
+        self.images = {}
+        self.ready = 0
+
+        layer_rules = self.tab.get_layer_control_data(quiet=True)
+        inkscape_path = self.shared_vars['inkscape_path'].get() or r"C:\Program Files\Inkscape\bin\inkscape.exe"
+        svg_paths = [os.path.join(folder, name) for name in sorted(svg_files)]
+        for svg_path in svg_paths:
+            self.rows[svg_path] = self.add_row(svg_path)
+
+        # Workers hash each file and render only what is not cached, in list order
+        events = self.gui_app.events
+        self.renderer.request(svg_paths, layer_rules, inkscape_path,
+                              lambda svg_path, pages, error: events.call(self.show_pages, svg_path, pages, error))
+        self.update_status()
+
+    def add_row(self, svg_path):
+        row = ttk.Frame(self.list_frame, padding=(0, 0, 0, 10))
+        row.pack(fill='x', anchor='w')
+        ttk.Label(row, text=os.path.basename(svg_path), font=('Arial', 9, 'bold')).pack(anchor='w')
+        row.pages = ttk.Frame(row)
+        row.pages.pack(anchor='w')
+        row.status = ttk.Label(row.pages, text="Rendering preview...", foreground='#6c757d')
+        row.status.pack(side='left')
+        return row
+
+    def show_pages(self, svg_path, pages, error):
+        row = self.rows.get(svg_path)
+        if row is None:
+            # From a list that has been refreshed since
+            return
+        self.ready += 1
+        if error or not pages:
+            row.status.config(text=f"⚠️ No preview: {error}", foreground='#dc3545')
+            self.update_status()
+            return
+        row.status.destroy()
+        images = []
+        for page in pages:
+            try:
+                image = tk.PhotoImage(file=page)
+            except tk.TclError:
+                continue
+            if image.width() > THUMBNAIL_WIDTH:
+                factor = -(-image.width() // THUMBNAIL_WIDTH)
+                image = image.subsample(factor, factor)
+            images.append(image)
+            tk.Label(row.pages, image=image, borderwidth=1, relief='solid').pack(side='left', padx=(0, 5))
+        self.images[svg_path] = images
+        self.update_status()
+
+    def update_status(self):
+        total = len(self.rows)
+        if not total:
+            self.status_label.config(text="No SVG files found")
+        elif self.ready < total:
+            self.status_label.config(text=f"Previews: {self.ready} of {total} ready")
+        else:
+            self.status_label.config(text=f"Previews: {total} file(s)")
+
+    def close(self):
+        self.scanner.cancel()
+        self.renderer.cancel()
+        if self.refresh_pending:
+            self.window.after_cancel(self.refresh_pending)
+        for variable, trace in self.traces:
+            variable.trace_remove('write', trace)
+        self.tab.layer_text.unbind('<KeyRelease>', self.text_binding)
+        self.tab.preview_window = None
+        self.window.destroy()
@@ -0,0 +1,102 @@
+# progress.py - Page-level progress of a batch, from engine events weighted by page count and cost
+import time
+import threading
+
+import telemetry
+
+# Events passed to an event_callback(event, info)
+FILE_STARTED = 'file_started'        # file, pages (expected), cost
+PAGE_STARTED = 'page_started'        # file, page
+PAGE_FINISHED = 'page_finished'      # file, page, path, bytes, duration
+FILE_FINISHED = 'file_finished'      # file, pages, duration, ok, cached
+MERGE_PROGRESS = 'merge_progress'    # pages_done, pages_total
+
+# A file is never shown as done before its file_finished event
+MAX_PARTIAL = 0.95
+
+class BatchProgress:
+    """
+    Progress of one batch at page granularity. Each file weighs its planned
+    cost, spread evenly over its expected pages, so the fraction moves as
+    pages finish instead of once per file. Reports keep the existing
+    callbacks: progress_callback(current, total, message) with files done
+    out of total files, eta_callback(seconds_left, fraction) with the
+    page-weighted fraction, and event_callback(event, info) with every
+    event. Events come from worker threads too; reports are serialised.
+    """
+    def __init__(self, eta, total_files, progress_callback=None, eta_callback=None, event_callback=None):
+        self.eta = eta
+        self.total_files = total_files
+        self.progress_callback = progress_callback
+        self.eta_callback = eta_callback
+        self.event_callback = event_callback
+        self.lock = threading.Lock()
+        self.files = {}
+        self.done = 0
+
+    def report(self, event, info, message):
+        if self.event_callback:
+            self.event_callback(event, info)
+        if event in (PAGE_FINISHED, FILE_FINISHED):
+            seconds_left, fraction = self.eta.remaining(), self.eta.fraction
+            telemetry.update_eta(seconds_left, fraction)
+            if self.eta_callback:
+                self.eta_callback(seconds_left, fraction)
+        if self.progress_callback and message:
+            self.progress_callback(self.done, self.total_files, message)
+
+    def file_started(self, svg_file, pages, cost):
+        with self.lock:
+            self.files[svg_file] = {'pages': max(1, pages), 'cost': cost, 'finished': 0, 'page_started': None}
+            self.report(FILE_STARTED, {'file': svg_file, 'pages': pages, 'cost': cost},
+                        f"Processing: {svg_file}")
+
+    def page_started(self, svg_file, page):
+        with self.lock:
+            state = self.files.get(svg_file)
+            if state is None:
+                return
+            state['page_started'] = time.time()
+            # Exporters probe one page past the last; the count is only an estimate
+            of_pages = f" of {state['pages']}" if page <= state['pages'] else ""
+            self.report(PAGE_STARTED, {'file': svg_file, 'page': page},
+                        f"Processing: {svg_file} (page {page}{of_pages})")
+
+    def page_finished(self, svg_file, page, path, size):
+        with self.lock:
+            state = self.files.get(svg_file)
+            if state is None:
+                return
+            duration = time.time() - state['page_started'] if state['page_started'] else None
+            state['finished'] += 1
+            # More pages than expected: the file keeps creeping towards done
+            done = min(MAX_PARTIAL, state['finished'] / state['pages'])
+            self.eta.advance(svg_file, state['cost'] * done)
+            self.report(PAGE_FINISHED, {'file': svg_file, 'page': page, 'path': path, 'bytes': size,
+                                        'duration': round(duration, 3) if duration is not None else None},
+                        f"Processing: {svg_file} (page {page} done)")
+
+    def file_finished(self, svg_file, done, cost, pages, duration, ok, cached=False):
+        """done: files finished so far, including skipped ones"""
+        with self.lock:
+            self.files.pop(svg_file, None)
+            self.done = done
+            self.eta.complete(cost, svg_file)
+            self.report(FILE_FINISHED, {'file': svg_file, 'pages': pages, 'duration': round(duration, 3),
+                                        'ok': ok, 'cached': cached},
+                        f"Finished: {svg_file}")
+
+    def merge_progress(self, pages_done, pages_total):
+        with self.lock:
+            # Pages are merged while files still render; the status line follows the renders until then
+            message = f"Merging: page {pages_done} of {pages_total}" if self.done >= self.total_files else None
+            self.report(MERGE_PROGRESS, {'pages_done': pages_done, 'pages_total': pages_total}, message)
+
+    def page_listener(self, svg_file):
+        """Listener for one file's page events on the worker thread (see telemetry.bind)"""
+        def on_event(event, info):
+            if event == PAGE_STARTED:
+                self.page_started(svg_file, info['page'])
+            elif event == PAGE_FINISHED:
+                self.page_finished(svg_file, info['page'], info['path'], info['bytes'])
+        return on_event
@@ -0,0 +1,362 @@
+# render_cache.py - Content-addressed render cache that several processes and hosts can share
+import os
+import json
+import time
+import uuid
+import shutil
+import socket
+import hashlib
+import threading
+
+import telemetry
+
+GB = 1024 ** 3
+
+DEFAULT_MAX_BYTES = 10 * GB
+# A lock whose file has not changed for this long belongs to a dead renderer
+DEFAULT_STALE_LOCK = 120.0
+LOCK_REFRESH_INTERVAL = 15.0
+# Evict down to this fraction of the cap, so eviction does not run on every publish
+EVICT_TARGET = 0.9
+
+META_FILENAME = "meta.json"
+
+def renderer_id(inkscape_path):
+    """Identity of the Inkscape binary: a different build may render differently"""
+    try:
+        stat = os.stat(inkscape_path)
+        return f"{os.path.basename(inkscape_path)}:{stat.st_size}:{int(stat.st_mtime)}"
+    except OSError:
+        return os.path.basename(inkscape_path or '')
+
+def applicable_layer_rules(layer_rules, svg_file):
+    """
+    The layer rules apply_layer_visibility uses for one file, merged: global
+    rules, overridden by rules keyed by the file name, then by the name
+    without its extension
+    """
+    merged = {}
+    if not layer_rules:
+        return merged
+    keys = ['global']
+    if svg_file:
+        keys += [svg_file, os.path.splitext(svg_file)[0]]
+    for key in keys:
+        if key in layer_rules:
+            merged.update(layer_rules[key])
+    return merged
+
+def render_key(source_sha256, svg_file, output_format, dpi, layer_rules, inkscape_path):
+    """Content address of a render: same input, settings and renderer give the same key"""
+    encoded = json.dumps({
+        'source': source_sha256,
+        'format': output_format,
+        'dpi': str(dpi),
+        'layers': applicable_layer_rules(layer_rules, svg_file),
+        'renderer': renderer_id(inkscape_path)
+    }, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+class CacheLock:
+    """
+    Advisory lock on one key: an O_EXCL lock file, which works across
+    processes and NFS clients. The holder touches it periodically; others
+    break it only when it has not changed for stale_after seconds on their
+    own clock.
+    """
+    def __init__(self, path, stale_after=DEFAULT_STALE_LOCK):
+        self.path = path
+        self.stale_after = stale_after
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def try_acquire(self):
+        try:
+            fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'host': socket.gethostname(), 'pid': os.getpid(), 'time': time.time()}, f)
+        self.thread = threading.Thread(target=self.refresh, daemon=True)
+        self.thread.start()
+        return True
+
+    def refresh(self):
+        while not self.stopped.wait(LOCK_REFRESH_INTERVAL):
+            try:
+                os.utime(self.path)
+            except OSError:
+                return
+
+    def release(self):
+        self.stopped.set()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def break_if_stale(self, observed):
+        """observed: {path: (signature, first seen)} kept by the waiter"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return True
+        signature = (stat.st_mtime_ns, stat.st_size)
+        now = time.time()
+        seen = observed.get(self.path)
+        if not seen or seen[0] != signature:
+            observed[self.path] = (signature, now)
+            return False
+        if now - seen[1] < self.stale_after:
+            return False
+        # Move the stale lock aside atomically, so only one waiter breaks it
+        stale = f"{self.path}.stale.{uuid.uuid4().hex[:8]}"
+        try:
+            os.rename(self.path, stale)
+            os.remove(stale)
+        except FileNotFoundError:
+            pass
+        return True
+
+class RenderCache:
+    """
+    Rendered pages stored by content address under a shared directory:
+
+        objects/<ab>/<key>/p1.png, p2.png, ..., meta.json
+        locks/<key>.lock
+        tmp/                 entries being written (published by rename)
+        trash/               evicted entries being deleted
+
+    An entry becomes visible only when its complete directory is renamed
+    into place, so readers never see a partial render. A key is rendered by
+    at most one worker at a time; the others wait and then reuse the result.
+    What killed processes leave in locks/, tmp/ and trash/ is deleted when
+    the cache is opened and on eviction.
+    """
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES, stale_after=DEFAULT_STALE_LOCK, log=None):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = max_bytes
+        self.stale_after = stale_after
+        self.log = log
+        for name in ('objects', 'locks', 'tmp', 'trash'):
+            os.makedirs(os.path.join(self.cache_dir, name), exist_ok=True)
+        self.evicting = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.remove_leftovers()
+
+    def remove_leftovers(self):
+        """
+        Delete broken locks, and tmp/ and trash/ entries untouched for
+        stale_after seconds (their writer or deleter died)
+        """
+        cutoff = time.time() - self.stale_after
+        removed = 0
+        for name in ('locks', 'tmp', 'trash'):
+            try:
+                entries = list(os.scandir(os.path.join(self.cache_dir, name)))
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    if name == 'locks':
+                        if '.stale.' not in entry.name:
+                            continue
+                    elif entry.stat(follow_symlinks=False).st_mtime > cutoff:
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        shutil.rmtree(entry.path)
+                    else:
+                        os.remove(entry.path)
+                    removed += 1
+                except OSError:
+                    # Gone already, or still in use
+                    continue
+        if self.log and removed:
+            self.log(f"[CACHE] Removed {removed} leftover lock and temporary entries")
+        return removed
+
+    def entry_dir(self, key):
+        return os.path.join(self.cache_dir, 'objects', key[:2], key)
+
+    def lookup(self, key):
+        """Page files of a cached render (in page order), or None"""
+        entry = self.entry_dir(key)
+        try:
+            with open(os.path.join(entry, META_FILENAME), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            pages = [os.path.join(entry, name) for name in meta['pages']]
+            if not all(os.path.exists(path) for path in pages):
+                return None
+            # Directory mtime is the LRU clock
+            os.utime(entry)
+            return pages
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def copy_out(self, pages, targets):
+        """Copy cached pages to their output paths; False if the entry vanished (evicted)"""
+        try:
+            for source, target in zip(pages, targets):
+                temp_target = f"{target}.{uuid.uuid4().hex[:8]}.tmp"
+                shutil.copyfile(source, temp_target)
+                os.replace(temp_target, target)
+            return True
+        except OSError:
+            return False
+
+    def publish(self, key, files):
+        """Store rendered pages under key (first publisher wins)"""
+        if os.path.isdir(self.entry_dir(key)):
+            return
+        staging = os.path.join(self.cache_dir, 'tmp', f"{key}.{uuid.uuid4().hex[:8]}")
+        os.makedirs(staging)
+        names = []
+        size = 0
+        for page_num, path in enumerate(files, 1):
+            name = f"p{page_num}{os.path.splitext(path)[1]}"
+            shutil.copyfile(path, os.path.join(staging, name))
+            names.append(name)
+            size += os.path.getsize(path)
+        with open(os.path.join(staging, META_FILENAME), 'w', encoding='utf-8') as f:
+            json.dump({'key': key, 'pages': names, 'bytes': size, 'created': time.time(),
+                       'host': socket.gethostname()}, f)
+        os.makedirs(os.path.dirname(self.entry_dir(key)), exist_ok=True)
+        try:
+            os.rename(staging, self.entry_dir(key))
+        except OSError:
+            # Someone published the same key first
+            shutil.rmtree(staging, ignore_errors=True)
+            return
+        self.evict_in_background()
+
+    def get_or_render(self, key, targets_for, render, poll_interval=0.5):
+        """
+        Return (pages, cached): copy a cached render to targets_for(page_count),
+        or call render() -> list of written page paths (empty on failure) and
+        publish its result. Two callers never render the same key at once.
+        """
+        lock = CacheLock(os.path.join(self.cache_dir, 'locks', f"{key}.lock"), self.stale_after)
+        observed = {}
+        while True:
+            pages = self.lookup(key)
+            if pages:
+                telemetry.state('writing')
+                targets = targets_for(len(pages))
+                if self.copy_out(pages, targets):
+                    self.hits += 1
+                    telemetry.cache_result(True)
+                    return targets, True
+            if lock.try_acquire():
+                break
+            # Someone else is rendering this key: wait for their result
+            lock.break_if_stale(observed)
+            time.sleep(poll_interval)
+
+        try:
+            # Published between our lookup and taking the lock?
+            pages = self.lookup(key)
+            if pages:
+                telemetry.state('writing')
+                targets = targets_for(len(pages))
+                if self.copy_out(pages, targets):
+                    self.hits += 1
+                    telemetry.cache_result(True)
+                    return targets, True
+            self.misses += 1
+            telemetry.cache_result(False)
+            telemetry.state('rendering')
+            files = render()
+            if files:
+                telemetry.state('writing')
+                try:
+                    self.publish(key, files)
+                except OSError as e:
+                    if self.log:
+                        self.log(f"[CACHE] Could not publish render: {e}")
+            return files, False
+        finally:
+            lock.release()
+
+    def evict_in_background(self):
+        if self.max_bytes and self.evicting.acquire(blocking=False):
+            thread = threading.Thread(target=self.evict, daemon=True)
+            thread.start()
+
+    def evict(self):
+        """Delete least recently used entries until the cache is under EVICT_TARGET x max_bytes"""
+        lock = CacheLock(os.path.join(self.cache_dir, 'locks', "evict.lock"), self.stale_after)
+        try:
+            if not lock.try_acquire():
+                # Another process or host is evicting
+                return
+            try:
+                self.remove_leftovers()
+                entries = []
+                total = 0
+                objects = os.path.join(self.cache_dir, 'objects')
+                for prefix in os.scandir(objects):
+                    if not prefix.is_dir():
+                        continue
+                    for entry in os.scandir(prefix.path):
+                        size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+                        entries.append((entry.stat().st_mtime, entry.path, size))
+                        total += size
+                if total <= self.max_bytes:
+                    return
+                freed = 0
+                for mtime, path, size in sorted(entries):
+                    if total - freed <= self.max_bytes * EVICT_TARGET:
+                        break
+                    # Rename first so readers see a miss, never a half-deleted entry
+                    trash = os.path.join(self.cache_dir, 'trash', uuid.uuid4().hex)
+                    try:
+                        os.rename(path, trash)
+                    except OSError:
+                        continue
+                    shutil.rmtree(trash, ignore_errors=True)
+                    freed += size
+                if self.log and freed:
+                    self.log(f"[CACHE] Evicted {freed / (1024 ** 2):.1f} MB to stay under "
+                             f"{self.max_bytes / GB:.1f} GB")
+            finally:
+                lock.release()
+        except OSError:
+            pass
+        finally:
+            self.evicting.release()
+
+def cache_from_environment(cache_dir=None, max_bytes=None, log=None):
+    """RenderCache from explicit settings or INKSCAPE_EXPORTER_CACHE[_GB], or None"""
+    cache_dir = cache_dir or os.environ.get('INKSCAPE_EXPORTER_CACHE')
+    if not cache_dir:
+        return None
+    if max_bytes is None and os.environ.get('INKSCAPE_EXPORTER_CACHE_GB'):
+        max_bytes = int(float(os.environ['INKSCAPE_EXPORTER_CACHE_GB']) * GB)
+    return RenderCache(cache_dir, max_bytes or DEFAULT_MAX_BYTES, log=log)
+
+def page_paths(output_pattern, count):
+    """Output paths of pages 1..count, named as the converters name them"""
+    base, extension = os.path.splitext(output_pattern)
+    return [output_pattern if n == 1 else f"{base}_p{n}{extension}" for n in range(1, count + 1)]
+
+def cached_render(cache, key, output_pattern, render, kind="PNG"):
+    """Run render() (returning a ConversionResult) through the cache"""
+    from inkscape_runner import ConversionResult
+    output_dir = os.path.dirname(output_pattern)
+    os.makedirs(output_dir, exist_ok=True)
+    rendered = {}
+
+    def render_pages():
+        result = rendered['result'] = render()
+        if result.returncode != 0:
+            # Failed or incomplete renders are never cached
+            return []
+        return [os.path.join(output_dir, name) for name in result.files_created]
+
+    files, cached = cache.get_or_render(key, lambda count: page_paths(output_pattern, count), render_pages)
+    if not cached:
+        return rendered['result']
+    result = ConversionResult([os.path.basename(path) for path in files], kind=kind)
+    result.cached = True
+    return result
@@ -0,0 +1,190 @@
+# run_log.py - Logging for conversion runs: one logger per run, workers never wait on the UI or disk
+import os
+import queue
+import logging
+import threading
+import logging.handlers
+
+# Between DEBUG and INFO: per-layer and per-page chatter, hidden at the default level
+DETAIL = 15
+logging.addLevelName(DETAIL, 'DETAIL')
+
+LEVELS = {
+    'debug': logging.DEBUG,
+    'detail': DETAIL,
+    'info': logging.INFO,
+    'warning': logging.WARNING,
+    'error': logging.ERROR
+}
+
+# Rotating log files: up to 5 MB each, 3 old files kept
+LOG_FILE_BYTES = 5 * 1024 * 1024
+LOG_FILE_BACKUPS = 3
+LOG_FILE_FORMAT = '%(asctime)s %(levelname)-7s %(message)s'
+
+# Messages are plain strings; their tag gives the level
+LEVEL_TAGS = [
+    ('[ERROR]', logging.ERROR),
+    ('❌', logging.ERROR),
+    ('[WARNING]', logging.WARNING),
+    ('⚠️', logging.WARNING),
+    ('Warning:', logging.WARNING)
+]
+
+# Console replacements for Windows code pages without emoji
+CONSOLE_REPLACEMENTS = {
+    '📁': '[FOLDER]',
+    '🎯': '[TARGET]',
+    '📊': '[STATS]',
+    '✅': '[OK]',
+    '❌': '[ERROR]',
+    '⚠️': '[WARNING]',
+    '📂': '[FOLDER]',
+    '→': '->',
+    '🖼️': '[IMAGE]',
+    '📄': '[PDF]',
+    '🔍': '[DETECT]',
+    '🔗': '[MERGE]'
+}
+
+# Logger of the run the current thread works for (see bind)
+CONTEXT = threading.local()
+
+def parse_level(value, default=logging.INFO):
+    """Level from a name (debug, detail, info, warning, error) or number"""
+    if value is None or value == '':
+        return default
+    if isinstance(value, int):
+        return value
+    value = str(value).strip().lower()
+    if value.isdigit():
+        return int(value)
+    if value not in LEVELS:
+        raise ValueError(f"Unknown log level: {value} (use {', '.join(LEVELS)})")
+    return LEVELS[value]
+
+def level_of(message):
+    stripped = str(message).lstrip()
+    for tag, level in LEVEL_TAGS:
+        if stripped.startswith(tag):
+            return level
+    return logging.INFO
+
+def console_log(message):
+    """Print a message, replacing what the console cannot show"""
+    for unicode_char, ascii_char in CONSOLE_REPLACEMENTS.items():
+        message = message.replace(unicode_char, ascii_char)
+    try:
+        print(message)
+    except UnicodeEncodeError:
+        print(message.encode('ascii', 'ignore').decode('ascii'))
+
+class CallbackHandler(logging.Handler):
+    """Hands each message to a plain log callback (GUI, console, daemon events)"""
+    def __init__(self, callback):
+        super().__init__()
+        self.callback = callback
+
+    def emit(self, record):
+        try:
+            self.callback(record.getMessage())
+        except Exception:
+            self.handleError(record)
+
+class RunLogger:
+    """
+    Logging for one run. Called like the plain log callbacks it wraps
+    (log(message), level taken from the [ERROR]/[WARNING] tags); detail()
+    is for chatty lines such as per-layer rules. Messages go onto a queue
+    and one listener thread hands them to the callback and the optional
+    rotating log file, so workers never wait on either. child(prefix)
+    shares the queue, e.g. one per job of a batch.
+    """
+    def __init__(self, callback=None, level=logging.INFO, log_file=None, prefix='', parent=None):
+        self.prefix = prefix
+        self.parent = parent
+        if parent:
+            self.level = parent.level
+            self.queue = parent.queue
+            self.handlers = parent.handlers
+            self.listener = None
+            return
+
+        self.level = parse_level(level)
+        self.queue = queue.Queue()
+        self.handlers = [CallbackHandler(callback or console_log)]
+        if log_file:
+            os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+            file_handler = logging.handlers.RotatingFileHandler(
+                log_file, maxBytes=LOG_FILE_BYTES, backupCount=LOG_FILE_BACKUPS, encoding='utf-8')
+            file_handler.setFormatter(logging.Formatter(LOG_FILE_FORMAT))
+            self.handlers.append(file_handler)
+        self.listener = logging.handlers.QueueListener(self.queue, *self.handlers)
+        self.listener.start()
+        self.closed = False
+
+    @classmethod
+    def wrap(cls, log_callback, level=None, log_file=None):
+        """
+        Logger for one batch: a new one around a plain callback, or a child
+        of log_callback if it already is a RunLogger (closing the child
+        leaves the shared logger open). The caller closes it.
+        """
+        if isinstance(log_callback, RunLogger):
+            return log_callback.child('')
+        return cls(log_callback, parse_level(level), log_file)
+
+    def child(self, prefix):
+        return RunLogger(prefix=self.prefix + prefix, parent=self)
+
+    @property
+    def root(self):
+        return self.parent.root if self.parent else self
+
+    def __call__(self, message, level=None):
+        level = level if level is not None else level_of(message)
+        if level < self.level:
+            return
+        message = str(message)
+        if self.prefix:
+            message = '\n'.join(self.prefix + line if line else '' for line in message.split('\n'))
+        record = logging.makeLogRecord({'msg': message, 'levelno': level,
+                                        'levelname': logging.getLevelName(level)})
+        if self.root.closed:
+            # Late messages (after the run) are written directly
+            for handler in self.handlers:
+                handler.handle(record)
+        else:
+            self.queue.put(record)
+
+    def detail(self, message):
+        self(message, DETAIL)
+
+    def flush(self):
+        """Wait until every queued message has been written"""
+        self.queue.join()
+
+    def close(self):
+        """Write the remaining messages and stop the listener (children: no-op)"""
+        if self.parent or self.closed:
+            return
+        self.listener.stop()
+        self.closed = True
+        for handler in self.handlers:
+            handler.close()
+
+def bind(log):
+    """Make log the logger of the current thread's run (None to unbind)"""
+    CONTEXT.log = log
+
+def current():
+    """Logger of the current thread's run; prints to the console outside a run"""
+    return getattr(CONTEXT, 'log', None) or console_log
+
+def detail(message):
+    """Log a chatty line to the current run (hidden at the default level)"""
+    log = current()
+    if isinstance(log, RunLogger):
+        log.detail(message)
+    else:
+        log(message)
@@ -0,0 +1,472 @@
+# scheduler.py - Memory-aware, adaptive worker pool for Inkscape render jobs
+import os
+import sys
+import time
+import queue
+import threading
+from collections import deque
+from itertools import count, islice
+
+import run_log
+import telemetry
+import inkscape_runner
+from svg_stats import megapixels, render_dpi
+
+# psutil is optional: it gives exact RSS on every platform
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+MB = 1024 * 1024
+GB = 1024 * MB
+
+# Rough Inkscape memory model (bytes)
+INKSCAPE_BASE_MEMORY = 300 * MB
+DOM_BYTES_PER_SVG_BYTE = 15
+RASTER_DECODE_FACTOR = 8
+PNG_SURFACE_FACTOR = 3 * 4      # RGBA surface plus encoder and copy buffers
+PDF_SURFACE_FACTOR = 4          # One RGBA surface when rasterising filters/images
+
+# Used when the machine's memory cannot be determined
+DEFAULT_MEMORY_BUDGET = 4 * GB
+
+# Relative render cost of embedded/linked rasters (per MB of payload)
+RASTER_COST_PER_MB = 1.0
+
+def estimate_job_memory(stats, dpi, output_format='png'):
+    """Estimated peak Inkscape memory for one file, from page size x DPI and rasters"""
+    pixels = megapixels(stats, dpi) * 1e6
+    if output_format == 'png':
+        surface = pixels * PNG_SURFACE_FACTOR
+    elif stats.get('raster_bytes') or stats.get('image_count'):
+        surface = pixels * PDF_SURFACE_FACTOR
+    else:
+        surface = 0
+    raster = stats.get('raster_bytes', 0) * RASTER_DECODE_FACTOR
+    dom = stats.get('bytes', 0) * DOM_BYTES_PER_SVG_BYTE
+    return int(INKSCAPE_BASE_MEMORY + surface + raster + dom)
+
+def estimate_job_cost(stats, dpi, output_format='png'):
+    """Relative render cost of one file: pages x pixel area x raster payload"""
+    raster_mb = stats.get('raster_bytes', 0) / MB
+    return stats['pages'] * megapixels(stats, render_dpi(stats, dpi, output_format)) * (1.0 + RASTER_COST_PER_MB * raster_mb)
+
+def calibrate_costs(jobs):
+    """
+    Put cost estimates on one scale: jobs with a past duration (seconds) use
+    it, the others get their heuristic cost scaled by the observed
+    seconds-per-cost ratio of the timed jobs.
+    """
+    timed = [job for job in jobs if job.past_duration]
+    heuristic_total = sum(job.cost_estimate for job in timed)
+    if not timed or not heuristic_total:
+        return
+    ratio = sum(job.past_duration for job in timed) / heuristic_total
+    for job in jobs:
+        job.cost_estimate = job.past_duration or job.cost_estimate * ratio
+
+def longest_first(jobs):
+    """Jobs sorted by estimated cost, most expensive first (stable for ties)"""
+    return sorted(jobs, key=lambda job: -job.cost_estimate)
+
+def system_memory():
+    """Return (total, available) physical memory in bytes, or (None, None)"""
+    if psutil:
+        vm = psutil.virtual_memory()
+        return vm.total, vm.available
+
+    if sys.platform.startswith('linux'):
+        try:
+            values = {}
+            with open('/proc/meminfo', 'r') as f:
+                for line in f:
+                    key, value = line.split(':', 1)
+                    values[key] = int(value.split()[0]) * 1024
+            return values.get('MemTotal'), values.get('MemAvailable', values.get('MemFree'))
+        except (OSError, ValueError):
+            return None, None
+
+    if sys.platform == 'win32':
+        try:
+            import ctypes
+
+            class MEMORYSTATUSEX(ctypes.Structure):
+                _fields_ = [('dwLength', ctypes.c_ulong), ('dwMemoryLoad', ctypes.c_ulong),
+                            ('ullTotalPhys', ctypes.c_ulonglong), ('ullAvailPhys', ctypes.c_ulonglong),
+                            ('ullTotalPageFile', ctypes.c_ulonglong), ('ullAvailPageFile', ctypes.c_ulonglong),
+                            ('ullTotalVirtual', ctypes.c_ulonglong), ('ullAvailVirtual', ctypes.c_ulonglong),
+                            ('ullAvailExtendedVirtual', ctypes.c_ulonglong)]
+
+            status = MEMORYSTATUSEX()
+            status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+            ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status))
+            return status.ullTotalPhys, status.ullAvailPhys
+        except Exception:
+            return None, None
+
+    return None, None
+
+def linux_process_table():
+    """{pid: (ppid, rss_bytes)} for every process, read from /proc"""
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    table = {}
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat', 'r') as f:
+                # The command name may contain spaces; fields resume after ')'
+                fields = f.read().rsplit(')', 1)[1].split()
+            table[int(name)] = (int(fields[1]), int(fields[21]) * page_size)
+        except (OSError, IndexError, ValueError):
+            continue
+    return table
+
+def process_tree_rss(pids):
+    """{pid: RSS of pid plus all its descendants} for the given root pids"""
+    result = {}
+    if psutil:
+        for pid in pids:
+            try:
+                proc = psutil.Process(pid)
+                procs = [proc] + proc.children(recursive=True)
+                result[pid] = sum(p.memory_info().rss for p in procs if p.is_running())
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                result[pid] = 0
+        return result
+
+    if sys.platform.startswith('linux'):
+        table = linux_process_table()
+        children = {}
+        for pid, (ppid, _) in table.items():
+            children.setdefault(ppid, []).append(pid)
+        for root in pids:
+            total = 0
+            stack = [root]
+            while stack:
+                pid = stack.pop()
+                if pid in table:
+                    total += table[pid][1]
+                stack.extend(children.get(pid, []))
+            result[root] = total
+        return result
+
+    # No way to measure: rely on estimates alone
+    return {}
+
+def job_label(job):
+    """File name of a job for status displays (keys end with the source path)"""
+    key = job.key[-1] if isinstance(job.key, tuple) else job.key
+    return os.path.basename(str(key))
+
+# Job ids: keys can repeat (the same SVG queued twice into one folder)
+JOB_IDS = count(1)
+
+class RenderJob:
+    """
+    One unit of work for the scheduler (normally one SVG file). prepare, if
+    given, is cheap CPU work (e.g. rewriting layers) that the scheduler
+    runs ahead of time on a staging thread, overlapping earlier renders.
+    on_event, if set, gets the job's page events (event, info) on its
+    worker thread.
+    """
+    def __init__(self, key, run, memory_estimate=0, cost_estimate=1.0, on_start=None, on_done=None,
+                 past_duration=None, log=None, prepare=None):
+        self.key = key
+        self.id = next(JOB_IDS)
+        self.run = run
+        self.prepare = prepare
+        self.prepare_lock = threading.Lock()
+        self.prepared = False
+        self.prepare_error = None
+        self.memory_estimate = memory_estimate
+        self.cost_estimate = cost_estimate
+        self.past_duration = past_duration
+        self.log = log
+        self.on_start = on_start
+        self.on_done = on_done
+        self.result = None
+        self.error = None
+        self.started = None
+        self.finished = None
+        self.slot = 0
+        self.peak_rss = 0
+        self.on_event = None
+
+    def stage(self):
+        """Run prepare once, on the staging thread or the worker, whichever gets here first"""
+        with self.prepare_lock:
+            if not self.prepared:
+                self.prepared = True
+                if self.prepare:
+                    try:
+                        self.prepare()
+                    except Exception as e:
+                        self.prepare_error = e
+        if self.prepare_error is not None:
+            raise self.prepare_error
+
+class BatchPlan:
+    """
+    A prepared batch: its render jobs, plus what to do right before they are
+    scheduled (begin) and once all of them have finished (finish)
+    """
+    def __init__(self, name, jobs, log, begin=None, finish=None, manifest=None):
+        self.name = name
+        self.jobs = jobs
+        self.log = log
+        self.begin = begin
+        self.finish = finish
+        self.manifest = manifest
+
+def run_plans(plans, scheduler):
+    """
+    Run the jobs of several batches on one scheduler, interleaved by cost so
+    every core stays busy; returns each plan's finish() result in order
+    """
+    jobs = []
+    for plan in plans:
+        if plan.begin:
+            plan.begin(scheduler)
+        for job in plan.jobs:
+            job.log = job.log or plan.log
+        jobs.extend(plan.jobs)
+
+    if jobs and scheduler.log:
+        scheduler.log(f"[SCHEDULER] {len(jobs)} file(s) to render, up to {scheduler.max_workers} workers, "
+                      f"memory budget {scheduler.memory_budget / GB:.1f} GB")
+    scheduler.run(jobs)
+    if scheduler.peak_rss and scheduler.log:
+        scheduler.log(f"[SCHEDULER] Peak Inkscape memory: {scheduler.peak_rss / MB:.0f} MB")
+
+    return [plan.finish(scheduler) if plan.finish else False for plan in plans]
+
+class MemoryAwareScheduler:
+    """
+    Runs render jobs on worker threads. A job is only admitted when its
+    estimated peak memory fits in the remaining RAM budget. While the batch
+    runs, the actual RSS of every Inkscape process tree is sampled: the
+    estimates are corrected from what was observed, and the worker limit is
+    lowered under memory pressure and raised again when there is headroom.
+    With longest_first=True the most expensive jobs start first, so a big
+    sheet does not run alone at the end of the batch. The prepare step of
+    the next prefetch jobs in line runs on a staging thread meanwhile.
+    on_start/on_done callbacks run on the calling thread; workers log
+    straight to their job's log (run_log.current()), which queues.
+    telemetry (RunTelemetry), if given, receives worker states, queue
+    depth, memory samples and finished files, on every thread of the run.
+    shell_pool (inkscape_shell.ShellPool), if given, runs the exports of
+    every job in warm Inkscape shells.
+    """
+    def __init__(self, max_workers=None, memory_budget=None, min_workers=1,
+                 poll_interval=0.5, log=None, longest_first=True, prefetch=2, telemetry=None,
+                 shell_pool=None):
+        self.max_workers = max(1, max_workers or os.cpu_count() or 1)
+        self.min_workers = max(1, min(min_workers, self.max_workers))
+        total, available = system_memory()
+        if memory_budget is None:
+            memory_budget = int(available * 0.75) if available else DEFAULT_MEMORY_BUDGET
+        self.memory_budget = memory_budget
+        self.system_total = total
+        self.poll_interval = poll_interval
+        self.log = log
+        self.longest_first = longest_first
+        self.prefetch = prefetch
+        self.staging = queue.Queue()
+        self.worker_limit = self.max_workers
+        self.correction = 1.0
+        self.peak_rss = 0
+        self.completed = queue.Queue()
+        self.telemetry = telemetry
+        self.shell_pool = shell_pool
+
+    def reserved_for(self, job):
+        return max(job.memory_estimate * self.correction, job.peak_rss)
+
+    def can_admit(self, job, running):
+        if len(running) >= self.worker_limit:
+            return False
+        if not running:
+            # Always make progress, even if a single job exceeds the budget
+            return True
+        reserved = sum(self.reserved_for(other) for other in running.values())
+        return reserved + self.reserved_for(job) <= self.memory_budget
+
+    def stage_jobs(self):
+        """Staging thread: prepare jobs queued by stage_ahead until None arrives"""
+        while True:
+            job = self.staging.get()
+            if job is None:
+                return
+            inkscape_runner.JOB_CONTEXT.key = job.id
+            run_log.bind(job.log)
+            try:
+                job.stage()
+            except Exception:
+                # Raised again on the worker, where it fails the job
+                pass
+            finally:
+                inkscape_runner.JOB_CONTEXT.key = None
+                run_log.bind(None)
+
+    def stage_ahead(self, pending):
+        """Queue the next jobs in line for preparation (a bounded lookahead)"""
+        for job in islice(pending, self.prefetch):
+            if job.prepare and not getattr(job, 'staging_queued', False):
+                job.staging_queued = True
+                self.staging.put(job)
+
+    def worker(self, job):
+        inkscape_runner.JOB_CONTEXT.key = job.id
+        inkscape_runner.JOB_CONTEXT.slot = job.slot
+        inkscape_runner.JOB_CONTEXT.slots = self.max_workers
+        inkscape_runner.JOB_CONTEXT.shell_pool = self.shell_pool
+        run_log.bind(job.log)
+        telemetry.bind(self.telemetry, job.slot, job.on_event)
+        try:
+            telemetry.state('parsing', job_label(job))
+            job.stage()
+            telemetry.state('rendering')
+            job.result = job.run()
+        except Exception as e:
+            job.error = e
+        finally:
+            telemetry.state('idle')
+            telemetry.bind(None)
+            inkscape_runner.JOB_CONTEXT.key = None
+            run_log.bind(None)
+            job.finished = time.time()
+            self.completed.put(job)
+
+    def start(self, job, running):
+        job.started = time.time()
+        # Lowest free worker slot (used to give each worker its own CPUs)
+        taken = {other.slot for other in running.values()}
+        job.slot = next(slot for slot in range(len(running) + 1) if slot not in taken)
+        running[job.id] = job
+        if job.on_start:
+            job.on_start(job)
+        thread = threading.Thread(target=self.worker, args=(job,), daemon=True)
+        thread.start()
+
+    def finish(self, job, running):
+        running.pop(job.id, None)
+        # Learn how far off the estimates are (only from measured jobs)
+        if job.peak_rss and job.memory_estimate:
+            ratio = job.peak_rss / job.memory_estimate
+            self.correction = 0.7 * self.correction + 0.3 * max(0.25, min(4.0, ratio))
+        if self.telemetry:
+            self.telemetry.file_done()
+        if job.on_done:
+            job.on_done(job)
+
+    def sample_memory(self, running, pending_count):
+        """Update per-job peak RSS and adapt the worker limit"""
+        with inkscape_runner.ACTIVE_PROCESSES_LOCK:
+            active = dict(inkscape_runner.ACTIVE_PROCESSES)
+        if not active:
+            if self.telemetry:
+                self.telemetry.memory(0)
+            return
+
+        rss_by_pid = process_tree_rss(list(active))
+        if not rss_by_pid:
+            return
+
+        per_job = {}
+        for pid, job_id in active.items():
+            per_job[job_id] = per_job.get(job_id, 0) + rss_by_pid.get(pid, 0)
+        for job_id, rss in per_job.items():
+            job = running.get(job_id)
+            if job:
+                job.peak_rss = max(job.peak_rss, rss)
+
+        total_rss = sum(per_job.values())
+        self.peak_rss = max(self.peak_rss, total_rss)
+        if self.telemetry:
+            self.telemetry.memory(total_rss)
+        _, available = system_memory()
+
+        # Scale down under pressure: our children near the budget, or the machine low on RAM
+        low_memory = available is not None and self.system_total and available < 0.1 * self.system_total
+        if (total_rss > 0.9 * self.memory_budget or low_memory) and self.worker_limit > self.min_workers:
+            self.worker_limit = max(self.min_workers, min(self.worker_limit, len(running)) - 1)
+            if self.log:
+                self.log(f"[SCHEDULER] Memory pressure ({total_rss / GB:.1f} GB in use, "
+                         f"budget {self.memory_budget / GB:.1f} GB): workers -> {self.worker_limit}")
+        # Scale back up once there is clear headroom
+        elif total_rss < 0.6 * self.memory_budget and self.worker_limit < self.max_workers \
+                and pending_count and len(running) >= self.worker_limit and not low_memory:
+            self.worker_limit += 1
+            if self.log:
+                self.log(f"[SCHEDULER] Memory headroom ({total_rss / GB:.1f} GB in use): "
+                         f"workers -> {self.worker_limit}")
+
+    def wake(self):
+        """Make a waiting run() look for new work now (from any thread)"""
+        self.completed.put(None)
+
+    def run(self, jobs, refill=None):
+        """
+        Run all jobs; returns them (with result/error set) in submission
+        order. Costs are calibrated once, when the batch is planned.
+        refill, if given, keeps the run going: it is called with the number
+        of free worker slots and returns more jobs to run after these (or an
+        empty list), until it returns None. Slots are refilled as soon as a
+        job finishes, so no job waits for the slowest of an earlier group;
+        jobs from refill report through on_done and are not returned.
+        """
+        if self.longest_first:
+            pending = deque(longest_first(jobs))
+        else:
+            pending = deque(jobs)
+        running = {}
+        last_sample = 0
+        stager = None
+        if self.prefetch and (refill or any(job.prepare for job in jobs)):
+            stager = threading.Thread(target=self.stage_jobs, daemon=True)
+            stager.start()
+        # on_start/on_done callbacks (on this thread) report to the run's telemetry too
+        telemetry.bind(self.telemetry)
+        if self.telemetry:
+            self.telemetry.begin(self.max_workers, len(jobs))
+
+        while pending or running or refill:
+            if refill:
+                more = refill(max(0, self.worker_limit - len(running) - len(pending)))
+                if more is None:
+                    refill = None
+                else:
+                    pending.extend(more)
+            # Admit as many jobs as the worker limit and memory budget allow
+            while pending and self.can_admit(pending[0], running):
+                self.start(pending.popleft(), running)
+            if stager:
+                self.stage_ahead(pending)
+            if self.telemetry:
+                self.telemetry.queue_depth(len(pending), len(running), self.worker_limit)
+
+            try:
+                job = self.completed.get(timeout=self.poll_interval)
+            except queue.Empty:
+                job = None
+
+            while job is not None:
+                self.finish(job, running)
+                try:
+                    job = self.completed.get_nowait()
+                except queue.Empty:
+                    job = None
+
+            if time.time() - last_sample >= self.poll_interval:
+                self.sample_memory(running, len(pending))
+                last_sample = time.time()
+
+        if stager:
+            self.staging.put(None)
+        if self.telemetry:
+            self.telemetry.queue_depth(0, 0, self.worker_limit)
+            self.telemetry.finish()
+        telemetry.bind(None)
+        return list(jobs)
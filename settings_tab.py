@@ -1,6 +1,7 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-import subprocess
+
+from inkscape_probe import probe_inkscape
 
 class SettingsTab:
     def __init__(self, parent, shared_vars, gui_app):
@@ -94,13 +95,16 @@ Requirements:
             self.shared_vars['inkscape_path'].set(file)
     
     def test_inkscape(self):
-        try:
-            result = subprocess.run([self.shared_vars['inkscape_path'].get(), "--version"], 
-                                  capture_output=True, text=True, timeout=5)
-            if result.returncode == 0:
-                version_line = result.stdout.split('\n')[0]
-                messagebox.showinfo("Inkscape Test", f"✅ Success!\n\n{version_line}")
-            else:
-                messagebox.showerror("Inkscape Test", "❌ Inkscape returned an error")
-        except Exception as e:
-            messagebox.showerror("Inkscape Test", f"❌ Error: {str(e)}")
\ No newline at end of file
+        # Probes once per Inkscape binary; the converters reuse the result
+        capabilities = probe_inkscape(self.shared_vars['inkscape_path'].get())
+        if capabilities is None:
+            messagebox.showerror("Inkscape Test", "❌ Error: Inkscape could not be run")
+            return
+        features = [
+            f"{'✅' if capabilities.export_page else '❌'} Multi-page export (--export-page)",
+            f"{'✅' if capabilities.actions else '❌'} Actions (--actions)",
+            f"{'✅' if capabilities.shell else '❌'} Shell mode (--shell)",
+            f"{'✅' if capabilities.supports('png') else '❌'} PNG export",
+            f"{'✅' if capabilities.supports('pdf') else '❌'} PDF export"
+        ]
+        messagebox.showinfo("Inkscape Test", f"✅ Success!\n\n{capabilities.version}\n\n" + "\n".join(features))
@@ -0,0 +1,82 @@
+# startup_timing.py - How fast the GUI starts: import breakdown and time to first frame
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+
+# One JSON line per measured start, to track startup time across changes
+STARTUP_LOG = os.path.join(os.path.expanduser('~'), '.inkscape_exporter', 'startup_times.jsonl')
+
+def import_breakdown(module='gui', top=15):
+    """
+    Slowest imports of module in a fresh interpreter (python -X importtime),
+    as (cumulative_us, self_us, name) rows, slowest first
+    """
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                          capture_output=True, text=True,
+                          cwd=os.path.dirname(os.path.abspath(__file__)))
+    rows = []
+    for line in proc.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        rows.append((int(cumulative_us), int(self_us), name.strip()))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+def record_startup(first_frame, imports_us=None, path=STARTUP_LOG):
+    entry = {
+        'time': time.time(),
+        'first_frame_ms': round(first_frame * 1000, 1),
+        'imports_ms': round(imports_us / 1000, 1) if imports_us else None,
+        'python': platform.python_version(),
+        'platform': platform.platform()
+    }
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + '\n')
+    except OSError:
+        pass
+    return entry
+
+class FirstFrameTimer:
+    """
+    Time from started (a time.perf_counter() value) until the main window
+    is mapped and its first idle redraw is done; on_frame gets the seconds
+    """
+    def __init__(self, root, started, on_frame=None):
+        self.root = root
+        self.started = started
+        self.on_frame = on_frame
+        self.elapsed = None
+        root.bind('<Map>', self.mapped, add='+')
+
+    def mapped(self, event):
+        if event.widget is self.root and self.elapsed is None:
+            self.elapsed = 0
+            self.root.after_idle(self.drawn)
+
+    def drawn(self):
+        self.elapsed = time.perf_counter() - self.started
+        if self.on_frame:
+            self.on_frame(self.elapsed)
+
+def report_startup(root, started):
+    """--startup-time: print the first frame time and import breakdown, log them, and quit"""
+    def on_frame(elapsed):
+        rows = import_breakdown()
+        total = next((cumulative for cumulative, own, name in rows if name == 'gui'), None)
+        entry = record_startup(elapsed, total)
+        print(f"[STARTUP] First frame after {entry['first_frame_ms']:.0f} ms")
+        if total:
+            print(f"[STARTUP] Importing gui: {total / 1000:.0f} ms (fresh interpreter)")
+        print(f"{'cumulative':>12} {'self':>10}  module")
+        for cumulative, own, name in rows:
+            print(f"{cumulative / 1000:>10.1f}ms {own / 1000:>8.1f}ms  {name}")
+        print(f"[STARTUP] Logged to: {STARTUP_LOG}")
+        root.destroy()
+    return FirstFrameTimer(root, started, on_frame)
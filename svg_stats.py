@@ -0,0 +1,121 @@
+# svg_stats.py - Cheap size/page/raster estimates for SVG files (timeouts, scheduling)
+import os
+import re
+
+# Conversion factors to CSS pixels (96 per inch), as Inkscape uses
+UNIT_TO_PX = {
+    '': 1.0,
+    'px': 1.0,
+    'pt': 96.0 / 72.0,
+    'pc': 16.0,
+    'mm': 96.0 / 25.4,
+    'cm': 96.0 / 2.54,
+    'in': 96.0,
+}
+
+# Fallback page size when the SVG has no usable width/height (A4 at 96 DPI)
+DEFAULT_PAGE_PX = (793.7, 1122.5)
+
+SVG_TAG_RE = re.compile(r'<svg\b[^>]*>', re.IGNORECASE | re.DOTALL)
+LENGTH_RE = re.compile(r'^\s*([0-9.]+(?:e[-+]?\d+)?)\s*([a-z%]*)\s*$', re.IGNORECASE)
+PAGE_RE = re.compile(r'<inkscape:page\b')
+IMAGE_RE = re.compile(r'<image\b', re.IGNORECASE)
+PATH_RE = re.compile(r'<(?:path|rect|circle|ellipse|line|polyline|polygon)\b', re.IGNORECASE)
+TEXT_RE = re.compile(r'<text\b', re.IGNORECASE)
+DATA_URI_RE = re.compile(r'data:image/[a-z+.-]+;base64,([A-Za-z0-9+/=\s]+)', re.IGNORECASE)
+LINKED_IMAGE_RE = re.compile(r'href\s*=\s*["\']([^"\'#][^"\']*\.(?:png|jpe?g|gif|bmp|tiff?|webp))["\']',
+                             re.IGNORECASE)
+
+def parse_length(value):
+    """Convert an SVG length such as '420mm' to CSS pixels, or None"""
+    if not value:
+        return None
+    match = LENGTH_RE.match(value)
+    if not match:
+        return None
+    number, unit = match.groups()
+    factor = UNIT_TO_PX.get(unit.lower())
+    if factor is None:
+        return None
+    try:
+        return float(number) * factor
+    except ValueError:
+        return None
+
+def get_attribute(tag, name):
+    match = re.search(r'\s' + re.escape(name) + r'\s*=\s*["\']([^"\']*)["\']', tag)
+    return match.group(1) if match else None
+
+def raster_payload(svg_content, base_dir=None):
+    """Bytes of embedded (base64) plus linked raster images referenced by the SVG"""
+    total = 0
+    for match in DATA_URI_RE.finditer(svg_content):
+        total += len(match.group(1)) * 3 // 4
+
+    if base_dir:
+        for href in set(LINKED_IMAGE_RE.findall(svg_content)):
+            if href.lower().startswith(('http:', 'https:', 'data:')):
+                continue
+            path = href[7:] if href.lower().startswith('file://') else href
+            if not os.path.isabs(path):
+                path = os.path.join(base_dir, path)
+            try:
+                total += os.path.getsize(path)
+            except OSError:
+                pass
+    return total
+
+def analyze_svg_content(svg_content, base_dir=None):
+    """Return page size (CSS px), page count, element counts and raster payload for SVG text"""
+    width_px, height_px = DEFAULT_PAGE_PX
+
+    svg_tag = SVG_TAG_RE.search(svg_content)
+    if svg_tag:
+        tag = svg_tag.group(0)
+        width = parse_length(get_attribute(tag, 'width'))
+        height = parse_length(get_attribute(tag, 'height'))
+
+        if width is None or height is None:
+            # Fall back to the viewBox (user units are px when no size is given)
+            view_box = get_attribute(tag, 'viewBox')
+            if view_box:
+                parts = re.split(r'[\s,]+', view_box.strip())
+                if len(parts) == 4:
+                    try:
+                        width = width or float(parts[2])
+                        height = height or float(parts[3])
+                    except ValueError:
+                        pass
+
+        if width and height:
+            width_px, height_px = width, height
+
+    return {
+        'width_px': width_px,
+        'height_px': height_px,
+        'pages': max(1, len(PAGE_RE.findall(svg_content))),
+        'bytes': len(svg_content.encode('utf-8', 'ignore')),
+        'image_count': len(IMAGE_RE.findall(svg_content)),
+        'path_count': len(PATH_RE.findall(svg_content)),
+        'text_count': len(TEXT_RE.findall(svg_content)),
+        'raster_bytes': raster_payload(svg_content, base_dir)
+    }
+
+def analyze_svg(svg_path):
+    """Return page size (CSS px), page count and raster payload for an SVG file"""
+    try:
+        with open(svg_path, 'r', encoding='utf-8', errors='ignore') as f:
+            return analyze_svg_content(f.read(), os.path.dirname(os.path.abspath(svg_path)))
+    except OSError:
+        return analyze_svg_content('')
+
+def render_dpi(stats, dpi, output_format='png'):
+    """DPI Inkscape actually rasterises at: pure-vector PDF export stays at 96"""
+    if output_format != 'png' and not (stats.get('raster_bytes') or stats.get('image_count')):
+        return 96
+    return dpi
+
+def megapixels(stats, dpi):
+    """Pixel count of one page rendered at dpi, in megapixels"""
+    scale = float(dpi) / 96.0
+    return (stats['width_px'] * scale) * (stats['height_px'] * scale) / 1e6
@@ -0,0 +1,208 @@
+# telemetry.py - Live statistics of a conversion run, fed by events from the engine
+import os
+import time
+import struct
+import threading
+from collections import deque
+
+WORKER_STATES = ('idle', 'parsing', 'rendering', 'writing')
+# Throughput is averaged over the pages finished in this many recent seconds
+RATE_WINDOW = 10.0
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# Statistics of the run the current thread works for, its worker slot and
+# the listener of its job's page events (see bind)
+CONTEXT = threading.local()
+
+def png_pixels(path):
+    """Width x height from a PNG header (0 for other files)"""
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(24)
+    except OSError:
+        return 0
+    if len(header) < 24 or header[:8] != PNG_SIGNATURE or header[12:16] != b'IHDR':
+        return 0
+    width, height = struct.unpack('>II', header[16:24])
+    return width * height
+
+class RunTelemetry:
+    """
+    Counters of one run, updated from any thread as the engine reports
+    events: worker states, finished pages, cache lookups, queue depth,
+    memory samples and ETA updates. snapshot() turns them into the
+    numbers a dashboard shows (rates over the last RATE_WINDOW seconds).
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.workers = {}
+        self.worker_limit = 0
+        self.pages = 0
+        self.pixels = 0
+        self.bytes = 0
+        self.recent = deque()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.queued = 0
+        self.running = 0
+        self.files_done = 0
+        self.files_total = 0
+        self.rss = 0
+        self.peak_rss = 0
+        self.eta = None
+        self.eta_time = None
+        self.fraction = 0.0
+        self.finished = None
+
+    def begin(self, workers, files):
+        with self.lock:
+            self.started = time.time()
+            self.worker_limit = workers
+            self.files_total += files
+            for slot in range(workers):
+                self.workers.setdefault(slot, ('idle', None, self.started))
+
+    def worker_state(self, slot, state, file=None):
+        with self.lock:
+            if state == 'idle':
+                file = None
+            elif file is None and slot in self.workers:
+                file = self.workers[slot][1]
+            self.workers[slot] = (state, file, time.time())
+
+    def page_done(self, path, size):
+        pixels = png_pixels(path)
+        now = time.time()
+        with self.lock:
+            self.pages += 1
+            self.pixels += pixels
+            self.bytes += size
+            self.recent.append((now, pixels))
+            while self.recent and self.recent[0][0] < now - RATE_WINDOW:
+                self.recent.popleft()
+
+    def cache_result(self, hit):
+        with self.lock:
+            if hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+    def queue_depth(self, queued, running, worker_limit):
+        with self.lock:
+            self.queued = queued
+            self.running = running
+            self.worker_limit = worker_limit
+
+    def file_done(self):
+        with self.lock:
+            self.files_done += 1
+
+    def memory(self, rss):
+        with self.lock:
+            self.rss = rss
+            self.peak_rss = max(self.peak_rss, rss)
+
+    def update_eta(self, seconds_left, fraction):
+        with self.lock:
+            self.eta = seconds_left
+            self.eta_time = time.time()
+            self.fraction = fraction
+
+    def finish(self):
+        with self.lock:
+            if self.finished:
+                return
+            self.finished = time.time()
+            for slot in self.workers:
+                self.workers[slot] = ('idle', None, self.finished)
+
+    def snapshot(self):
+        """Current numbers as a dict (safe to call from the GUI thread)"""
+        with self.lock:
+            now = self.finished or time.time()
+            elapsed = max(0.001, now - self.started)
+            # Recent rate once a few seconds have passed, else the average so far
+            window = min(RATE_WINDOW, elapsed)
+            recent = [entry for entry in self.recent if entry[0] >= now - window]
+            eta = None
+            if self.eta is not None and not self.finished:
+                # Counts down between updates
+                eta = max(0.0, self.eta - (now - self.eta_time))
+            lookups = self.cache_hits + self.cache_misses
+            return {
+                'elapsed': elapsed,
+                'pages': self.pages,
+                'pages_per_second': len(recent) / window,
+                'megapixels_per_second': sum(pixels for _, pixels in recent) / 1e6 / window,
+                'bytes': self.bytes,
+                'workers': [(slot,) + self.workers[slot][:2] + (now - self.workers[slot][2],)
+                            for slot in sorted(self.workers)],
+                'worker_limit': self.worker_limit,
+                'queued': self.queued,
+                'running': self.running,
+                'files_done': self.files_done,
+                'files_total': self.files_total,
+                'cache_hits': self.cache_hits,
+                'cache_lookups': lookups,
+                'cache_hit_rate': self.cache_hits / lookups if lookups else None,
+                'rss': self.rss,
+                'peak_rss': self.peak_rss,
+                'eta': eta,
+                'fraction': self.fraction,
+                'finished': self.finished is not None
+            }
+
+def bind(telemetry, slot=0, listener=None):
+    """
+    Report the current thread's events to telemetry as worker slot, and
+    page events to listener(event, info) as well (None to unbind)
+    """
+    CONTEXT.telemetry = telemetry
+    CONTEXT.slot = slot
+    CONTEXT.listener = listener
+
+def current():
+    """Statistics of the current thread's run, or None"""
+    return getattr(CONTEXT, 'telemetry', None)
+
+def state(name, file=None):
+    """The current worker is now parsing, rendering, writing or idle"""
+    telemetry = current()
+    if telemetry:
+        telemetry.worker_state(getattr(CONTEXT, 'slot', 0), name, file)
+
+def emit(event, info):
+    listener = getattr(CONTEXT, 'listener', None)
+    if listener:
+        listener(event, info)
+
+def page_started(page):
+    """The current worker starts exporting a page"""
+    emit('page_started', {'page': page})
+
+def page_done(path, page=None):
+    """A page was written to path"""
+    telemetry = current()
+    listener = getattr(CONTEXT, 'listener', None)
+    if not telemetry and not listener:
+        return
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        size = 0
+    if telemetry:
+        telemetry.page_done(path, size)
+    emit('page_finished', {'page': page, 'path': path, 'bytes': size})
+
+def cache_result(hit):
+    telemetry = current()
+    if telemetry:
+        telemetry.cache_result(hit)
+
+def update_eta(seconds_left, fraction):
+    telemetry = current()
+    if telemetry:
+        telemetry.update_eta(seconds_left, fraction)
@@ -0,0 +1,52 @@
+# test_inkscape_runner.py - A page only counts when its export exits cleanly
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+from inkscape_runner import export_page, RetryPolicy, ResourceLimits
+from scheduler import process_tree_rss
+
+NO_WAIT = RetryPolicy(max_attempts=2, initial_delay=0.0)
+
+def fake_export(output_file, then):
+    """A command that writes part of output_file, then runs then (Python source)"""
+    script = f"open({output_file!r}, 'w').write('half a page')\n{then}"
+    return [sys.executable, '-c', script]
+
+class ExportPageTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.output_file = os.path.join(self.folder, "page.png")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_clean_exit_keeps_the_page(self):
+        outcome = export_page(fake_export(self.output_file, "pass"), self.output_file, 10, page=1,
+                              retry_policy=NO_WAIT)
+        self.assertTrue(outcome.ok)
+        self.assertTrue(os.path.exists(self.output_file))
+
+    def test_file_written_before_a_hang_is_discarded(self):
+        cmd = fake_export(self.output_file, "import time\ntime.sleep(60)")
+        outcome = export_page(cmd, self.output_file, 1.0, page=1, retry_policy=NO_WAIT)
+        self.assertFalse(outcome.ok)
+        self.assertEqual(outcome.failure['reason'], 'timeout')
+        # Retried, then given up: the half-written file never counts as the page
+        self.assertEqual(outcome.attempts, 2)
+        self.assertFalse(os.path.exists(self.output_file))
+
+    @unittest.skipUnless(process_tree_rss([os.getpid()]), "no way to measure process memory here")
+    def test_file_written_before_a_memory_kill_is_discarded(self):
+        cmd = fake_export(self.output_file, "import time\nblock = bytearray(300 * 1024 * 1024)\ntime.sleep(60)")
+        limits = ResourceLimits(memory_limit=100 * 1024 * 1024)
+        outcome = export_page(cmd, self.output_file, 30, page=1, retry_policy=NO_WAIT, limits=limits)
+        self.assertFalse(outcome.ok)
+        self.assertEqual(outcome.failure['reason'], 'memory_limit')
+        self.assertEqual(outcome.attempts, 2)
+        self.assertFalse(os.path.exists(self.output_file))
+
+if __name__ == '__main__':
+    unittest.main()
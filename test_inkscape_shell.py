@@ -0,0 +1,95 @@
+# test_inkscape_shell.py - Warm shell renderers are reused, and replaced when an export goes wrong
+import os
+import sys
+import stat
+import shutil
+import tempfile
+import unittest
+
+from inkscape_probe import export_command
+from inkscape_shell import ShellPool, shell_actions
+
+# Answers like "inkscape --shell": a prompt, then one action line at a time.
+# Documents named hang*.svg never finish, crash*.svg kill the shell.
+FAKE_SHELL = '''
+import sys, time
+sys.stdout.write("Inkscape interactive shell mode.\\n> ")
+sys.stdout.flush()
+for line in sys.stdin:
+    actions = dict(a.strip().partition(":")[::2] for a in line.split(";") if a.strip())
+    if "quit" in actions:
+        break
+    name = actions.get("file-open", "")
+    if "hang" in name:
+        time.sleep(60)
+    if "crash" in name:
+        sys.exit(139)
+    if "export-do" in actions:
+        open(actions["export-filename"], "w").write(actions["export-type"])
+    sys.stdout.write("> ")
+    sys.stdout.flush()
+'''
+
+@unittest.skipIf(sys.platform == 'win32', "the fake Inkscape is a script with a shebang line")
+class ShellPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.inkscape = os.path.join(self.folder, "inkscape")
+        with open(self.inkscape, 'w') as f:
+            f.write(f"#!{sys.executable}\n{FAKE_SHELL}")
+        os.chmod(self.inkscape, os.stat(self.inkscape).st_mode | stat.S_IXUSR)
+        self.pool = ShellPool(max_idle=2)
+        # Skip the probe: the fake answers only in shell mode
+        self.pool.supported[self.inkscape] = True
+
+    def tearDown(self):
+        self.pool.close()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def export(self, name, timeout=10):
+        output_file = os.path.join(self.folder, name + ".png")
+        argv = export_command(None, self.inkscape, name + ".svg", 'png', output_file, dpi=150, page=2)
+        return self.pool.run(argv, timeout, cwd=self.folder), output_file
+
+    def idle_pids(self):
+        return [renderer.proc.pid for renderers in self.pool.idle.values() for renderer in renderers]
+
+    def test_renderer_is_reused_between_exports(self):
+        outcome, output_file = self.export("one")
+        self.assertIsNone(outcome.reason)
+        self.assertTrue(os.path.exists(output_file))
+        first = self.idle_pids()
+        outcome, output_file = self.export("two")
+        self.assertIsNone(outcome.reason)
+        self.assertTrue(os.path.exists(output_file))
+        self.assertEqual(self.idle_pids(), first)
+
+    def test_hung_renderer_is_killed_and_replaced(self):
+        self.export("one")
+        first = self.idle_pids()
+        outcome, _ = self.export("hang", timeout=1.0)
+        self.assertEqual(outcome.reason, 'timeout')
+        self.assertEqual(self.idle_pids(), [])
+        outcome, _ = self.export("two")
+        self.assertIsNone(outcome.reason)
+        self.assertNotEqual(self.idle_pids(), first)
+
+    def test_renderer_that_dies_is_a_crash(self):
+        outcome, output_file = self.export("crash")
+        self.assertEqual(outcome.reason, 'crash')
+        self.assertFalse(os.path.exists(output_file))
+        self.assertEqual(self.idle_pids(), [])
+
+class ShellActionsTest(unittest.TestCase):
+    def test_export_command_becomes_one_action_line(self):
+        argv = export_command(None, "inkscape", "plan.svg", 'pdf', "out/plan.pdf", page=3)
+        actions = shell_actions(argv, "/work")
+        self.assertEqual(actions, "file-open:/work/plan.svg; export-type:pdf; export-dpi:96; export-page:3; "
+                                  "export-filename:/work/out/plan.pdf; export-do; file-close")
+
+    def test_commands_a_shell_cannot_run_are_left_alone(self):
+        self.assertIsNone(shell_actions(["inkscape", "-z", "plan.svg", "--export-png=plan.png"]))
+        self.assertIsNone(shell_actions(["inkscape", "a;b.svg", "--export-type=png", "--export-filename=a.png"]))
+
+if __name__ == '__main__':
+    unittest.main()
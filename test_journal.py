@@ -0,0 +1,75 @@
+# test_journal.py - A resumed batch only renders what the checkpoint journal does not already have
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import png
+from batch_driver import run_batch
+from cost_model import CostModel
+from inkscape_runner import PageOutcome, make_failure
+
+SVG = '<svg xmlns="http://www.w3.org/2000/svg" width="100" height="100"/>'
+
+class ResumeTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.svg_folder = os.path.join(self.folder, "svg")
+        self.output = os.path.join(self.folder, "out")
+        os.makedirs(self.svg_folder)
+        for name in ("a.svg", "b.svg"):
+            with open(os.path.join(self.svg_folder, name), 'w', encoding='utf-8') as f:
+                f.write(SVG)
+        # Checked for, never run: exports are mocked
+        self.inkscape = os.path.join(self.folder, "inkscape")
+        open(self.inkscape, 'w').close()
+        self.exported = []
+        self.broken = set()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def export_page(self, cmd, output_file, timeout, page=None, *args, **kwargs):
+        # Every file has three pages; pages in self.broken fail for good
+        name = os.path.basename(output_file)
+        self.exported.append(name)
+        if name in self.broken:
+            return PageOutcome(False, make_failure('error', page=page))
+        if page and page > 3:
+            return PageOutcome(False, make_failure('no_output', page=page))
+        with open(output_file, 'w') as f:
+            f.write(name)
+        return PageOutcome(True)
+
+    def convert(self, resume):
+        del self.exported[:]
+        with mock.patch.object(png, 'export_page', self.export_page), \
+                mock.patch.object(png, 'probe_inkscape', return_value=None), \
+                mock.patch.dict(os.environ, {'INKSCAPE_EXPORTER_CACHE': ''}):
+            # A model of its own keeps the user's render timings out of the test
+            plan = png.prepare_batch(self.svg_folder, self.output, 96, inkscape_path=self.inkscape,
+                                     log_callback=lambda message: None, resume=resume,
+                                     cost_model=CostModel(os.path.join(self.folder, "cost_model.json")))
+            return run_batch(plan, workers=1)
+
+    def test_resumed_run_skips_journaled_pages(self):
+        # Interrupted: b.svg stops after its second page
+        self.broken = {"b_p3.png"}
+        self.convert(resume=False)
+        self.assertIn("b_p2.png", self.exported)
+
+        self.broken = set()
+        self.assertTrue(self.convert(resume=True))
+        # a.svg was finished, b.svg's first two pages were journaled
+        self.assertEqual(self.exported, ["b_p3.png", "b_p4.png"])
+        self.assertEqual(sorted(os.listdir(os.path.join(self.output, "b"))), ["b.png", "b_p2.png", "b_p3.png"])
+
+    def test_fresh_run_renders_everything_again(self):
+        self.convert(resume=False)
+        self.convert(resume=False)
+        self.assertEqual(sorted(self.exported), ["a.png", "a_p2.png", "a_p3.png", "a_p4.png",
+                                                 "b.png", "b_p2.png", "b_p3.png", "b_p4.png"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+# test_pdf_dedupe.py - Deduplication hashes every object once, reference cycles included
+import io
+import unittest
+from unittest import mock
+
+import pdf_dedupe
+
+try:
+    import pikepdf
+except ImportError:
+    pikepdf = None
+
+@unittest.skipIf(pikepdf is None, "deduplication needs pikepdf")
+class CycleTest(unittest.TestCase):
+    def setUp(self):
+        self.pdf = pikepdf.new()
+        self.pdf.add_blank_page()
+        self.page = self.pdf.pages[0]
+        properties = pikepdf.Dictionary()
+        # Two nodes pointing at each other, each with its own copy of one image
+        self.first = self.node(b'same pixels')
+        self.second = self.node(b'same pixels')
+        self.first.Next = self.second
+        self.second.Next = self.first
+        # A node pointing at itself
+        self.loop = self.node(b'other pixels')
+        self.loop.Next = self.loop
+        properties.First = self.first
+        properties.Loop = self.loop
+        self.page.Resources = pikepdf.Dictionary(Properties=properties)
+
+    def node(self, data):
+        image = self.pdf.make_stream(data)
+        image.Type = pikepdf.Name.XObject
+        image.Subtype = pikepdf.Name.Image
+        return self.pdf.make_indirect(pikepdf.Dictionary(Image=image))
+
+    def test_single_pass_through_cycles(self):
+        hashed = []
+
+        def object_key(pikepdf_module, obj, reference_key):
+            hashed.append(obj.objgen)
+            return key(pikepdf_module, obj, reference_key)
+
+        key = pdf_dedupe.object_key
+        with mock.patch.object(pdf_dedupe, 'object_key', object_key):
+            removed, removed_bytes = pdf_dedupe.deduplicate(self.pdf, pikepdf)
+        # Every object is hashed once, however many references lead to it
+        self.assertEqual(len(hashed), len(set(hashed)))
+        # The duplicate image goes; nodes in a cycle are only equal to themselves
+        self.assertEqual((removed, removed_bytes), (1, len(b'same pixels')))
+        self.assertEqual(self.first.Image.objgen, self.second.Image.objgen)
+        self.assertEqual(self.second.Next.objgen, self.first.objgen)
+        self.assertEqual(self.loop.Next.objgen, self.loop.objgen)
+
+        # Saved without the duplicate, which a second pass then has nothing left to find
+        output = io.BytesIO()
+        self.pdf.save(output)
+        with pikepdf.open(io.BytesIO(output.getvalue())) as saved:
+            properties = saved.pages[0].Resources.Properties
+            self.assertEqual(properties.First.Next.Image.read_bytes(), b'same pixels')
+            self.assertEqual(properties.Loop.Next.Image.read_bytes(), b'other pixels')
+            self.assertEqual(pdf_dedupe.deduplicate(saved, pikepdf), (0, 0))
+
+if __name__ == '__main__':
+    unittest.main()
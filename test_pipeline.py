@@ -0,0 +1,55 @@
+# test_pipeline.py - A merged PDF is only replaced by a merge that succeeds
+import os
+import shutil
+import tempfile
+import unittest
+
+from pipeline import merge_files
+from page_map import page_map_path
+from test_png_pdf import make_png, xref_sections
+
+class FailedUpdateTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.output = os.path.join(self.folder, "merged.pdf")
+        self.pages = [os.path.join(self.folder, f"page{number}.png") for number in range(3)]
+        for number, path in enumerate(self.pages):
+            self.draw(path, number)
+        self.logs = []
+        self.assertTrue(merge_files(self.output, 'png', self.pages, log=self.logs.append))
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def draw(self, path, value):
+        make_png(path, 2, 1, 2, [[value, 0, 0, 0, value, 0]])
+
+    def snapshot(self):
+        """Bytes and mtime of the merged PDF and its page map"""
+        state = []
+        for path in (self.output, page_map_path(self.output)):
+            with open(path, 'rb') as f:
+                state.append((f.read(), os.stat(path).st_mtime_ns))
+        return state
+
+    def test_failed_update_leaves_the_merged_pdf_as_it_was(self):
+        before = self.snapshot()
+        # The changed page is appended to the update before the broken one fails it
+        self.draw(self.pages[1], 100)
+        with open(self.pages[2], 'wb') as f:
+            f.write(b'\x89PNG\r\n\x1a\nbroken')
+        self.assertFalse(merge_files(self.output, 'png', self.pages, log=self.logs.append))
+        self.assertTrue(any(line.startswith("[ERROR]") for line in self.logs))
+        self.assertEqual(self.snapshot(), before)
+        self.assertEqual(sorted(name for name in os.listdir(self.folder) if name.startswith("merged")),
+                         ["merged.pdf", os.path.basename(page_map_path(self.output))])
+
+        # Its page map still holds, so the next merge updates the same file
+        self.draw(self.pages[2], 200)
+        del self.logs[:]
+        self.assertTrue(merge_files(self.output, 'png', self.pages, log=self.logs.append))
+        self.assertIn("[MERGE] Updated: 1 unchanged page(s) kept, 2 written", self.logs)
+        self.assertEqual(len(xref_sections(self.output)), 2)
+
+if __name__ == '__main__':
+    unittest.main()
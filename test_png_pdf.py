@@ -0,0 +1,174 @@
+# test_png_pdf.py - The streaming PNG-to-PDF writer: transparency, passthrough data and
+# cross-reference tables of pages written as they are
+import os
+import re
+import zlib
+import shutil
+import struct
+import tempfile
+import unittest
+
+from png_pdf import PNG_SIGNATURE, PILLOW_AVAILABLE, PdfImageWriter, write_pdf
+from png_preflight import png_chunk
+
+def make_png(path, width, height, color_type, rows, chunks=(), idat_size=None):
+    """
+    An 8-bit PNG from raw rows (filter type 0), with extra chunks before the
+    image data; idat_size splits the compressed data over several IDAT chunks.
+    Returns the compressed data.
+    """
+    data = zlib.compress(b''.join(b'\x00' + bytes(row) for row in rows))
+    step = idat_size or len(data)
+    with open(path, 'wb') as f:
+        f.write(PNG_SIGNATURE)
+        f.write(png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, color_type, 0, 0, 0)))
+        for chunk_type, chunk_data in chunks:
+            f.write(png_chunk(chunk_type, chunk_data))
+        for start in range(0, len(data), step):
+            f.write(png_chunk(b'IDAT', data[start:start + step]))
+        f.write(png_chunk(b'IEND', b''))
+    return data
+
+def pdf_objects(path):
+    """{object number: (dictionary text, raw stream data or None)} of a PDF written by png_pdf"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    objects = {}
+    for match in re.finditer(rb'(\d+) 0 obj\n(.*?)\nendobj\n', data, re.S):
+        body = match.group(2)
+        dictionary, _, stream = body.partition(b'\nstream\n')
+        objects[int(match.group(1))] = (dictionary.decode('latin-1'), stream[:-len(b'\nendstream')] if stream else None)
+    return objects
+
+def xref_sections(path):
+    """[(startxref, {object number: offset}, trailer text)], newest first, following /Prev"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    sections = []
+    offset = int(re.findall(rb'startxref\n(\d+)\n%%EOF', data)[-1])
+    while offset is not None:
+        table, _, rest = data[offset:].partition(b'trailer\n')
+        lines = table.decode('latin-1').split('\n')[1:]
+        entries = {}
+        number = 0
+        for line in lines:
+            fields = line.split()
+            if len(fields) == 2:
+                number = int(fields[0])
+            elif len(fields) == 3:
+                if fields[2] == 'n':
+                    entries[number] = int(fields[0])
+                number += 1
+        trailer = rest[:rest.index(b'>>') + 2].decode('latin-1')
+        sections.append((offset, entries, trailer))
+        previous = re.search(r'/Prev (\d+)', trailer)
+        offset = int(previous.group(1)) if previous else None
+    return sections
+
+def images(path):
+    return {number: (dictionary, stream) for number, (dictionary, stream) in pdf_objects(path).items()
+            if '/Subtype /Image' in dictionary}
+
+class TransparencyTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.png = os.path.join(self.folder, "page.png")
+        self.pdf = os.path.join(self.folder, "out.pdf")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_rgb_colour_key_passes_through_with_a_mask(self):
+        rows = [[255, 0, 0, 0, 255, 0]] * 2
+        make_png(self.png, 2, 2, 2, rows, [(b'tRNS', struct.pack('>3H', 255, 0, 0))])
+        write_pdf([self.png], self.pdf)
+        (dictionary, stream), = images(self.pdf).values()
+        self.assertIn('/Predictor 15', dictionary)
+        self.assertIn('/Mask [255 255 0 0 0 0]', dictionary)
+
+    def test_gray_colour_key_passes_through_with_a_mask(self):
+        make_png(self.png, 2, 1, 0, [[7, 200]], [(b'tRNS', struct.pack('>H', 7))])
+        write_pdf([self.png], self.pdf)
+        (dictionary, stream), = images(self.pdf).values()
+        self.assertIn('/Mask [7 7]', dictionary)
+
+    @unittest.skipUnless(PILLOW_AVAILABLE, "palette transparency is decoded with Pillow")
+    def test_palette_transparency_becomes_a_soft_mask(self):
+        palette = bytes([255, 0, 0, 0, 0, 255])
+        make_png(self.png, 2, 1, 3, [[0, 1]], [(b'PLTE', palette), (b'tRNS', bytes([0]))])
+        write_pdf([self.png], self.pdf)
+        found = images(self.pdf)
+        color = next(d for d, s in found.values() if '/SMask' in d)
+        self.assertIn('/DeviceRGB', color)
+        mask_id = int(re.search(r'/SMask (\d+) 0 R', color).group(1))
+        # Index 0 is fully transparent, index 1 (no tRNS entry) opaque
+        self.assertEqual(zlib.decompress(found[mask_id][1]), bytes([0, 255]))
+
+class WriterTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.pdf = os.path.join(self.folder, "out.pdf")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def page(self, name, value):
+        return os.path.join(self.folder, name), [[value, 0, 0, 0, value, 0]] * 2
+
+    def assert_xref_points_at_objects(self, sections):
+        with open(self.pdf, 'rb') as f:
+            data = f.read()
+        for startxref, entries, trailer in sections:
+            self.assertTrue(data[startxref:].startswith(b'xref\n'))
+            for number, offset in entries.items():
+                self.assertTrue(data[offset:].startswith(f"{number} 0 obj\n".encode('latin-1')), number)
+
+    def test_opaque_page_data_passes_through_with_its_predictor(self):
+        path, rows = self.page("page.png", 9)
+        compressed = make_png(path, 2, 2, 2, rows, idat_size=5)
+        write_pdf([path], self.pdf)
+        (dictionary, stream), = images(self.pdf).values()
+        # The IDAT chunks, joined and unchanged; the PNG row filters are undone by the reader
+        self.assertEqual(stream, compressed)
+        self.assertIn('/DecodeParms << /Predictor 15 /Colors 3 /BitsPerComponent 8 /Columns 2 >>', dictionary)
+        self.assertNotIn('/SMask', dictionary)
+
+    def test_xref_points_at_every_object(self):
+        paths = []
+        for number in range(3):
+            path, rows = self.page(f"page{number}.png", number)
+            make_png(path, 2, 2, 2, rows)
+            paths.append(path)
+        write_pdf(paths, self.pdf)
+        (startxref, entries, trailer), = xref_sections(self.pdf)
+        self.assertEqual(sorted(entries), list(range(1, len(pdf_objects(self.pdf)) + 1)))
+        self.assertIn(f'/Size {len(entries) + 1}', trailer)
+        self.assert_xref_points_at_objects([(startxref, entries, trailer)])
+
+    def test_update_lists_its_objects_and_points_back(self):
+        first, rows = self.page("first.png", 1)
+        make_png(first, 2, 2, 2, rows)
+        writer = PdfImageWriter(self.pdf)
+        writer.add_png(first)
+        writer.close()
+        kept_page, = writer.page_ids
+
+        second, rows = self.page("second.png", 2)
+        make_png(second, 2, 2, 2, rows)
+        update = PdfImageWriter(self.pdf, update=(writer.next_id, writer.xref_offset))
+        update.add_existing_page(kept_page)
+        update.add_png(second)
+        update.close()
+
+        sections = xref_sections(self.pdf)
+        (new_start, new_entries, new_trailer), (old_start, old_entries, _) = sections
+        self.assertEqual(old_start, writer.xref_offset)
+        self.assertIn(f'/Prev {old_start}', new_trailer)
+        # The update lists the rewritten page tree and its own new objects only
+        self.assertEqual(sorted(new_entries), [2] + list(range(writer.next_id, update.next_id)))
+        self.assert_xref_points_at_objects(sections)
+        pages = re.findall(r'/Kids \[([^\]]*)\]', pdf_objects(self.pdf)[2][0])
+        self.assertEqual(pages, [f"{kept_page} 0 R {update.page_ids[1]} 0 R"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+# test_render_cache.py - Render and preview cache keys follow the layer rules that apply to a file;
+# what killed processes leave in the cache is cleaned up
+import os
+import shutil
+import time
+import tempfile
+import unittest
+
+import png
+from render_cache import RenderCache, CacheLock, render_key, applicable_layer_rules
+from thumbnails import thumbnail_key
+
+SVG = ('<svg xmlns="http://www.w3.org/2000/svg" '
+       'xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape">'
+       '<g inkscape:groupmode="layer" inkscape:label="Furniture" id="layer1"/></svg>')
+
+class LayerRuleKeyTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.svg_path = os.path.join(self.folder, "plan.svg")
+        with open(self.svg_path, 'w', encoding='utf-8') as f:
+            f.write(SVG)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def key(self, layer_rules):
+        return render_key('0' * 64, "plan.svg", 'png', '96', layer_rules, "inkscape")
+
+    def test_rule_keyed_without_extension_changes_key(self):
+        shown = self.key({'plan': {'Furniture': 'show'}})
+        hidden = self.key({'plan': {'Furniture': 'hide'}})
+        self.assertNotEqual(shown, hidden)
+
+    def test_rule_keyed_with_extension_changes_key(self):
+        shown = self.key({'plan.svg': {'Furniture': 'show'}})
+        hidden = self.key({'plan.svg': {'Furniture': 'hide'}})
+        self.assertNotEqual(shown, hidden)
+
+    def test_rules_for_other_files_do_not_change_key(self):
+        self.assertEqual(self.key({'global': {'Furniture': 'show'}}),
+                         self.key({'global': {'Furniture': 'show'}, 'other': {'Furniture': 'hide'}}))
+
+    def test_thumbnail_key_follows_per_file_rule(self):
+        shown = thumbnail_key(self.svg_path, {'plan': {'Furniture': 'show'}}, "inkscape")
+        hidden = thumbnail_key(self.svg_path, {'plan': {'Furniture': 'hide'}}, "inkscape")
+        self.assertNotEqual(shown, hidden)
+
+    def test_key_covers_the_rules_that_are_applied(self):
+        # Later keys override earlier ones, as when the SVG is rewritten
+        rules = {'global': {'Furniture': 'hide'}, 'plan': {'Furniture': 'show'}}
+        self.assertEqual(applicable_layer_rules(rules, "plan.svg"), {'Furniture': 'show'})
+        self.assertNotIn('display:none', png.apply_layer_visibility(SVG, rules, "plan.svg"))
+
+class LeftoverTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.cache = RenderCache(self.folder, max_bytes=1, stale_after=60)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def leave(self, name, age):
+        """A file or directory under the cache, last changed age seconds ago"""
+        path = os.path.join(self.folder, name)
+        if name.endswith('/'):
+            os.makedirs(os.path.join(path, "p1.png"))
+        else:
+            open(path, 'w').close()
+        when = time.time() - age
+        os.utime(path.rstrip('/'), (when, when))
+        return path.rstrip('/')
+
+    def leftovers(self):
+        return sorted(os.path.join(name, entry) for name in ('locks', 'tmp', 'trash')
+                      for entry in os.listdir(os.path.join(self.folder, name)))
+
+    def test_broken_lock_is_deleted(self):
+        lock = CacheLock(self.leave("locks/key.lock", 600), stale_after=0)
+        observed = {}
+        self.assertFalse(lock.break_if_stale(observed))
+        self.assertTrue(lock.break_if_stale(observed))
+        self.assertEqual(self.leftovers(), [])
+
+    def test_old_leftovers_are_deleted_on_open(self):
+        self.leave("locks/key.lock.stale.0123abcd", 0)
+        self.leave("tmp/old.0123abcd/", 600)
+        self.leave("trash/0123abcd/", 600)
+        self.leave("tmp/new.0123abcd/", 0)
+        self.leave("locks/held.lock", 600)
+        RenderCache(self.folder, stale_after=60)
+        self.assertEqual(self.leftovers(), [os.path.join('locks', 'held.lock'),
+                                            os.path.join('tmp', 'new.0123abcd')])
+
+    def test_old_leftovers_are_deleted_on_evict(self):
+        self.leave("locks/key.lock.stale.0123abcd", 0)
+        self.leave("tmp/old.0123abcd/", 600)
+        self.leave("trash/0123abcd/", 600)
+        self.cache.evicting.acquire()
+        self.cache.evict()
+        self.assertEqual(self.leftovers(), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+# test_workqueue.py - Two workers on one queue: claims, heartbeat expiry and requeueing
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import png
+from inkscape_runner import ConversionResult
+from workqueue import (DeadWorkerMonitor, BATCH_FILENAME, submit_batch, run_worker, requeue_dead,
+                       queue_paths, list_names, read_json)
+
+SVG = '<svg xmlns="http://www.w3.org/2000/svg" width="{0}" height="{0}"/>'
+
+class TwoWorkerTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.svg_folder = os.path.join(self.folder, "svg")
+        self.queue_dir = os.path.join(self.folder, "queue")
+        os.makedirs(self.svg_folder)
+        # The bigger sheet is claimed first
+        for name, size in (("big.svg", 4000), ("small.svg", 100)):
+            with open(os.path.join(self.svg_folder, name), 'w', encoding='utf-8') as f:
+                f.write(SVG.format(size))
+        # Heartbeats that never come again: a worker is taken for dead after dead_after
+        submit_batch(self.queue_dir, self.svg_folder, os.path.join(self.folder, "out"), 96,
+                     dead_after=0.3, heartbeat_interval=60)
+        self.paths = queue_paths(self.queue_dir)
+        self.batch_id = read_json(os.path.join(self.queue_dir, BATCH_FILENAME))['batch_id']
+        self.release = threading.Event()
+        self.finished = {}
+        self.logs = []
+
+    def tearDown(self):
+        self.release.set()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def convert(self, svg_path, output_pattern, dpi, inkscape_path, layer_rules, resource_limits=None):
+        # The slow worker hangs until released; the other renders at once
+        if threading.current_thread().name == 'slow':
+            self.release.wait(30)
+        return ConversionResult([output_pattern])
+
+    def start_worker(self, name):
+        def work():
+            self.finished[name] = run_worker(self.queue_dir, "inkscape", worker_id=name,
+                                             log=self.logs.append, poll_interval=0.05)
+        thread = threading.Thread(target=work, name=name)
+        thread.start()
+        return thread
+
+    def wait_for(self, condition):
+        for _ in range(200):
+            if condition():
+                return
+            threading.Event().wait(0.05)
+        self.fail("timed out")
+
+    def test_requeued_task_is_published_once_by_the_live_worker(self):
+        with mock.patch.object(png, 'convert_svg_to_png', self.convert), \
+                mock.patch.dict(os.environ, {'INKSCAPE_EXPORTER_CACHE': ''}):
+            slow = self.start_worker('slow')
+            self.wait_for(lambda: list_names(self.paths['claimed']))
+            big, = list_names(self.paths['claimed'])
+            self.assertTrue(big.endswith('@slow'))
+
+            # The slow worker's beat stops changing: its claim goes back to pending
+            monitor = DeadWorkerMonitor(self.queue_dir, 0.3)
+            self.wait_for(lambda: requeue_dead(self.queue_dir, monitor, 3, self.logs.append, self.batch_id))
+            self.assertEqual(list_names(self.paths['claimed']), [])
+
+            fast = self.start_worker('fast')
+            fast.join(10)
+            self.assertEqual(self.finished['fast'], 2)
+
+            # Done at last, the slow worker finds its claim gone and drops its result
+            self.release.set()
+            slow.join(10)
+            self.assertEqual(self.finished['slow'], 0)
+
+        results = [read_json(os.path.join(self.paths['done'], name)) for name in list_names(self.paths['done'])]
+        self.assertEqual(sorted(result['worker'] for result in results), ['fast', 'fast'])
+        self.assertEqual(sorted(result['attempts'] for result in results), [0, 1])
+        self.assertEqual(os.listdir(self.paths['claimed']), [])
+        self.assertEqual(os.listdir(self.paths['pending']), [])
+
+    def test_results_of_live_workers_are_kept(self):
+        self.release.set()
+        with mock.patch.object(png, 'convert_svg_to_png', self.convert), \
+                mock.patch.dict(os.environ, {'INKSCAPE_EXPORTER_CACHE': ''}):
+            threads = [self.start_worker('one'), self.start_worker('two')]
+            for thread in threads:
+                thread.join(10)
+        self.assertEqual(self.finished['one'] + self.finished['two'], 2)
+        self.assertEqual(len(list_names(self.paths['done'])), 2)
+        self.assertEqual(os.listdir(self.paths['claimed']), [])
+
+if __name__ == '__main__':
+    unittest.main()
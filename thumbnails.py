@@ -0,0 +1,105 @@
+# thumbnails.py - Low-resolution page previews rendered in the background and cached on disk
+import os
+import shutil
+import logging
+import tempfile
+import threading
+
+import run_log
+from manifest import source_sha256
+from render_cache import RenderCache, render_key, GB
+from inkscape_runner import ResourceLimits
+
+# Previews are rendered at this DPI (an A3 page is about 165 x 117 pixels)
+THUMBNAIL_DPI = 10
+THUMBNAIL_DIR = os.path.join(os.path.expanduser('~'), '.inkscape_exporter', 'thumbnails')
+THUMBNAIL_CACHE_BYTES = GB // 2
+# Previews never compete with conversions for CPU or disk
+THUMBNAIL_LIMITS = ResourceLimits(nice=19, ionice='idle')
+
+def default_workers():
+    return max(1, min(2, (os.cpu_count() or 2) // 2))
+
+def thumbnail_key(svg_path, layer_rules, inkscape_path, dpi=THUMBNAIL_DPI):
+    """Cache key of a preview: file content, the layer rules that apply to it and the renderer"""
+    return render_key(source_sha256(svg_path), os.path.basename(svg_path), 'thumbnail', dpi,
+                      layer_rules, inkscape_path)
+
+class ThumbnailRenderer:
+    """
+    Renders page previews on a few idle worker threads. request() replaces
+    everything still waiting (e.g. after the layer rules changed); cached
+    previews are returned without rendering. on_ready gets (svg_path,
+    page paths or None, error) on a worker thread. pause() holds new
+    renders back while a conversion runs (cached previews still show).
+    """
+    def __init__(self, cache_dir=THUMBNAIL_DIR, workers=None, dpi=THUMBNAIL_DPI, log=None):
+        self.cache = RenderCache(cache_dir, THUMBNAIL_CACHE_BYTES, log=log)
+        self.dpi = dpi
+        self.log = log or run_log.console_log
+        self.condition = threading.Condition()
+        self.pending = []
+        self.generation = 0
+        self.running = threading.Event()
+        self.running.set()
+        for _ in range(workers or default_workers()):
+            threading.Thread(target=self.worker, daemon=True).start()
+
+    def request(self, svg_paths, layer_rules, inkscape_path, on_ready):
+        """Queue previews of svg_paths (in order), dropping earlier requests"""
+        with self.condition:
+            self.generation += 1
+            self.pending = [(self.generation, path, layer_rules, inkscape_path, on_ready)
+                            for path in reversed(svg_paths)]
+            self.condition.notify_all()
+
+    def cancel(self):
+        self.request([], None, None, None)
+
+    def pause(self):
+        self.running.clear()
+
+    def resume(self):
+        self.running.set()
+
+    def worker(self):
+        # Inkscape chatter stays out of the GUI log; only problems get through
+        run_log.bind(lambda message: self.log(message) if run_log.level_of(message) >= logging.WARNING else None)
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                generation, svg_path, layer_rules, inkscape_path, on_ready = self.pending.pop()
+            try:
+                pages, error = self.render(svg_path, layer_rules, inkscape_path, generation), None
+            except Exception as e:
+                pages, error = None, e
+            if generation == self.generation:
+                on_ready(svg_path, pages, error)
+
+    def render(self, svg_path, layer_rules, inkscape_path, generation):
+        key = thumbnail_key(svg_path, layer_rules, inkscape_path, self.dpi)
+        pages = self.cache.lookup(key)
+        if pages is not None:
+            return pages
+
+        # Cached previews show at once; new renders wait for the conversion to finish
+        self.running.wait()
+        if generation != self.generation:
+            return None
+
+        from png import convert_svg_to_png
+        temp_dir = tempfile.mkdtemp(prefix='thumbnail_')
+        try:
+            output_pattern = os.path.join(temp_dir, 'page.png')
+            result = convert_svg_to_png(svg_path, output_pattern, str(self.dpi), inkscape_path,
+                                        layer_rules, resource_limits=THUMBNAIL_LIMITS)
+            if not result.files_created:
+                raise RuntimeError(result.stderr or "No pages rendered")
+            self.cache.publish(key, [os.path.join(temp_dir, name) for name in result.files_created])
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        pages = self.cache.lookup(key)
+        if pages is None:
+            raise RuntimeError("Preview was evicted from the cache")
+        return pages
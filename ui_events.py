@@ -0,0 +1,122 @@
+# ui_events.py - Event bus between worker threads and the Tk main loop
+import os
+import time
+import queue
+import traceback
+import tkinter as tk
+
+from run_log import RunLogger
+
+# The main loop drains posted events this often
+DRAIN_INTERVAL_MS = 50
+# Events handled per drain; the rest wait for the next tick so the window stays responsive
+MAX_EVENTS_PER_DRAIN = 2000
+# Progress redraws per second, at most
+PROGRESS_FPS = 10
+# Lines kept in a log widget; the full log goes to disk
+MAX_LOG_LINES = 2000
+
+# Full GUI logs (rotating), one file per log widget
+LOG_DIR = os.path.join(os.path.expanduser('~'), '.inkscape_exporter', 'logs')
+
+class LogView:
+    """A text widget that keeps only its last max_lines lines"""
+    def __init__(self, widget, max_lines=MAX_LOG_LINES):
+        self.widget = widget
+        self.max_lines = max_lines
+
+    def append(self, messages):
+        self.widget.insert(tk.END, '\n'.join(messages) + '\n')
+        # 'end-1c' is on the empty line after the last newline
+        line_count = int(self.widget.index('end-1c').split('.')[0]) - 1
+        if line_count > self.max_lines:
+            self.widget.delete('1.0', f'{line_count - self.max_lines + 1}.0')
+        self.widget.see(tk.END)
+
+    def clear(self):
+        self.widget.delete('1.0', tk.END)
+
+class UIEventBus:
+    """
+    Worker threads post log lines, progress and calls to a thread-safe
+    queue and never touch Tk themselves; the main loop drains the queue
+    every interval_ms. Log lines of one drain are inserted at once,
+    progress is coalesced (only the newest update per key is drawn, at
+    most fps times a second), and calls run in the order they were posted.
+    """
+    def __init__(self, root, interval_ms=DRAIN_INTERVAL_MS, fps=PROGRESS_FPS):
+        self.root = root
+        self.interval_ms = interval_ms
+        self.frame_interval = 1.0 / fps
+        self.last_frame = 0
+        self.events = queue.Queue()
+        self.views = {}
+        self.pending_progress = {}
+        self.root.after(self.interval_ms, self.drain)
+
+    def add_log_view(self, name, widget, log_file=None):
+        """Show the log name in widget; returns its RunLogger (usable from any thread)"""
+        self.views[name] = LogView(widget)
+        try:
+            return RunLogger(lambda message: self.post('log', name, message), log_file=log_file)
+        except OSError:
+            # No log folder: the widget alone still works
+            return RunLogger(lambda message: self.post('log', name, message))
+
+    def clear_log(self, name):
+        self.views[name].clear()
+
+    def post(self, kind, *args):
+        self.events.put((kind, args))
+
+    def progress(self, key, callback, *args):
+        """Draw progress with callback(*args); superseded by newer updates with the same key"""
+        self.post('progress', key, callback, args)
+
+    def call(self, callback, *args):
+        """Run callback(*args) on the main loop"""
+        self.post('call', callback, args)
+
+    def drain(self):
+        lines = {}
+        try:
+            for _ in range(MAX_EVENTS_PER_DRAIN):
+                try:
+                    kind, args = self.events.get_nowait()
+                except queue.Empty:
+                    break
+                if kind == 'log':
+                    name, message = args
+                    lines.setdefault(name, []).append(message)
+                elif kind == 'progress':
+                    key, callback, callback_args = args
+                    self.pending_progress[key] = (callback, callback_args)
+                else:
+                    # A call sees everything posted before it
+                    self.write_lines(lines)
+                    self.draw_progress()
+                    callback, callback_args = args
+                    self.run(callback, *callback_args)
+            self.write_lines(lines)
+            if self.pending_progress and time.time() - self.last_frame >= self.frame_interval:
+                self.draw_progress()
+        finally:
+            self.root.after(self.interval_ms, self.drain)
+
+    def write_lines(self, lines):
+        for name, messages in lines.items():
+            if name in self.views:
+                self.views[name].append(messages)
+        lines.clear()
+
+    def draw_progress(self):
+        pending, self.pending_progress = self.pending_progress, {}
+        for callback, args in pending.values():
+            self.run(callback, *args)
+        self.last_frame = time.time()
+
+    def run(self, callback, *args):
+        try:
+            callback(*args)
+        except Exception:
+            traceback.print_exc()
@@ -1,22 +1,20 @@
 # vector.py - SVG to PDF conversion module with merging capability
 import os
-import subprocess
 import tempfile
 import xml.etree.ElementTree as ET
-import shutil
-from pathlib import Path
+import time
 import sys
+from svg_stats import analyze_svg
+from inkscape_runner import export_page, ConversionResult, make_failure, DEFAULT_TIMEOUT_POLICY, ResourceLimits
+from render_cache import applicable_layer_rules
+from pipeline import MergeStage
+from inkscape_probe import probe_inkscape, export_command
+import run_log
+import batch_driver
+from batch_driver import BatchFormat
 
-# Global variable for log callback
-global_log_callback = None
-
-def get_svg_files(folder_path):
-    """Get all SVG files from folder, sorted alphabetically"""
-    svg_files = []
-    for file in sorted(os.listdir(folder_path)):
-        if file.lower().endswith('.svg'):
-            svg_files.append(file)
-    return svg_files
+# Manifest of the most recent batch_convert run
+last_manifest = None
 
 def parse_svg_layers(svg_content):
     """Parse SVG to extract layer information"""
@@ -45,10 +43,7 @@ def parse_svg_layers(svg_content):
         
         return layers
     except Exception as e:
-        if global_log_callback:
-            global_log_callback(f"Warning: Could not parse SVG layers: {e}")
-        else:
-            print(f"Warning: Could not parse SVG layers: {e}")
+        run_log.current()(f"Warning: Could not parse SVG layers: {e}")
         return {}
 
 def apply_layer_visibility(svg_content, layer_rules, filename=None):
@@ -65,23 +60,8 @@ def apply_layer_visibility(svg_content, layer_rules, filename=None):
         
         root = ET.fromstring(svg_content)
         
-        # Check both global rules and filename-specific rules
-        applicable_rules = {}
-        
-        # Add global rules
-        if 'global' in layer_rules:
-            applicable_rules.update(layer_rules['global'])
-        
-        # Add filename-specific rules
-        if filename:
-            # Try exact match first
-            if filename in layer_rules:
-                applicable_rules.update(layer_rules[filename])
-            
-            # Try without extension
-            basename = os.path.splitext(filename)[0]
-            if basename in layer_rules:
-                applicable_rules.update(layer_rules[basename])
+        # Global rules, then rules for the file name with and without extension
+        applicable_rules = applicable_layer_rules(layer_rules, filename)
         
         if not applicable_rules:
             return svg_content
@@ -128,25 +108,16 @@ def apply_layer_visibility(svg_content, layer_rules, filename=None):
                 elem.set('style', new_style)
                 
                 layers_modified += 1
-                if global_log_callback:
-                    global_log_callback(f"  Applied {action} to layer: {layer_key}")
-                else:
-                    print(f"  Applied {action} to layer: {layer_key}")
+                run_log.detail(f"  Applied {action} to layer: {layer_key}")
         
         if layers_modified > 0:
-            if global_log_callback:
-                global_log_callback(f"  Modified {layers_modified} layers")
-            else:
-                print(f"  Modified {layers_modified} layers")
+            run_log.detail(f"  Modified {layers_modified} layers")
             return ET.tostring(root, encoding='unicode')
         else:
             return svg_content
             
     except Exception as e:
-        if global_log_callback:
-            global_log_callback(f"Warning: Error applying layer rules: {e}")
-        else:
-            print(f"Warning: Error applying layer rules: {e}")
+        run_log.current()(f"Warning: Error applying layer rules: {e}")
         return svg_content
 
 def detect_raster_content(svg_path):
@@ -181,10 +152,43 @@ def detect_raster_content(svg_path):
         # If we can't read or parse, assume it might have raster content
         return True
 
-def convert_svg_to_pdf(svg_path, output_pattern, dpi, inkscape_path, layer_rules=None):
-    """Convert a single SVG file to PDF(s) with optional layer control"""
-    # Use global log_callback
-    global global_log_callback
+def write_layered_svg(svg_path, layer_rules):
+    """Temporary copy of svg_path with the layer rules applied, or None to use the original"""
+    svg_filename = os.path.basename(svg_path)
+    try:
+        # Read SVG content
+        with open(svg_path, 'r', encoding='utf-8') as f:
+            svg_content = f.read()
+        
+        # Apply layer visibility rules
+        run_log.detail(f"  Applying layer rules to: {svg_filename}")
+        
+        svg_content = apply_layer_visibility(svg_content, layer_rules, svg_filename)
+        
+        # Create temporary SVG file with modified layers
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.svg', delete=False, encoding='utf-8') as temp_svg:
+            temp_svg.write(svg_content)
+            return temp_svg.name
+        
+    except Exception as e:
+        run_log.current()(f"Warning: Could not apply layer rules ({e}), using original file")
+        return None
+
+def convert_svg_to_pdf(svg_path, output_pattern, dpi, inkscape_path, layer_rules=None,
+                       done_pages=None, page_callback=None, timeout_policy=None, retry_policy=None,
+                       resource_limits=None, prepared_svg=None):
+    """
+    Convert a single SVG file to PDF(s) with optional layer control.
+    done_pages maps page numbers already rendered by an interrupted run to
+    their output paths; those pages are not exported again. page_callback
+    is called with (page_num, output_path) after each page is written.
+    Each Inkscape run is bounded by timeout_policy and resource_limits
+    (memory cap, priority, CPU affinity); hangs, crashes and memory-limit
+    kills are retried per retry_policy. The result carries a structured
+    failure. prepared_svg is a copy with the layer rules already applied.
+    """
+    done_pages = done_pages or {}
+    timeout_policy = timeout_policy or DEFAULT_TIMEOUT_POLICY
     
     # Ensure output directory exists
     output_dir = os.path.dirname(output_pattern)
@@ -200,35 +204,14 @@ def convert_svg_to_pdf(svg_path, output_pattern, dpi, inkscape_path, layer_rules
     svg_filename = os.path.basename(svg_path)
     
     # Check if layer control is needed
-    if layer_rules:
-        try:
-            # Read SVG content
-            with open(svg_path, 'r', encoding='utf-8') as f:
-                svg_content = f.read()
-            
-            # Apply layer visibility rules
-            if global_log_callback:
-                global_log_callback(f"  Applying layer rules to: {svg_filename}")
-            else:
-                print(f"  Applying layer rules to: {svg_filename}")
-            
-            svg_content = apply_layer_visibility(svg_content, layer_rules, svg_filename)
-            
-            # Create temporary SVG file with modified layers
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.svg', delete=False, encoding='utf-8') as temp_svg:
-                temp_svg.write(svg_content)
-                temp_svg_path = temp_svg.name
-            
-            # Clean up flag
-            cleanup_temp = True
-            
-        except Exception as e:
-            if global_log_callback:
-                global_log_callback(f"Warning: Could not apply layer rules ({e}), using original file")
-            else:
-                print(f"Warning: Could not apply layer rules ({e}), using original file")
-            temp_svg_path = svg_path
-            cleanup_temp = False
+    if prepared_svg:
+        # Layers were already rewritten ahead of the render (the caller cleans up)
+        temp_svg_path = prepared_svg
+        cleanup_temp = False
+    elif layer_rules:
+        temp_svg_path = write_layered_svg(svg_path, layer_rules)
+        cleanup_temp = temp_svg_path is not None
+        temp_svg_path = temp_svg_path or svg_path
     else:
         # No layer control needed
         temp_svg_path = svg_path
@@ -237,85 +220,89 @@ def convert_svg_to_pdf(svg_path, output_pattern, dpi, inkscape_path, layer_rules
     # Detect raster content to determine export method
     has_raster = detect_raster_content(temp_svg_path)
     
+    if has_raster:
+        # If raster content found, use --export-dpi for bitmap resolution
+        export_dpi = dpi
+        run_log.detail(f"  Detected raster content, exporting with DPI={dpi}")
+    else:
+        # Pure vector content - export directly without DPI setting
+        export_dpi = None
+        run_log.detail(f"  Pure vector content, exporting directly to PDF")
+    
     # List to track created files
     files_created = []
+    failure = None
+    
+    # Timeouts scale with the page size (at the raster DPI, if any)
+    stats = analyze_svg(temp_svg_path)
+    cost_dpi = dpi if has_raster else 96
+    page_timeout = timeout_policy.page_timeout(stats, cost_dpi)
+    deadline = time.time() + timeout_policy.file_timeout(stats, cost_dpi)
+    runner_log = run_log.current()
+    
+    # One known-good command line per page instead of trial and error
+    capabilities = probe_inkscape(inkscape_path, log=runner_log)
+    if capabilities and not capabilities.supports('pdf'):
+        if cleanup_temp and os.path.exists(temp_svg_path):
+            os.unlink(temp_svg_path)
+        return ConversionResult([], make_failure('unsupported', stderr=capabilities.version), kind="PDF")
     
-    # Change to output directory before running commands
-    original_dir = os.getcwd()
-    os.chdir(output_dir)
-    
+    # Output paths are absolute: workers run concurrently, so no os.chdir
     try:
-        if has_raster:
-            # If raster content found, use --export-dpi for bitmap resolution
-            if global_log_callback:
-                global_log_callback(f"  Detected raster content, exporting with DPI={dpi}")
-            
-            # Export page 1 with DPI setting
-            output_file_1 = f"{base_name}.pdf"
-            cmd1 = f'"{inkscape_path}" "{temp_svg_path}" --export-type=pdf --export-dpi={dpi} --export-filename="{output_file_1}"'
+        # Export page 1
+        output_file_1 = os.path.join(output_dir, f"{base_name}.pdf")
+        if 1 in done_pages:
+            # Already rendered by an interrupted run
+            files_created.append(output_file_1)
+        else:
+            # A binary known to support --export-page exports page 1 explicitly
+            page = 1 if capabilities and capabilities.export_page else None
+            cmd1 = export_command(capabilities, inkscape_path, temp_svg_path, 'pdf', output_file_1, export_dpi, page)
+            outcome = export_page(cmd1, output_file_1, page_timeout, 1, retry_policy, deadline, runner_log,
+                                      resource_limits)
             
-            result1 = subprocess.run(cmd1, shell=True, capture_output=True, text=True, encoding='utf-8')
+            if not outcome.ok and not outcome.retryable and capabilities is None:
+                # Unprobed binary: try with --export-page=1 if basic export fails (never after a hang or crash)
+                cmd1b = export_command(None, inkscape_path, temp_svg_path, 'pdf', output_file_1, export_dpi, 1)
+                outcome = export_page(cmd1b, output_file_1, page_timeout, 1, retry_policy, deadline, runner_log,
+                                      resource_limits)
             
-            if os.path.exists(output_file_1):
+            if outcome.ok:
                 files_created.append(output_file_1)
+                if page_callback:
+                    page_callback(1, output_file_1)
             else:
-                # Try with --export-page=1 if basic export fails
-                cmd1b = f'"{inkscape_path}" "{temp_svg_path}" --export-type=pdf --export-page=1 --export-dpi={dpi} --export-filename="{output_file_1}"'
-                result1b = subprocess.run(cmd1b, shell=True, capture_output=True, text=True, encoding='utf-8')
-                
-                if os.path.exists(output_file_1):
-                    files_created.append(output_file_1)
+                failure = outcome.failure
+        
+        # Export additional pages (not after page 1 hung or crashed)
+        for page_num in range(2, 6):
+            if failure and failure['reason'] != 'no_output':
+                break
+            if capabilities and not capabilities.export_page:
+                # Without --export-page only the first page can be exported
+                break
             
-            # Export additional pages with DPI setting
-            for page_num in range(2, 6):
-                output_file = f"{base_name}_p{page_num}.pdf"
-                cmd = f'"{inkscape_path}" "{temp_svg_path}" --export-type=pdf --export-page={page_num} --export-dpi={dpi} --export-filename="{output_file}"'
-                
-                result = subprocess.run(cmd, shell=True, capture_output=True, text=True, encoding='utf-8')
-                
-                if os.path.exists(output_file):
-                    files_created.append(output_file)
-                else:
-                    # Stop if this page doesn't exist
-                    break
-        else:
-            # Pure vector content - export directly without DPI setting
-            if global_log_callback:
-                global_log_callback(f"  Pure vector content, exporting directly to PDF")
+            output_file = os.path.join(output_dir, f"{base_name}_p{page_num}.pdf")
+            if page_num in done_pages:
+                files_created.append(output_file)
+                continue
             
-            # Export page 1 (direct vector export)
-            output_file_1 = f"{base_name}.pdf"
-            cmd1 = f'"{inkscape_path}" "{temp_svg_path}" --export-type=pdf --export-filename="{output_file_1}"'
+            cmd = export_command(capabilities, inkscape_path, temp_svg_path, 'pdf', output_file, export_dpi, page_num)
+            outcome = export_page(cmd, output_file, page_timeout, page_num, retry_policy, deadline, runner_log,
+                                  resource_limits)
             
-            result1 = subprocess.run(cmd1, shell=True, capture_output=True, text=True, encoding='utf-8')
-            
-            if os.path.exists(output_file_1):
-                files_created.append(output_file_1)
+            if outcome.ok:
+                files_created.append(output_file)
+                if page_callback:
+                    page_callback(page_num, output_file)
             else:
-                # Try with --export-page=1 if basic export fails
-                cmd1b = f'"{inkscape_path}" "{temp_svg_path}" --export-type=pdf --export-page=1 --export-filename="{output_file_1}"'
-                result1b = subprocess.run(cmd1b, shell=True, capture_output=True, text=True, encoding='utf-8')
-                
-                if os.path.exists(output_file_1):
-                    files_created.append(output_file_1)
-            
-            # Export additional pages (direct vector export)
-            for page_num in range(2, 6):
-                output_file = f"{base_name}_p{page_num}.pdf"
-                cmd = f'"{inkscape_path}" "{temp_svg_path}" --export-type=pdf --export-page={page_num} --export-filename="{output_file}"'
-                
-                result = subprocess.run(cmd, shell=True, capture_output=True, text=True, encoding='utf-8')
-                
-                if os.path.exists(output_file):
-                    files_created.append(output_file)
-                else:
-                    # Stop if this page doesn't exist
-                    break
+                if outcome.failure['reason'] != 'no_output':
+                    # Hung, crashed or out of time: the file is incomplete
+                    failure = outcome.failure
+                # Stop if this page doesn't exist
+                break
     
     finally:
-        # Change back to original directory
-        os.chdir(original_dir)
-        
         # Clean up temporary file if created
         if cleanup_temp and os.path.exists(temp_svg_path):
             try:
@@ -323,317 +310,151 @@ def convert_svg_to_pdf(svg_path, output_pattern, dpi, inkscape_path, layer_rules
             except:
                 pass
     
-    # Create result object
-    if files_created:
-        # Success result
-        class SuccessResult:
-            def __init__(self, files):
-                self.returncode = 0
-                self.stdout = f"Created {len(files)} PDF file(s)"
-                self.stderr = ""
-                self.files_created = files
-        return SuccessResult(files_created)
-    else:
-        # Error result
-        class ErrorResult:
-            def __init__(self):
-                self.returncode = 1
-                self.stdout = ""
-                self.stderr = "Failed to create any PDF files"
-        return ErrorResult()
-
-def batch_convert(svg_folder, output_path, dpi, create_subfolders=True, 
-                  inkscape_path=None, log_callback=None, progress_callback=None,
-                  layer_rules=None, auto_merge_pdf=False):
-    """
-    Batch convert all SVG files in a folder to PDF with progress reporting
-    """
-    # Store log_callback in global variable for use in other functions
-    global global_log_callback
-    global_log_callback = log_callback
-    
-    def log(message):
-        if log_callback:
-            log_callback(message)
-        else:
-            # Remove or replace emojis for Windows console compatibility
-            clean_message = message
-            # Replace all Unicode symbols with ASCII equivalents
-            replacements = {
-                '📁': '[FOLDER]',
-                '🎯': '[TARGET]', 
-                '📊': '[STATS]',
-                '✅': '[OK]',
-                '❌': '[ERROR]',
-                '⚠️': '[WARNING]',
-                '📂': '[FOLDER]',
-                '→': '->',  # Replace arrow with ASCII arrow
-                '📄': '[PDF]',
-                '🔍': '[DETECT]',
-                '🔗': '[MERGE]'
-            }
-            
-            for unicode_char, ascii_char in replacements.items():
-                clean_message = clean_message.replace(unicode_char, ascii_char)
-            
-            # Safe print for Windows console
-            try:
-                print(clean_message)
-            except UnicodeEncodeError:
-                # If still fails, remove all non-ASCII
-                safe_message = clean_message.encode('ascii', 'ignore').decode('ascii')
-                print(safe_message)
-    
-    # Default Inkscape path if not provided
-    if not inkscape_path:
-        inkscape_path = r"C:\Program Files\Inkscape\bin\inkscape.exe"
-    
-    # Get absolute paths
-    svg_folder = os.path.abspath(svg_folder)
-    output_dir = os.path.abspath(output_path)
-    
-    # Create output directory
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # Check if Inkscape exists
-    if not os.path.exists(inkscape_path):
-        log(f"[ERROR] Inkscape not found at: {inkscape_path}")
-        return False
-    
-    # Get SVG files
-    svg_files = get_svg_files(svg_folder)
-    
-    if not svg_files:
-        log("[ERROR] No SVG files found in: " + svg_folder)
-        return False
-    
-    log(f"[FOLDER] Found {len(svg_files)} SVG files in: {svg_folder}")
-    log(f"[FOLDER] Output folder: {output_dir}")
-    log(f"[TARGET] DPI: {dpi} (for raster content)")
-    log(f"[INKSCAPE] Using: {inkscape_path}")
-    log(f"[OPTION] Create subfolders: {create_subfolders}")
-    log(f"[OPTION] Auto-merge PDFs: {auto_merge_pdf}")
-    
-    if layer_rules:
-        rule_count = sum(len(rules) for rules in layer_rules.values())
-        log(f"[LAYER CONTROL] Enabled with {rule_count} rule(s)")
+    # A missing page 1 only counts as a failure if nothing was produced
+    if files_created and failure and failure['reason'] == 'no_output':
+        failure = None
     
-    total_files = len(svg_files)
-    successful = 0
-    failed = 0
-    
-    # Send initial progress (0%)
-    if progress_callback:
-        progress_callback(0, total_files, "Starting PDF conversion...")
-    
-    # Process each SVG file
-    for i, svg_file in enumerate(svg_files, 1):
-        svg_path = os.path.join(svg_folder, svg_file)
-        file_base_name = os.path.splitext(svg_file)[0]
-        
-        # Update progress before starting this file
-        if progress_callback:
-            progress_callback(i-1, total_files, f"Processing: {svg_file}")
-        
-        if create_subfolders:
-            # Create subfolder for each SVG file
-            file_output_dir = os.path.join(output_dir, file_base_name)
-            os.makedirs(file_output_dir, exist_ok=True)
-            # Output pattern: use SVG filename as base
-            output_pattern = os.path.join(file_output_dir, f"{file_base_name}.pdf")
-            target_dir = file_output_dir
-        else:
-            # All PDFs in same folder
-            # Output pattern: use SVG filename as base
-            output_pattern = os.path.join(output_dir, f"{file_base_name}.pdf")
-            target_dir = output_dir
-        
-        log(f"\n[{i}/{total_files}] Processing: {svg_file}")
-        
-        result = convert_svg_to_pdf(svg_path, output_pattern, dpi, inkscape_path, layer_rules)
-        
-        if result.returncode == 0:
-            successful += 1
-            
-            # Get list of created files
-            if hasattr(result, 'files_created'):
-                # New format: result has files_created attribute
-                pdf_files = result.files_created
-            else:
-                # Old format: list directory
-                if os.path.exists(target_dir):
-                    pdf_files = [f for f in os.listdir(target_dir) if f.lower().endswith('.pdf')]
-                else:
-                    pdf_files = []
-            
-            if pdf_files:
-                log(f"[OK] Success! Created {len(pdf_files)} PDF file(s):")
-                for pdf in sorted(pdf_files):
-                    file_path = os.path.join(target_dir, pdf)
-                    if os.path.exists(file_path):
-                        file_size = os.path.getsize(file_path)
-                        log(f"      -> {pdf} ({file_size} bytes)")
-                    else:
-                        log(f"      -> {pdf}")
-            else:
-                log(f"[WARNING] No PDF files generated for {svg_file}")
-        else:
-            failed += 1
-            log(f"[ERROR] Failed to process {svg_file}")
-            if result.stderr:
-                error_msg = result.stderr[:500]
-                log(f"   Error: {error_msg}")
-    
-    # Send final progress (100%)
-    if progress_callback:
-        progress_callback(total_files, total_files, "PDF conversion complete!")
-    
-    # Summary
-    log("\n" + "="*50)
-    log("PDF CONVERSION SUMMARY")
-    log("="*50)
-    log(f"[STATS] Total SVG files processed: {total_files}")
-    log(f"[OK] Successful conversions: {successful}")
-    log(f"[ERROR] Failed conversions: {failed}")
-    log(f"[FOLDER] Output location: {output_dir}")
-    
-    # Count total PDF files created (walk through all directories)
-    total_pdfs = 0
-    all_pdf_files = []
-    
-    if create_subfolders:
-        for root, dirs, files in os.walk(output_dir):
-            pdfs = [f for f in files if f.lower().endswith('.pdf')]
-            total_pdfs += len(pdfs)
-            for pdf in pdfs:
-                all_pdf_files.append(os.path.join(root, pdf))
-            if pdfs:
-                log(f"[INFO] In {root}: {len(pdfs)} PDF files")
-                for pdf in sorted(pdfs):
-                    log(f"      {pdf}")
-    else:
-        pdfs = [f for f in os.listdir(output_dir) if f.lower().endswith('.pdf')]
-        total_pdfs = len(pdfs)
-        for pdf in pdfs:
-            all_pdf_files.append(os.path.join(output_dir, pdf))
-        if pdfs:
-            log(f"[INFO] PDF files in output directory:")
-            for pdf in sorted(pdfs):
-                log(f"      {pdf}")
-    
-    log(f"[STATS] Total PDF files created: {total_pdfs}")
-    
-    # Auto-merge PDFs if requested
-    if auto_merge_pdf and total_pdfs > 1:
+    # Report names relative to the output directory, as before
+    files_created = [os.path.basename(path) for path in files_created]
+    return ConversionResult(files_created, failure, kind="PDF")
+
+class PdfBatch(BatchFormat):
+    """PDF pages, optionally merged into merged_output.pdf with shared resources stored once"""
+    name = 'pdf'
+    label = "PDF"
+    merged_name = "merged_output.pdf"
+    merge_option = "Auto-merge PDFs"
+    dpi_note = " (for raster content)"
+    start_message = "Starting PDF conversion..."
+    done_message = "PDF conversion complete!"
+    summary_title = "PDF CONVERSION SUMMARY"
+    
+    def layered_svg(self, svg_path, layer_rules):
+        return write_layered_svg(svg_path, layer_rules)
+    
+    def convert(self, svg_path, output_pattern, dpi, inkscape_path, layer_rules, **options):
+        return convert_svg_to_pdf(svg_path, output_pattern, dpi, inkscape_path, layer_rules, **options)
+    
+    def merge_stage(self, merged_pdf_path, log, on_progress):
+        return MergeStage(merged_pdf_path, 'pdf', log, deduplicate=True, on_progress=on_progress)
+    
+    def finish_merge(self, merge, manifest, log, progress_callback):
+        total_pdfs = manifest.total_outputs
+        if total_pdfs < 2:
+            merge.abort()
+            return
         log("\n" + "="*50)
         log("AUTO-MERGING PDF FILES")
         log("="*50)
         
-        merged_pdf_path = os.path.join(output_dir, "merged_output.pdf")
-        
         if progress_callback:
             progress_callback(0, 1, "Merging PDF files...")
         
-        # Sort PDF files for consistent merging order
-        all_pdf_files = sorted(all_pdf_files)
-        
-        log(f"[MERGE] Merging {total_pdfs} PDF files into: {merged_pdf_path}")
-        
-        merge_success = merge_pdfs_from_list(all_pdf_files, merged_pdf_path, log_callback)
-        
-        if merge_success:
+        # Pages were appended while files rendered (source order, then
+        # page order); only the final write is left
+        log(f"[MERGE] Merging {total_pdfs} PDF files into: {merge.path}")
+        if merge.finish():
             log(f"[OK] Successfully merged {total_pdfs} PDF files")
-            if os.path.exists(merged_pdf_path):
-                file_size = os.path.getsize(merged_pdf_path)
-                log(f"[INFO] Merged file size: {file_size} bytes")
-                log(f"[FILE] Merged PDF: {merged_pdf_path}")
+            log(f"[INFO] Merged file size: {os.path.getsize(merge.path)} bytes")
+            log(f"[FILE] Merged PDF: {merge.path}")
         else:
-            log(f"[ERROR] Failed to merge PDF files")
+            log("[ERROR] Failed to merge PDF files")
         
         if progress_callback:
             progress_callback(1, 1, "PDF merge complete!")
-    
-    log("="*50)
-    
-    # Store output path for potential PDF merging
-    global conversion_output_path
-    conversion_output_path = output_dir
-    
-    return successful > 0
 
-def merge_pdfs_from_list(pdf_files, output_pdf_path, log_callback=None):
+def prepare_batch(svg_folder, output_path, dpi, create_subfolders=True, 
+                  inkscape_path=None, log_callback=None, progress_callback=None,
+                  layer_rules=None, auto_merge_pdf=False, resume=False,
+                  timeout_policy=None, retry_policy=None,
+                  eta_callback=None, cost_model=None, name=None, render_cache=None,
+                  resource_limits=None, log_level=None, log_file=None, event_callback=None):
+    """
+    Plan a PDF batch without running it (see batch_driver.prepare_batch).
+    auto_merge_pdf streams the PDF pages, in source order, into
+    merged_output.pdf as files finish.
+    """
+    global last_manifest
+    plan = batch_driver.prepare_batch(PdfBatch(), svg_folder, output_path, dpi, create_subfolders,
+                                      inkscape_path, log_callback, progress_callback,
+                                      layer_rules=layer_rules, resume=resume,
+                                      timeout_policy=timeout_policy, retry_policy=retry_policy,
+                                      eta_callback=eta_callback, cost_model=cost_model, name=name,
+                                      render_cache=render_cache, resource_limits=resource_limits,
+                                      auto_merge_pdf=auto_merge_pdf, log_level=log_level,
+                                      log_file=log_file, event_callback=event_callback)
+    if plan:
+        last_manifest = plan.manifest
+    return plan
+
+def batch_convert(svg_folder, output_path, dpi, create_subfolders=True, 
+                  inkscape_path=None, log_callback=None, progress_callback=None,
+                  layer_rules=None, auto_merge_pdf=False, resume=False,
+                  timeout_policy=None, retry_policy=None, workers=None, memory_budget=None,
+                  eta_callback=None, render_cache=None, resource_limits=None,
+                  log_level=None, log_file=None, run_telemetry=None, event_callback=None):
+    """
+    Batch convert all SVG files in a folder to PDF with progress reporting.
+    With resume=True, files, pages and the merge recorded in the output
+    folder's checkpoint journal by an interrupted run are not redone.
+    Files that keep hanging or crashing Inkscape are quarantined and
+    skipped by later runs until they change.
+    Files are rendered by up to workers Inkscape processes at once (default:
+    CPU count), admitted only while their estimated memory fits in
+    memory_budget bytes (default: 75% of available RAM).
+    eta_callback, if given, is called with (seconds_left or None, fraction)
+    after each file, where fraction weights files by their predicted cost.
+    resource_limits (ResourceLimits) caps the memory, priority and CPUs of
+    each Inkscape process; a process over its memory cap is killed and
+    retried like a crash.
+    log_level hides messages below it (default 'info'; 'detail' shows
+    per-layer rules) and log_file keeps a rotating log of the run.
+    run_telemetry (RunTelemetry) collects live throughput, worker, cache and
+    memory statistics of the run, e.g. for a dashboard.
+    event_callback(event, info) receives page-level progress events: file
+    and page started/finished (with bytes and duration) and merge progress.
+    """
+    plan = prepare_batch(svg_folder, output_path, dpi, create_subfolders, inkscape_path,
+                         log_callback, progress_callback, layer_rules=layer_rules,
+                         auto_merge_pdf=auto_merge_pdf, resume=resume,
+                         timeout_policy=timeout_policy, retry_policy=retry_policy,
+                         eta_callback=eta_callback, render_cache=render_cache,
+                         resource_limits=resource_limits, log_level=log_level, log_file=log_file,
+                         event_callback=event_callback)
+    return batch_driver.run_batch(plan, workers, memory_budget, run_telemetry)
+
+def merge_pdfs_from_list(pdf_files, output_pdf_path, log_callback=None, deduplicate=True):
     """
-    Merge multiple PDF files from a list into a single PDF
+    Merge multiple PDF files from a list into a single PDF. With
+    deduplicate (and pikepdf installed), fonts, images and forms shared
+    by the files are stored once and objects go into compressed object
+    streams; otherwise pages are copied as they are.
     """
     try:
-        # Try to use PyPDF2 for merging
-        try:
-            import PyPDF2
-            use_pypdf2 = True
-        except ImportError:
-            use_pypdf2 = False
-            
-        if not use_pypdf2:
-            # Try to use pikepdf instead
-            try:
-                import pikepdf
-                use_pikepdf = True
-            except ImportError:
-                use_pikepdf = False
-                
-        if not (use_pypdf2 or use_pikepdf):
-            if log_callback:
-                log_callback("[ERROR] Neither PyPDF2 nor pikepdf is installed")
-                log_callback("Install with: pip install PyPDF2 or pip install pikepdf")
-            return False
-        
-        if not pdf_files:
-            if log_callback:
-                log_callback("[ERROR] No PDF files to merge")
-            return False
-        
-        # Create output directory if needed
-        os.makedirs(os.path.dirname(output_pdf_path), exist_ok=True)
-        
-        # Merge PDFs
-        if use_pypdf2:
-            # Using PyPDF2
-            merger = PyPDF2.PdfMerger()
-            
-            for pdf_file in pdf_files:
-                if log_callback:
-                    log_callback(f"[MERGE] Adding: {os.path.basename(pdf_file)}")
-                merger.append(pdf_file)
-            
-            # Write merged PDF
-            with open(output_pdf_path, 'wb') as output_file:
-                merger.write(output_file)
-            merger.close()
-            
-        else:
-            # Using pikepdf
-            pdf = pikepdf.Pdf.new()
-            
-            for pdf_file in pdf_files:
-                if log_callback:
-                    log_callback(f"[MERGE] Adding: {os.path.basename(pdf_file)}")
-                src = pikepdf.Pdf.open(pdf_file)
-                pdf.pages.extend(src.pages)
-                src.close()
-            
-            # Save merged PDF
-            pdf.save(output_pdf_path)
-            pdf.close()
-        
+        # pikepdf for deduplication, else PyPDF2 (or pikepdf as a fallback)
+        merge_stage = MergeStage(output_pdf_path, 'pdf', log_callback, deduplicate=deduplicate)
+    except ImportError:
         if log_callback:
-            log_callback(f"[OK] Merged PDF created: {output_pdf_path}")
-        
-        return True
-        
-    except Exception as e:
+            log_callback("[ERROR] Neither PyPDF2 nor pikepdf is installed")
+            log_callback("Install with: pip install PyPDF2 or pip install pikepdf")
+        return False
+    
+    if not pdf_files:
+        merge_stage.abort()
         if log_callback:
-            log_callback(f"[ERROR] Failed to merge PDFs: {str(e)}")
+            log_callback("[ERROR] No PDF files to merge")
         return False
+    
+    for order, pdf_file in enumerate(pdf_files):
+        merge_stage.add(order, [pdf_file])
+    
+    if not merge_stage.close():
+        return False
+    
+    if log_callback:
+        log_callback(f"[OK] Merged PDF created: {output_pdf_path}")
+    
+    return True
 
 def merge_pdfs(pdf_folder, output_pdf_path, log_callback=None):
     """
@@ -655,27 +476,60 @@ def merge_pdfs(pdf_folder, output_pdf_path, log_callback=None):
 
 # Function to handle command line interface (backward compatible)
 def batch_convert_cli(svg_folder, output_path, dpi, create_subfolders=True, 
-                     inkscape_path=None, auto_merge_pdf=False):
+                     inkscape_path=None, auto_merge_pdf=False, resume=False, workers=None,
+                     resource_limits=None, log_level=None, log_file=None):
     """CLI wrapper for batch_convert without callbacks"""
     return batch_convert(svg_folder, output_path, dpi, create_subfolders, 
-                        inkscape_path, auto_merge_pdf=auto_merge_pdf)
+                        inkscape_path, auto_merge_pdf=auto_merge_pdf, resume=resume,
+                        workers=workers, resource_limits=resource_limits,
+                        log_level=log_level, log_file=log_file)
 
 def main():
     """Main function for command-line usage"""
-    if len(sys.argv) >= 4:
+    # --worker=QUEUE_DIR renders tasks from a shared work queue (see workqueue.py)
+    for arg in sys.argv:
+        if arg.startswith('--worker='):
+            from workqueue import run_worker
+            inkscape_path = None
+            for option in sys.argv:
+                if option.startswith('--inkscape='):
+                    inkscape_path = option.split('=', 1)[1]
+            run_worker(arg.split('=', 1)[1], inkscape_path)
+            return 0
+    
+    # --resume may appear anywhere on the command line
+    resume = '--resume' in sys.argv
+    # --workers=N caps the number of parallel Inkscape processes
+    workers = None
+    for arg in sys.argv:
+        if arg.startswith('--workers='):
+            workers = int(arg.split('=', 1)[1])
+    # --log-level=detail shows per-layer messages; --log-file=path keeps a rotating log
+    log_level = None
+    log_file = None
+    for arg in sys.argv:
+        if arg.startswith('--log-level='):
+            log_level = arg.split('=', 1)[1]
+        elif arg.startswith('--log-file='):
+            log_file = arg.split('=', 1)[1]
+    # --memory-limit=MB, --nice=N, --ionice=idle|low and --pin-cpus limit each Inkscape process
+    resource_limits, argv = ResourceLimits.from_args(sys.argv)
+    argv = [arg for arg in argv if arg != '--resume' and not arg.startswith(('--workers=', '--log-level=', '--log-file='))]
+    
+    if len(argv) >= 4:
         # Get arguments from command line
-        svg_folder = sys.argv[1]
-        output_path = sys.argv[2]
-        dpi = sys.argv[3]
-        create_subfolders = True if len(sys.argv) < 5 else sys.argv[4].lower() == 'true'
+        svg_folder = argv[1]
+        output_path = argv[2]
+        dpi = argv[3]
+        create_subfolders = True if len(argv) < 5 else argv[4].lower() == 'true'
         
         # Check for auto-merge flag (7th argument)
         auto_merge_pdf = False
-        if len(sys.argv) >= 6 and sys.argv[5].lower() == '--merge':
+        if len(argv) >= 6 and argv[5].lower() == '--merge':
             auto_merge_pdf = True
-            inkscape_path = sys.argv[6] if len(sys.argv) >= 7 else None
-        elif len(sys.argv) >= 6:
-            inkscape_path = sys.argv[5]
+            inkscape_path = argv[6] if len(argv) >= 7 else None
+        elif len(argv) >= 6:
+            inkscape_path = argv[5]
         else:
             inkscape_path = None
         
@@ -688,10 +542,17 @@ def main():
         print("Auto-merge PDFs: " + str(auto_merge_pdf))
         if inkscape_path:
             print("Inkscape Path: " + inkscape_path)
+        print("Resume: " + str(resume))
+        print("Workers: " + (str(workers) if workers else "auto"))
+        if resource_limits:
+            print("Limits: " + str(resource_limits.to_config()))
+        if log_file:
+            print("Log file: " + log_file)
         print("="*50)
         
         success = batch_convert_cli(svg_folder, output_path, dpi, create_subfolders, 
-                                   inkscape_path, auto_merge_pdf)
+                                   inkscape_path, auto_merge_pdf, resume=resume, workers=workers,
+                                   resource_limits=resource_limits, log_level=log_level, log_file=log_file)
         
         if success:
             print("\n[OK] PDF conversion completed successfully!")
@@ -700,12 +561,16 @@ def main():
             print("\n[ERROR] PDF conversion failed or no files processed!")
             return 1
     else:
-        print("Usage: python vector.py <svg_folder> <output_path> <dpi> [create_subfolders] [--merge] [inkscape_path]")
+        print("Usage: python vector.py <svg_folder> <output_path> <dpi> [create_subfolders] [--merge] [inkscape_path] [--resume] [--workers=N]")
         print("Example: python vector.py ./svgs ./output/pdf_files 150 true")
         print("Example: python vector.py ./svgs ./output 300 false --merge")
         print("Example: python vector.py ./svgs ./output 300 true --merge \"C:\\Custom\\inkscape.exe\"")
         print("\nNote: output_path should include the folder name")
         print("\nAdd --merge flag to automatically merge PDFs after conversion")
+        print("Add --resume to skip files and merges finished by an interrupted run")
+        print("Add --workers=N to limit the number of parallel Inkscape processes")
+        print("Add --log-level=detail to show per-layer messages, --log-file=path to keep a log")
+        print("Or run as a render worker: --worker=<queue_dir> [--inkscape=path] (see workqueue.py)")
         return 1
 
 if __name__ == "__main__":
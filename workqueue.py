@@ -0,0 +1,437 @@
+# workqueue.py - Split one batch across machines through a shared-directory work queue
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import threading
+
+from manifest import RunManifest, source_sha256
+from svg_stats import analyze_svg
+from scheduler import estimate_job_cost
+from inkscape_runner import make_failure, ResourceLimits
+from batch_jobs import console_log, run_merge
+from batch_driver import get_svg_files
+from render_cache import render_key, cached_render, cache_from_environment
+import run_log
+
+# Queue layout (all under one shared directory, e.g. on NFS):
+#   batch.json            batch settings, written once by the coordinator
+#   pending/<task>        tasks waiting; names sort most expensive first
+#                         (<batch id>-<rank>-<order>: entries left by an earlier
+#                         batch in a reused queue are ignored)
+#   claimed/<task>@<id>   tasks being rendered by worker <id> (claimed by atomic rename)
+#   done/<task>.json      results (success or failure)
+#   *.tmp                 files being written, or claims being taken back (never listed)
+#   workers/<id>.json     worker heartbeats (a counter, so clocks need not agree)
+#   stop                  ask workers to exit
+# A claim is given up by renaming it away: a worker publishing its result
+# and the coordinator requeueing the task race for the same rename, and
+# only the winner goes on (a slow worker taken for dead drops its result).
+BATCH_FILENAME = "batch.json"
+STOP_FILENAME = "stop"
+
+DEFAULT_HEARTBEAT_INTERVAL = 5.0
+DEFAULT_DEAD_AFTER = 60.0
+DEFAULT_MAX_ATTEMPTS = 3
+
+def write_json_atomic(path, data):
+    temp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+def read_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def queue_paths(queue_dir):
+    return {name: os.path.join(queue_dir, name) for name in ('pending', 'claimed', 'done', 'workers')}
+
+def list_names(folder, batch_id=None):
+    """Entries of a queue folder, only those of batch_id if given"""
+    try:
+        names = sorted(name for name in os.listdir(folder) if not name.endswith('.tmp'))
+    except FileNotFoundError:
+        return []
+    if batch_id:
+        names = [name for name in names if name.startswith(f"{batch_id}-")]
+    return names
+
+def submit_batch(queue_dir, svg_folder, output_path, dpi, output_format='png', create_subfolders=True,
+                 layer_rules=None, merge=False, dead_after=DEFAULT_DEAD_AFTER,
+                 heartbeat_interval=DEFAULT_HEARTBEAT_INTERVAL, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                 limits=None):
+    """
+    Write a batch into queue_dir: one task per SVG file, named so that the
+    most expensive files are claimed first. Paths must be valid on every
+    machine (the same shared mount). limits (a ResourceLimits config dict)
+    applies to every worker's Inkscape. Returns the number of tasks.
+    """
+    paths = queue_paths(queue_dir)
+    for folder in paths.values():
+        os.makedirs(folder, exist_ok=True)
+
+    svg_folder = os.path.abspath(svg_folder)
+    output_dir = os.path.abspath(output_path)
+    os.makedirs(output_dir, exist_ok=True)
+    output_format = 'png' if output_format == 'png' else 'pdf'
+    extension = 'png' if output_format == 'png' else 'pdf'
+
+    tasks = []
+    for order, svg_file in enumerate(get_svg_files(svg_folder)):
+        svg_path = os.path.join(svg_folder, svg_file)
+        base_name = os.path.splitext(svg_file)[0]
+        target_dir = os.path.join(output_dir, base_name) if create_subfolders else output_dir
+        tasks.append({
+            'order': order,
+            'svg_file': svg_file,
+            'svg_path': svg_path,
+            'target_dir': target_dir,
+            'output_pattern': os.path.join(target_dir, f"{base_name}.{extension}"),
+            'input_sha256': source_sha256(svg_path),
+            'cost': estimate_job_cost(analyze_svg(svg_path), dpi, output_format),
+            'attempts': 0
+        })
+
+    batch_id = uuid.uuid4().hex[:12]
+    write_json_atomic(os.path.join(queue_dir, BATCH_FILENAME), {
+        'batch_id': batch_id,
+        'svg_folder': svg_folder,
+        'output_dir': output_dir,
+        'format': output_format,
+        'dpi': str(dpi),
+        'create_subfolders': create_subfolders,
+        'layer_rules': layer_rules,
+        'merge': merge,
+        'total': len(tasks),
+        'created': time.time(),
+        'dead_after': dead_after,
+        'heartbeat_interval': heartbeat_interval,
+        'max_attempts': max_attempts,
+        'limits': limits
+    })
+
+    # Longest first across all machines; the order index keeps names unique
+    ranked = sorted(tasks, key=lambda task: -task['cost'])
+    for rank, task in enumerate(ranked):
+        task['name'] = f"{batch_id}-{rank:06d}-{task['order']:06d}"
+        write_json_atomic(os.path.join(paths['pending'], task['name']), task)
+    return len(tasks)
+
+class Heartbeat:
+    """Background thread bumping this worker's beat counter"""
+    def __init__(self, queue_dir, worker_id, interval):
+        self.path = os.path.join(queue_paths(queue_dir)['workers'], f"{worker_id}.json")
+        self.worker_id = worker_id
+        self.interval = interval
+        self.beat = 0
+        self.task = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+
+    def write(self, state='alive'):
+        self.beat += 1
+        write_json_atomic(self.path, {'worker': self.worker_id, 'host': socket.gethostname(),
+                                      'pid': os.getpid(), 'beat': self.beat, 'task': self.task,
+                                      'state': state, 'time': time.time()})
+
+    def loop(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.write()
+            except OSError:
+                # A flaky share must not kill the render; the next beat retries
+                pass
+
+    def start(self):
+        self.write()
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        try:
+            self.write('stopped')
+        except OSError:
+            pass
+
+def claim_task(queue_dir, worker_id, batch_id):
+    """Claim the next pending task by atomic rename; returns (claimed path, task) or (None, None)"""
+    paths = queue_paths(queue_dir)
+    for name in list_names(paths['pending'], batch_id):
+        claimed = os.path.join(paths['claimed'], f"{name}@{worker_id}")
+        try:
+            os.rename(os.path.join(paths['pending'], name), claimed)
+        except (FileNotFoundError, PermissionError):
+            # Another worker got there first
+            continue
+        return claimed, read_json(claimed)
+    return None, None
+
+def take_claim(claimed):
+    """
+    Take a claim file out of claimed/ by atomic rename; returns the path it
+    now has, or None if someone else took it first
+    """
+    taken = f"{claimed}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        os.rename(claimed, taken)
+    except FileNotFoundError:
+        return None
+    return taken
+
+def publish_result(queue_dir, claimed, task):
+    """Write a worker's result to done/ if its claim is still its own; False if the task was requeued"""
+    taken = take_claim(claimed)
+    if taken is None:
+        return False
+    write_json_atomic(os.path.join(queue_paths(queue_dir)['done'], f"{task['name']}.json"), task)
+    os.remove(taken)
+    return True
+
+def finished_count(queue_dir, batch_id):
+    return len([name for name in list_names(queue_paths(queue_dir)['done'], batch_id) if name.endswith('.json')])
+
+def run_worker(queue_dir, inkscape_path=None, worker_id=None, log=None, poll_interval=1.0,
+               cache_dir=None):
+    """
+    Claim and render tasks from queue_dir until the batch is complete or a
+    stop file appears. Several workers (processes or machines) can share a
+    queue. With a render cache (cache_dir or INKSCAPE_EXPORTER_CACHE),
+    sheets already rendered anywhere are copied instead of rendered.
+    Returns the number of tasks this worker finished.
+    """
+    log = log or console_log
+    batch = read_json(os.path.join(queue_dir, BATCH_FILENAME))
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+    if batch['format'] == 'png':
+        import png as module
+        convert = module.convert_svg_to_png
+    else:
+        import vector as module
+        convert = module.convert_svg_to_pdf
+    # Layer and runner messages of convert go to this worker's log
+    run_log.bind(log)
+    inkscape_path = inkscape_path or r"C:\Program Files\Inkscape\bin\inkscape.exe"
+    render_cache = cache_from_environment(cache_dir, log=log)
+    resource_limits = ResourceLimits.from_config(batch.get('limits'))
+
+    heartbeat = Heartbeat(queue_dir, worker_id, batch['heartbeat_interval'])
+    heartbeat.start()
+    log(f"[WORKER] {worker_id} serving queue: {queue_dir}")
+
+    finished = 0
+    try:
+        while not os.path.exists(os.path.join(queue_dir, STOP_FILENAME)):
+            claimed, task = claim_task(queue_dir, worker_id, batch['batch_id'])
+            if not claimed:
+                if finished_count(queue_dir, batch['batch_id']) >= batch['total']:
+                    break
+                # Claimed tasks may still come back if their worker dies
+                time.sleep(poll_interval)
+                continue
+
+            heartbeat.task = task['name']
+            log(f"[WORKER] Rendering {task['svg_file']} (attempt {task['attempts'] + 1})")
+            started = time.time()
+            try:
+                def render(task=task):
+                    return convert(task['svg_path'], task['output_pattern'], batch['dpi'], inkscape_path,
+                                   batch['layer_rules'], resource_limits=resource_limits)
+                if render_cache:
+                    key = render_key(task['input_sha256'], task['svg_file'], batch['format'], batch['dpi'],
+                                     batch['layer_rules'], inkscape_path)
+                    result = cached_render(render_cache, key, task['output_pattern'], render,
+                                           kind=batch['format'].upper())
+                else:
+                    result = render()
+                files_created, failure = result.files_created, result.failure
+                error = result.stderr or None
+            except Exception as e:
+                files_created, failure, error = [], make_failure('error', stderr=str(e)), str(e)
+
+            heartbeat.task = None
+            task.update({
+                'worker': worker_id,
+                'files_created': files_created,
+                'failure': failure,
+                'error': error,
+                'started': started,
+                'finished': time.time()
+            })
+            if not publish_result(queue_dir, claimed, task):
+                log(f"[WORKER] {task['svg_file']} was requeued while this worker rendered it "
+                    f"(its heartbeat looked dead): result dropped")
+                continue
+            finished += 1
+            status = "OK" if files_created and not failure else "ERROR"
+            log(f"[{status}] {task['svg_file']}: {len(files_created)} file(s) in {task['finished'] - started:.1f}s")
+    finally:
+        heartbeat.stop()
+        run_log.bind(None)
+
+    log(f"[WORKER] {worker_id} finished {finished} task(s)")
+    return finished
+
+class DeadWorkerMonitor:
+    """
+    Detects dead workers by watching their beat counters on the local clock,
+    so the machines' clocks never have to agree
+    """
+    def __init__(self, queue_dir, dead_after):
+        self.folder = queue_paths(queue_dir)['workers']
+        self.dead_after = dead_after
+        self.seen = {}
+
+    def alive(self, worker_id):
+        now = time.time()
+        try:
+            data = read_json(os.path.join(self.folder, f"{worker_id}.json"))
+        except (OSError, ValueError):
+            data = None
+        if data and data.get('state') == 'stopped':
+            return False
+        beat = data['beat'] if data else None
+        last = self.seen.get(worker_id)
+        if last is None or last[0] != beat:
+            self.seen[worker_id] = (beat, now)
+            return beat is not None or last is None
+        return now - last[1] < self.dead_after
+
+def requeue_dead(queue_dir, monitor, max_attempts, log, batch_id):
+    """Move tasks claimed by dead workers back to pending (or fail them after max_attempts)"""
+    paths = queue_paths(queue_dir)
+    requeued = 0
+    for name in list_names(paths['claimed'], batch_id):
+        task_name, _, worker_id = name.partition('@')
+        if monitor.alive(worker_id):
+            continue
+        claimed = os.path.join(paths['claimed'], name)
+        taken = take_claim(claimed)
+        if taken is None:
+            # Its worker published the result after all
+            continue
+        try:
+            task = read_json(taken)
+        except (OSError, ValueError):
+            os.rename(taken, claimed)
+            continue
+        task['attempts'] += 1
+        if task['attempts'] >= max_attempts:
+            task.update({'worker': worker_id, 'files_created': [],
+                         'failure': make_failure('worker_lost', attempts=task['attempts']),
+                         'error': f"Worker died {task['attempts']} times on this file",
+                         'started': time.time(), 'finished': time.time()})
+            write_json_atomic(os.path.join(paths['done'], f"{task_name}.json"), task)
+            log(f"[QUEUE] {task['svg_file']}: failed after {task['attempts']} lost workers")
+        else:
+            write_json_atomic(os.path.join(paths['pending'], task_name), task)
+            log(f"[QUEUE] Worker {worker_id} is gone, requeued {task['svg_file']}")
+        os.remove(taken)
+        requeued += 1
+    return requeued
+
+def coordinate(queue_dir, log=None, poll_interval=2.0, merge_output=None):
+    """
+    Watch a batch until every task is done, requeueing work from dead
+    workers, then build the run manifest in source order and do the final
+    merge. Returns True if at least one file converted.
+    """
+    log = log or console_log
+    batch = read_json(os.path.join(queue_dir, BATCH_FILENAME))
+    paths = queue_paths(queue_dir)
+    monitor = DeadWorkerMonitor(queue_dir, batch['dead_after'])
+    batch_id = batch['batch_id']
+
+    reported = -1
+    while True:
+        requeue_dead(queue_dir, monitor, batch['max_attempts'], log, batch_id)
+        done = finished_count(queue_dir, batch_id)
+        if done != reported:
+            log(f"[QUEUE] {done}/{batch['total']} files done, "
+                f"{len(list_names(paths['claimed'], batch_id))} rendering, "
+                f"{len(list_names(paths['pending'], batch_id))} pending")
+            reported = done
+        if done >= batch['total']:
+            break
+        time.sleep(poll_interval)
+
+    manifest = RunManifest(batch['svg_folder'], batch['output_dir'], batch['format'], batch['dpi'], settings={
+        'create_subfolders': batch['create_subfolders'],
+        'layer_rules': batch['layer_rules'],
+        'queue': os.path.abspath(queue_dir)
+    })
+    manifest.started = batch['created']
+    results = [read_json(os.path.join(paths['done'], name))
+               for name in list_names(paths['done'], batch_id) if name.endswith('.json')]
+    for task in sorted(results, key=lambda task: task['order']):
+        manifest.add_file(task['svg_file'], task['svg_path'], task['target_dir'], task['files_created'],
+                          task['started'], task['finished'], error=task['error'], order=task['order'],
+                          source_sha256=task['input_sha256'], failure=task['failure'])
+        entry = manifest.files[-1]
+        entry['worker'] = task.get('worker')
+
+    log(f"[STATS] {manifest.successful} of {len(manifest.files)} files converted, "
+        f"{manifest.total_outputs} outputs ({manifest.total_bytes} bytes)")
+    for entry in manifest.ordered_files():
+        if entry['status'] != 'ok':
+            log(f"[ERROR] {entry['source']}: {entry['error']}")
+
+    if batch['merge'] and manifest.total_outputs:
+        merge_output = merge_output or os.path.join(batch['output_dir'], "merged_output.pdf")
+        merge_started = time.time()
+        if run_merge({'format': batch['format'], 'inputs': manifest.output_paths(), 'output': merge_output}, log):
+            manifest.set_merged(merge_output, merge_started, time.time())
+
+    manifest.finish()
+    try:
+        log(f"[INFO] Manifest written: {manifest.write()}")
+    except OSError as e:
+        log(f"[WARNING] Could not write manifest: {e}")
+    return manifest.successful > 0
+
+def main():
+    """Main function for command-line usage"""
+    # Resource limits are stored with the batch and apply on every worker
+    limits, argv = ResourceLimits.from_args(sys.argv[1:])
+    options = {}
+    args = []
+    for arg in argv:
+        if arg.startswith('--') and '=' in arg:
+            key, value = arg[2:].split('=', 1)
+            options[key] = value
+        elif arg.startswith('--'):
+            options[arg[2:]] = True
+        else:
+            args.append(arg)
+
+    if args[:1] == ['submit'] and len(args) >= 5:
+        queue_dir, svg_folder, output_path, dpi = args[1:5]
+        output_format = args[5] if len(args) >= 6 else 'png'
+        count = submit_batch(queue_dir, svg_folder, output_path, dpi, output_format,
+                             create_subfolders=options.get('subfolders', 'true') != 'false',
+                             merge=bool(options.get('merge')),
+                             limits=limits.to_config() if limits else None)
+        print(f"[QUEUE] Submitted {count} task(s) to {queue_dir}")
+        return 0
+    if args[:1] == ['worker'] and len(args) == 2:
+        run_worker(args[1], options.get('inkscape'), cache_dir=options.get('cache'))
+        return 0
+    if args[:1] == ['coordinate'] and len(args) == 2:
+        return 0 if coordinate(args[1]) else 1
+
+    print("Usage: python workqueue.py submit <queue_dir> <svg_folder> <output_path> <dpi> [png|pdf] [--merge] [--subfolders=false]")
+    print("         [--memory-limit=MB] [--nice=N] [--ionice=idle|low] [--pin-cpus]")
+    print("       python workqueue.py worker <queue_dir> [--inkscape=path] [--cache=dir]")
+    print("       python workqueue.py coordinate <queue_dir>")
+    print("\nor: python png.py --worker=<queue_dir> [--inkscape=path] (same for vector.py)")
+    print("\nRun workers on every machine against the same shared folder; the")
+    print("coordinator requeues work from dead workers and does the final merge.")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())